@@ -15,12 +15,37 @@ class Config:
         self.API_HASH = os.getenv("API_HASH", "")
         self.SESSION_STRING = os.getenv("SESSION_STRING", "")
         
+        # Extra accounts run in the same process (account ids 1, 2, ... in order)
+        self.SESSION_STRINGS = self._parse_list(os.getenv("SESSION_STRINGS", ""))
+        
         # Bot configuration
         self.BOT_PREFIX = os.getenv("BOT_PREFIX", ".")
         self.LOG_CHAT_ID = self._get_log_chat_id()
         
         # Database configuration
         self.DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///userbot.db")
+        self.DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "false").lower() == "true"
+        self.DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "100"))
+        self.DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+        self.DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "2"))
+        self.STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5.0"))
+        self.DB_QUERY_STATS = os.getenv("DB_QUERY_STATS", "true").lower() == "true"
+        self.DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+        
+        # Log retention settings (pruning deletes history, so it is opt-in)
+        self.LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "0"))
+        self.LOG_MAX_ROWS = int(os.getenv("LOG_MAX_ROWS", "0"))
+        self.LOG_PRUNE_INTERVAL = float(os.getenv("LOG_PRUNE_INTERVAL", "3600"))
+        self.LOG_PRUNE_CHUNK = int(os.getenv("LOG_PRUNE_CHUNK", "1000"))
+        self.LOG_PARTITIONING = os.getenv("LOG_PARTITIONING", "false").lower() == "true"
+        
+        # Backup settings
+        self.BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+        self.BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", "0"))
+        self.BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+        self.BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "true").lower() == "true"
+        self.BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+        self.BACKUP_STEP_DELAY = float(os.getenv("BACKUP_STEP_DELAY", "0.05"))
         
         # PM Permit settings
         self.PM_PERMIT_ENABLED = os.getenv("PM_PERMIT_ENABLED", "true").lower() == "true"
@@ -31,6 +56,7 @@ class Config:
             "Please wait for approval or contact me in a group."
         )
         self.PM_PERMIT_LIMIT = int(os.getenv("PM_PERMIT_LIMIT", "5"))
+        self.PM_PERMIT_CACHE_SIZE = int(os.getenv("PM_PERMIT_CACHE_SIZE", "1000"))
         
         # Alive plugin settings
         self.ALIVE_MESSAGE = os.getenv(
@@ -44,6 +70,19 @@ class Config:
         
         # Plugin settings
         self.DISABLED_PLUGINS = self._parse_list(os.getenv("DISABLED_PLUGINS", ""))
+        self.LAZY_PLUGINS = os.getenv("LAZY_PLUGINS", "true").lower() == "true"
+        self.PLUGIN_MANIFEST = os.getenv("PLUGIN_MANIFEST", ".plugin_manifest.json")
+        self.PLUGIN_INIT_TIMEOUT = float(os.getenv("PLUGIN_INIT_TIMEOUT", "30"))
+        self.PLUGIN_WATCH = os.getenv("PLUGIN_WATCH", "false").lower() == "true"
+        self.PLUGIN_WATCH_INTERVAL = float(os.getenv("PLUGIN_WATCH_INTERVAL", "2.0"))
+        
+        # Background task settings
+        self.TASK_CONCURRENCY = int(os.getenv("TASK_CONCURRENCY", "32"))
+        self.SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "10"))
+        
+        # Startup profiling settings
+        self.STARTUP_REPORT = os.getenv("STARTUP_REPORT", "startup_report.json")
+        self.STARTUP_IMPORT_PROFILE = os.getenv("STARTUP_IMPORT_PROFILE", "false").lower() == "true"
         
         # Validate configuration
         self._validate()
@@ -80,6 +119,10 @@ class Config:
         if errors:
             raise ValueError(f"Configuration errors: {', '.join(errors)}")
     
+    def get_sessions(self) -> list:
+        """Get the session strings of every account, indexed by account id"""
+        return [self.SESSION_STRING] + self.SESSION_STRINGS
+    
     def get_db_path(self) -> str:
         """Get database file path"""
         if self.DATABASE_URL.startswith("sqlite:///"):
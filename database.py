@@ -4,29 +4,811 @@ Handles SQLite operations and data persistence
 """
 
 import aiosqlite
+import asyncio
+import gzip
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import os
+import re
+import shutil
+import sqlite3
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, Callable, Iterable
+from datetime import datetime, timedelta
+
+from storage import (
+    StorageBackend, current_account, PM_PERMIT_COLUMNS, USER_STATS_COLUMNS,
+    TRANSFER_TABLES, ACTIVITY_BUCKET_FORMAT, ImportRows, iter_batches
+)
+from utils.metrics import LatencyRegistry
 
 logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(f"{__name__}.slow")
+
+class PermitCache:
+    """In-memory view of pm_permits
+    
+    Approved users are pinned so approval checks never touch the database;
+    other rows (including "no row" results) live in a bounded LRU.
+    """
+    
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max(0, max_size)
+        self.approved: Dict[int, Dict[str, Any]] = {}
+        self.unapproved: "OrderedDict[int, Optional[Dict[str, Any]]]" = OrderedDict()
+        self.loaded = False
+    
+    def load(self, rows: List[Dict[str, Any]]):
+        """Replace cache contents with the approved rows from the database"""
+        self.approved = {row['user_id']: row for row in rows}
+        self.unapproved.clear()
+        self.loaded = True
+    
+    def is_approved(self, user_id: int) -> bool:
+        """Check approval; only authoritative once loaded"""
+        return user_id in self.approved
+    
+    def lookup(self, user_id: int):
+        """Return (hit, row) for a user"""
+        row = self.approved.get(user_id)
+        if row is not None:
+            return True, row
+        if user_id in self.unapproved:
+            self.unapproved.move_to_end(user_id)
+            return True, self.unapproved[user_id]
+        return False, None
+    
+    def put(self, user_id: int, row: Optional[Dict[str, Any]]):
+        """Store a row (or a known-missing user) in the cache"""
+        if row is not None and row['approved']:
+            self.unapproved.pop(user_id, None)
+            self.approved[user_id] = row
+            return
+        
+        self.approved.pop(user_id, None)
+        if not self.max_size:
+            return
+        self.unapproved[user_id] = row
+        self.unapproved.move_to_end(user_id)
+        while len(self.unapproved) > self.max_size:
+            self.unapproved.popitem(last=False)
+    
+    def clear(self):
+        """Drop everything and fall back to database reads"""
+        self.approved.clear()
+        self.unapproved.clear()
+        self.loaded = False
+
+# Engagement band for a commands_used expression, shared by the triggers
+# maintaining engagement_summary
+def _engagement_case(column: str) -> str:
+    return f"""
+        CASE
+            WHEN COALESCE({column}, 0) = 0 THEN 'Inactive'
+            WHEN {column} <= 5 THEN 'Low'
+            WHEN {column} <= 20 THEN 'Medium'
+            WHEN {column} <= 50 THEN 'High'
+            ELSE 'Very High'
+        END"""
+
+def _log_summary_triggers(table: str) -> List[str]:
+    """Triggers keeping stats_summary.logs current for a bot_logs table"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE stats_summary SET logs = logs + 1 WHERE id = 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_summary_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE stats_summary SET logs = logs - 1 WHERE id = 1;
+        END
+        """,
+    ]
+
+async def _seed_stats_summary(conn):
+    """Fill the summary tables from the live data and hook up log partitions"""
+    async with conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+        (f"{LOG_PARTITION_PREFIX}[0-9]*",)
+    ) as cursor:
+        log_tables = ["bot_logs"] + [row[0] for row in await cursor.fetchall()]
+    
+    log_count = " + ".join(f"(SELECT COUNT(*) FROM {table})" for table in log_tables)
+    await conn.execute(
+        f"""
+        INSERT OR REPLACE INTO stats_summary
+        (id, users, messages, commands, pm_total, pm_approved, pm_warnings, logs)
+        SELECT 1,
+            (SELECT COUNT(*) FROM user_stats),
+            (SELECT COALESCE(SUM(total_messages), 0) FROM user_stats),
+            (SELECT COALESCE(SUM(commands_used), 0) FROM user_stats),
+            (SELECT COUNT(*) FROM pm_permits),
+            (SELECT COALESCE(SUM(approved), 0) FROM pm_permits),
+            (SELECT COALESCE(SUM(warnings), 0) FROM pm_permits),
+            {log_count}
+        """
+    )
+    await conn.execute("DELETE FROM engagement_summary")
+    await conn.execute(
+        f"""
+        INSERT INTO engagement_summary (level, count)
+        SELECT {_engagement_case('commands_used')} AS level, COUNT(*)
+        FROM user_stats GROUP BY level
+        """
+    )
+    for table in log_tables:
+        for statement in _log_summary_triggers(table):
+            await conn.execute(statement)
+
+def _rebuild_table(table: str, definition: str, columns: Iterable[str],
+                   without_rowid: bool = False) -> List[str]:
+    """Statements recreating a table with a new definition, keeping its rows
+    
+    Only the listed columns are copied; new columns take their defaults.
+    """
+    column_list = ", ".join(columns)
+    return [
+        f"CREATE TABLE {table}_rebuild ({definition}){' WITHOUT ROWID' if without_rowid else ''}",
+        f"INSERT INTO {table}_rebuild ({column_list}) SELECT {column_list} FROM {table}",
+        f"DROP TABLE {table}",
+        f"ALTER TABLE {table}_rebuild RENAME TO {table}",
+    ]
+
+async def _seed_account_summary(conn):
+    """Fill the per-account summary tables from the live data"""
+    await conn.execute("DELETE FROM account_summary")
+    await conn.execute(
+        """
+        INSERT INTO account_summary (account_id, users, messages, commands)
+        SELECT account_id, COUNT(*), COALESCE(SUM(total_messages), 0), COALESCE(SUM(commands_used), 0)
+        FROM user_stats GROUP BY account_id
+        """
+    )
+    await conn.execute(
+        """
+        INSERT INTO account_summary (account_id, pm_total, pm_approved, pm_warnings)
+        SELECT account_id, COUNT(*), COALESCE(SUM(approved), 0), COALESCE(SUM(warnings), 0)
+        FROM pm_permits WHERE true GROUP BY account_id
+        ON CONFLICT(account_id) DO UPDATE SET
+            pm_total = excluded.pm_total,
+            pm_approved = excluded.pm_approved,
+            pm_warnings = excluded.pm_warnings
+        """
+    )
+    await conn.execute(
+        f"""
+        INSERT INTO engagement_summary (account_id, level, count)
+        SELECT account_id, {_engagement_case('commands_used')} AS level, COUNT(*)
+        FROM user_stats GROUP BY account_id, level
+        """
+    )
+
+# Schema migrations, applied in order on top of the tables created by
+# Database._create_tables. Each step is (version, description, statements);
+# a statement is either SQL or an async callable taking the connection.
+# Never edit a released step - append a new one instead.
+MIGRATIONS = [
+    (1, "Add indexes for hot-path queries", [
+        # /stats and /usage filter on last_seen
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_last_seen ON user_stats (last_seen)",
+        # /logs sorts by timestamp; level makes the /usage GROUP BY covering
+        "CREATE INDEX IF NOT EXISTS idx_bot_logs_timestamp ON bot_logs (timestamp, level)",
+        # /usage lists the most warned users
+        "CREATE INDEX IF NOT EXISTS idx_pm_permits_warnings ON pm_permits (warnings)",
+    ]),
+    (2, "Add hourly activity rollup", [
+        # One row per user per hour; the key doubles as the /usage range index
+        """
+        CREATE TABLE IF NOT EXISTS activity_rollup (
+            bucket TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            messages INTEGER DEFAULT 0,
+            commands INTEGER DEFAULT 0,
+            PRIMARY KEY (bucket, user_id)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (3, "Add trigger-maintained stats summary", [
+        # Single-row running totals so /stats reads one row. REPLACE only
+        # fires the delete triggers with recursive_triggers on, which the
+        # writer connection enables.
+        """
+        CREATE TABLE IF NOT EXISTS stats_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            users INTEGER NOT NULL DEFAULT 0,
+            messages INTEGER NOT NULL DEFAULT 0,
+            commands INTEGER NOT NULL DEFAULT 0,
+            pm_total INTEGER NOT NULL DEFAULT 0,
+            pm_approved INTEGER NOT NULL DEFAULT 0,
+            pm_warnings INTEGER NOT NULL DEFAULT 0,
+            logs INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS engagement_summary (
+            level TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_insert AFTER INSERT ON user_stats
+        BEGIN
+            UPDATE stats_summary SET
+                users = users + 1,
+                messages = messages + COALESCE(NEW.total_messages, 0),
+                commands = commands + COALESCE(NEW.commands_used, 0)
+            WHERE id = 1;
+            INSERT INTO engagement_summary (level, count)
+            VALUES ({_engagement_case('NEW.commands_used')}, 1)
+            ON CONFLICT(level) DO UPDATE SET count = count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_update
+        AFTER UPDATE OF total_messages, commands_used ON user_stats
+        BEGIN
+            UPDATE stats_summary SET
+                messages = messages + COALESCE(NEW.total_messages, 0) - COALESCE(OLD.total_messages, 0),
+                commands = commands + COALESCE(NEW.commands_used, 0) - COALESCE(OLD.commands_used, 0)
+            WHERE id = 1;
+            UPDATE engagement_summary SET count = count - 1
+            WHERE level = {_engagement_case('OLD.commands_used')};
+            INSERT INTO engagement_summary (level, count)
+            VALUES ({_engagement_case('NEW.commands_used')}, 1)
+            ON CONFLICT(level) DO UPDATE SET count = count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_delete AFTER DELETE ON user_stats
+        BEGIN
+            UPDATE stats_summary SET
+                users = users - 1,
+                messages = messages - COALESCE(OLD.total_messages, 0),
+                commands = commands - COALESCE(OLD.commands_used, 0)
+            WHERE id = 1;
+            UPDATE engagement_summary SET count = count - 1
+            WHERE level = {_engagement_case('OLD.commands_used')};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_insert AFTER INSERT ON pm_permits
+        BEGIN
+            UPDATE stats_summary SET
+                pm_total = pm_total + 1,
+                pm_approved = pm_approved + COALESCE(NEW.approved, 0),
+                pm_warnings = pm_warnings + COALESCE(NEW.warnings, 0)
+            WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_update
+        AFTER UPDATE OF approved, warnings ON pm_permits
+        BEGIN
+            UPDATE stats_summary SET
+                pm_approved = pm_approved + COALESCE(NEW.approved, 0) - COALESCE(OLD.approved, 0),
+                pm_warnings = pm_warnings + COALESCE(NEW.warnings, 0) - COALESCE(OLD.warnings, 0)
+            WHERE id = 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_delete AFTER DELETE ON pm_permits
+        BEGIN
+            UPDATE stats_summary SET
+                pm_total = pm_total - 1,
+                pm_approved = pm_approved - COALESCE(OLD.approved, 0),
+                pm_warnings = pm_warnings - COALESCE(OLD.warnings, 0)
+            WHERE id = 1;
+        END
+        """,
+        _seed_stats_summary,
+    ]),
+    (4, "Key per-user tables on account_id", [
+        # Tables are rebuilt with account_id leading the primary key; rows
+        # from before multi-account support belong to account 0. Dropping
+        # the old tables drops their triggers and indexes too.
+        *_rebuild_table("pm_permits", """
+            account_id INTEGER NOT NULL DEFAULT 0,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            approved BOOLEAN DEFAULT FALSE,
+            approved_by INTEGER,
+            approved_at TIMESTAMP,
+            warnings INTEGER DEFAULT 0,
+            last_warning TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, user_id)
+        """, PM_PERMIT_COLUMNS),
+        *_rebuild_table("user_stats", """
+            account_id INTEGER NOT NULL DEFAULT 0,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            total_messages INTEGER DEFAULT 0,
+            commands_used INTEGER DEFAULT 0,
+            last_seen TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, user_id)
+        """, USER_STATS_COLUMNS),
+        *_rebuild_table("activity_rollup", """
+            account_id INTEGER NOT NULL DEFAULT 0,
+            bucket TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            messages INTEGER DEFAULT 0,
+            commands INTEGER DEFAULT 0,
+            PRIMARY KEY (account_id, bucket, user_id)
+        """, ('bucket', 'user_id', 'messages', 'commands'), without_rowid=True),
+        *_rebuild_table("plugin_settings", """
+            account_id INTEGER NOT NULL DEFAULT 0,
+            plugin_name TEXT,
+            setting_key TEXT,
+            setting_value TEXT,
+            user_id INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (account_id, plugin_name, setting_key, user_id)
+        """, ('plugin_name', 'setting_key', 'setting_value', 'user_id', 'created_at', 'updated_at')),
+        "CREATE INDEX IF NOT EXISTS idx_user_stats_last_seen ON user_stats (account_id, last_seen)",
+        "CREATE INDEX IF NOT EXISTS idx_pm_permits_warnings ON pm_permits (account_id, warnings)",
+        # Per-account running totals; stats_summary keeps only the
+        # process-wide log count from here on
+        """
+        CREATE TABLE IF NOT EXISTS account_summary (
+            account_id INTEGER PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0,
+            messages INTEGER NOT NULL DEFAULT 0,
+            commands INTEGER NOT NULL DEFAULT 0,
+            pm_total INTEGER NOT NULL DEFAULT 0,
+            pm_approved INTEGER NOT NULL DEFAULT 0,
+            pm_warnings INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "DROP TABLE IF EXISTS engagement_summary",
+        """
+        CREATE TABLE engagement_summary (
+            account_id INTEGER NOT NULL,
+            level TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, level)
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_insert AFTER INSERT ON user_stats
+        BEGIN
+            INSERT INTO account_summary (account_id, users, messages, commands)
+            VALUES (NEW.account_id, 1, COALESCE(NEW.total_messages, 0), COALESCE(NEW.commands_used, 0))
+            ON CONFLICT(account_id) DO UPDATE SET
+                users = users + 1,
+                messages = messages + excluded.messages,
+                commands = commands + excluded.commands;
+            INSERT INTO engagement_summary (account_id, level, count)
+            VALUES (NEW.account_id, {_engagement_case('NEW.commands_used')}, 1)
+            ON CONFLICT(account_id, level) DO UPDATE SET count = count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_update
+        AFTER UPDATE OF total_messages, commands_used ON user_stats
+        BEGIN
+            UPDATE account_summary SET
+                messages = messages + COALESCE(NEW.total_messages, 0) - COALESCE(OLD.total_messages, 0),
+                commands = commands + COALESCE(NEW.commands_used, 0) - COALESCE(OLD.commands_used, 0)
+            WHERE account_id = NEW.account_id;
+            UPDATE engagement_summary SET count = count - 1
+            WHERE account_id = OLD.account_id AND level = {_engagement_case('OLD.commands_used')};
+            INSERT INTO engagement_summary (account_id, level, count)
+            VALUES (NEW.account_id, {_engagement_case('NEW.commands_used')}, 1)
+            ON CONFLICT(account_id, level) DO UPDATE SET count = count + 1;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_user_stats_summary_delete AFTER DELETE ON user_stats
+        BEGIN
+            UPDATE account_summary SET
+                users = users - 1,
+                messages = messages - COALESCE(OLD.total_messages, 0),
+                commands = commands - COALESCE(OLD.commands_used, 0)
+            WHERE account_id = OLD.account_id;
+            UPDATE engagement_summary SET count = count - 1
+            WHERE account_id = OLD.account_id AND level = {_engagement_case('OLD.commands_used')};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_insert AFTER INSERT ON pm_permits
+        BEGIN
+            INSERT INTO account_summary (account_id, pm_total, pm_approved, pm_warnings)
+            VALUES (NEW.account_id, 1, COALESCE(NEW.approved, 0), COALESCE(NEW.warnings, 0))
+            ON CONFLICT(account_id) DO UPDATE SET
+                pm_total = pm_total + 1,
+                pm_approved = pm_approved + excluded.pm_approved,
+                pm_warnings = pm_warnings + excluded.pm_warnings;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_update
+        AFTER UPDATE OF approved, warnings ON pm_permits
+        BEGIN
+            UPDATE account_summary SET
+                pm_approved = pm_approved + COALESCE(NEW.approved, 0) - COALESCE(OLD.approved, 0),
+                pm_warnings = pm_warnings + COALESCE(NEW.warnings, 0) - COALESCE(OLD.warnings, 0)
+            WHERE account_id = NEW.account_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_pm_permits_summary_delete AFTER DELETE ON pm_permits
+        BEGIN
+            UPDATE account_summary SET
+                pm_total = pm_total - 1,
+                pm_approved = pm_approved - COALESCE(OLD.approved, 0),
+                pm_warnings = pm_warnings - COALESCE(OLD.warnings, 0)
+            WHERE account_id = OLD.account_id;
+        END
+        """,
+        _seed_account_summary,
+    ]),
+]
+
+# Per-day bot_logs partitions are named bot_logs_YYYYMMDD (UTC, like the
+# timestamp column) and read through the bot_logs_all view
+LOG_PARTITION_PREFIX = "bot_logs_"
+LOG_VIEW = "bot_logs_all"
+LOG_COLUMNS = "id, level, message, user_id, chat_id, timestamp"
+
+# Statements worth an EXPLAIN QUERY PLAN when they run slow
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_PARTITIONS = re.compile(LOG_PARTITION_PREFIX + r"\d{8}\b")
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query: str) -> str:
+    """Reduce a statement to a stable key for latency stats
+    
+    Whitespace is collapsed and literals, IN lists and log partition names
+    are replaced so that one statement shape maps to one histogram.
+    """
+    normalized = " ".join(query.split())
+    normalized = _SQL_LITERALS.sub("?", normalized)
+    normalized = _SQL_LISTS.sub("(?, ...)", normalized)
+    return _SQL_PARTITIONS.sub(LOG_PARTITION_PREFIX + "*", normalized)
+
+# Row shapes supported by Database.iter_query
+ROW_TYPES = ("tuple", "dict", "record")
+
+@lru_cache(maxsize=64)
+def _record_type(columns: Tuple[str, ...]):
+    """Get a slotted record class for a column set"""
+    return namedtuple("Record", columns, rename=True)
+
+def _row_factory(columns: Tuple[str, ...], row_type: str) -> Optional[Callable]:
+    """Build a converter from raw row tuples to the requested shape"""
+    if row_type == "tuple":
+        return None
+    if row_type == "dict":
+        return lambda row: dict(zip(columns, row))
+    if row_type == "record":
+        return _record_type(columns)._make
+    raise ValueError(f"Unknown row type: {row_type} (expected one of {', '.join(ROW_TYPES)})")
+
+def _permit_row(user_id: int, **values) -> Dict[str, Any]:
+    """Build a pm_permits row as SQLite would store it"""
+    row = dict.fromkeys(PM_PERMIT_COLUMNS)
+    row.update(user_id=user_id, approved=0, warnings=0)
+    row.update(values)
+    return row
 
-class Database:
-    """Database handler for UserBot"""
+def _gzip_file(source: Path, dest: Path):
+    """Gzip a file into dest atomically, removing the source"""
+    tmp_dest = dest.with_name(dest.name + ".tmp")
+    with open(source, "rb") as src, gzip.open(tmp_dest, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(src, out, 1024 * 1024)
+    os.replace(tmp_dest, dest)
+    source.unlink()
+
+class Database(StorageBackend):
+    """SQLite database handler for UserBot"""
     
-    def __init__(self, db_path: str = "userbot.db"):
+    def __init__(self, db_path: str = "userbot.db", write_behind: bool = False,
+                 batch_size: int = 100, flush_interval: float = 1.0,
+                 permit_cache_size: int = 1000, stats_flush_interval: float = 5.0,
+                 read_pool_size: int = 2, log_retention_days: int = 0,
+                 log_max_rows: int = 0, log_prune_interval: float = 3600,
+                 log_prune_chunk: int = 1000, log_partitioning: bool = False,
+                 query_stats: bool = True, slow_query_ms: float = 100):
         self.db_path = db_path
         self.connection = None
+        
+        # Per-statement latency histograms and the slow-query log
+        self.query_stats_enabled = query_stats
+        self.slow_query_ms = slow_query_ms
+        self.query_stats = LatencyRegistry()
+        self.slow_queries = deque(maxlen=20)
+        self._query_plans: Dict[str, str] = {}
+        
+        # Read-only connections used alongside the writer in WAL mode
+        self.read_pool_size = max(0, read_pool_size)
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_pool: Optional[asyncio.Queue] = None
+        
+        # One permit cache per account; once load_pm_permits has run, a new
+        # account's cache starts loaded (every approved row was read)
+        self.permit_cache_size = permit_cache_size
+        self._permit_caches: Dict[int, PermitCache] = {}
+        self._permits_loaded = False
+        
+        # All plugin_settings rows, keyed by (account_id, plugin_name, setting_key, user_id)
+        self._settings: Dict[Tuple[int, str, str, int], str] = {}
+        
+        # Write-behind (group commit) settings
+        self.write_behind = write_behind
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending_writes = 0
+        self._flush_task = None
+        
+        # Pending user_stats increments, keyed by (account_id, user_id).
+        # _stats_lock is held for a whole flush, up to its commit, so a
+        # reader holding it sees every increment exactly once: either in
+        # the committed rows or in _stats_deltas.
+        self.stats_flush_interval = stats_flush_interval
+        self._stats_deltas: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._rollup_deltas: Dict[Tuple[int, str, int], List[int]] = {}
+        self._stats_lock = asyncio.Lock()
+        self._savepoint_lock = asyncio.Lock()
+        self._savepoint_owner: Optional[asyncio.Task] = None
+        self._stats_task = None
+        
+        # bot_logs retention and optional per-day partitioning
+        self.log_retention_days = log_retention_days
+        self.log_max_rows = log_max_rows
+        self.log_prune_interval = log_prune_interval
+        self.log_prune_chunk = max(1, log_prune_chunk)
+        self.log_partitioning = log_partitioning
+        self._log_partitions: List[str] = []
+        self._log_partition_lock = asyncio.Lock()
+        self._prune_lock = asyncio.Lock()
+        self._prune_task = None
     
     async def initialize(self):
         """Initialize database and create tables"""
         try:
             self.connection = await aiosqlite.connect(self.db_path)
+            await self._configure_writer()
             await self._create_tables()
+            await self._run_migrations()
+            await self._load_plugin_settings()
+            await self._load_log_partitions()
+            await self._open_readers()
+            
+            if self.write_behind:
+                self._flush_task = asyncio.create_task(self._flush_loop())
+                logger.info(
+                    f"Write-behind enabled (batch size {self.batch_size}, "
+                    f"flush interval {self.flush_interval}s)"
+                )
+            
+            if self.stats_flush_interval > 0:
+                self._stats_task = asyncio.create_task(self._stats_flush_loop())
+            
+            if self.log_retention_days > 0 or self.log_max_rows > 0:
+                self._prune_task = asyncio.create_task(self._prune_loop())
+            
             logger.info(f"Database initialized: {self.db_path}")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
             raise
     
+    def _is_file_database(self) -> bool:
+        """Check whether the database lives on disk (WAL and readers need a file)"""
+        return self.db_path != ":memory:" and not self.db_path.startswith("file::memory:")
+    
+    async def _configure_writer(self):
+        """Switch the writer connection to WAL so readers never block it"""
+        # INSERT OR REPLACE must fire delete triggers to keep stats_summary exact
+        await self._execute("PRAGMA recursive_triggers=ON")
+        
+        if not self._is_file_database():
+            return
+        
+        async with self.connection.execute("PRAGMA journal_mode=WAL") as cursor:
+            mode = (await cursor.fetchone())[0]
+        if mode.lower() != "wal":
+            logger.warning(f"WAL mode unavailable (journal_mode={mode}), readers disabled")
+            self.read_pool_size = 0
+            return
+        
+        # Safe in WAL mode: only a power loss can drop the last commits
+        await self._execute("PRAGMA synchronous=NORMAL")
+    
+    async def _open_readers(self):
+        """Open the pool of read-only connections"""
+        if not self.read_pool_size or not self._is_file_database():
+            return
+        
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        self._reader_pool = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await aiosqlite.connect(uri, uri=True)
+            self._readers.append(reader)
+            self._reader_pool.put_nowait(reader)
+        logger.info(f"Opened {self.read_pool_size} read-only connections")
+    
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a read-only connection, falling back to the writer
+        
+        Readers see committed data only, so with write-behind enabled they can
+        lag the writer by up to one flush interval.
+        """
+        if self._reader_pool is None:
+            yield self.connection
+            return
+        
+        reader = await self._reader_pool.get()
+        try:
+            yield reader
+        finally:
+            self._reader_pool.put_nowait(reader)
+    
+    @asynccontextmanager
+    async def _writer(self):
+        """Use the writer connection (sees uncommitted write-behind data)"""
+        async with self._writer_turn():
+            yield self.connection
+    
+    @asynccontextmanager
+    async def _writer_turn(self):
+        """Wait until no other task has a savepoint open on the writer
+        
+        A statement run inside another task's savepoint would be undone by
+        its ROLLBACK TO after the caller was told it succeeded, so every
+        writer statement queues behind an open savepoint.
+        """
+        if self._savepoint_owner is asyncio.current_task():
+            yield
+            return
+        async with self._savepoint_lock:
+            yield
+    
+    def _connection_for(self, use_writer: bool):
+        """Pick the writer or a pooled reader for a query"""
+        return self._writer() if use_writer else self._reader()
+    
+    async def _fetch_all(self, query: str, parameters: tuple = (),
+                         use_writer: bool = False) -> List[Dict[str, Any]]:
+        """Run a query and return all rows as dicts"""
+        async with self._connection_for(use_writer) as conn:
+            async with self._timed(query, parameters):
+                async with conn.execute(query, parameters) as cursor:
+                    rows = await cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    
+    async def _fetch_one(self, query: str, parameters: tuple = (),
+                         use_writer: bool = False) -> Optional[Dict[str, Any]]:
+        """Run a query and return the first row as a dict"""
+        async with self._connection_for(use_writer) as conn:
+            async with self._timed(query, parameters):
+                async with conn.execute(query, parameters) as cursor:
+                    row = await cursor.fetchone()
+                    columns = [desc[0] for desc in cursor.description]
+        return dict(zip(columns, row)) if row else None
+    
+    async def _execute(self, query: str, parameters: tuple = ()) -> aiosqlite.Cursor:
+        """Run a statement on the writer connection"""
+        async with self._writer_turn():
+            async with self._timed(query, parameters):
+                return await self.connection.execute(query, parameters)
+    
+    async def _executemany(self, query: str, rows: List[tuple]) -> aiosqlite.Cursor:
+        """Run a statement on the writer connection once per parameter row"""
+        async with self._writer_turn():
+            async with self._timed(query, rows[0] if rows else ()):
+                return await self.connection.executemany(query, rows)
+    
+    async def _commit_now(self):
+        """Commit the writer connection (after any open savepoint is released)"""
+        async with self._writer_turn():
+            async with self._timed("COMMIT"):
+                await self.connection.commit()
+    
+    @asynccontextmanager
+    async def _savepoint(self, name: str):
+        """Run writer statements in a savepoint, undone as a unit on error
+        
+        Only the task that opened the savepoint may use the writer until it
+        is released: other tasks' statements and commits wait, so a rollback
+        never takes their work with it and no COMMIT ends it half way.
+        """
+        async with self._savepoint_lock:
+            self._savepoint_owner = asyncio.current_task()
+            try:
+                await self._execute(f"SAVEPOINT {name}")
+                try:
+                    yield
+                    await self._execute(f"RELEASE {name}")
+                except Exception:
+                    await self._execute(f"ROLLBACK TO {name}")
+                    await self._execute(f"RELEASE {name}")
+                    raise
+            finally:
+                self._savepoint_owner = None
+    
+    # Query instrumentation methods
+    @asynccontextmanager
+    async def _timed(self, query: str, parameters: tuple = ()):
+        """Time a statement into its histogram, logging it if slow"""
+        if not self.query_stats_enabled:
+            yield
+            return
+        
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.query_stats.record(normalize_sql(query), time.perf_counter() - start, error=True)
+            raise
+        
+        elapsed = time.perf_counter() - start
+        key = normalize_sql(query)
+        self.query_stats.record(key, elapsed)
+        if self.slow_query_ms > 0 and elapsed * 1000 >= self.slow_query_ms:
+            await self._log_slow_query(key, query, parameters, elapsed)
+    
+    async def _log_slow_query(self, key: str, query: str, parameters: tuple,
+                              elapsed: float):
+        """Record a slow statement with its query plan"""
+        plan = await self._explain(key, query, parameters)
+        self.slow_queries.append({
+            'query': key,
+            'duration_ms': elapsed * 1000,
+            'plan': plan,
+            'timestamp': datetime.now()
+        })
+        slow_query_logger.warning(
+            f"Slow query ({elapsed * 1000:.1f}ms): {key}" + (f"\n{plan}" if plan else "")
+        )
+    
+    async def _explain(self, key: str, query: str, parameters: tuple) -> str:
+        """Get EXPLAIN QUERY PLAN output for a statement, once per shape"""
+        if key in self._query_plans:
+            return self._query_plans[key]
+        
+        plan = ""
+        if query.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                async with self.connection.execute(
+                    f"EXPLAIN QUERY PLAN {query}", parameters
+                ) as cursor:
+                    plan = "\n".join(row[3] for row in await cursor.fetchall())
+            except Exception as e:
+                plan = f"(plan unavailable: {e})"
+        
+        self._query_plans[key] = plan
+        return plan
+    
+    def get_query_stats(self, limit: int = 10, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Get per-statement latency summaries, heaviest first"""
+        return self.query_stats.top(limit, sort_by)
+    
+    def get_slow_queries(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the most recent slow statements, newest first"""
+        return list(self.slow_queries)[::-1][:limit]
+    
+    def reset_query_stats(self):
+        """Forget all query timings"""
+        self.query_stats.clear()
+        self.slow_queries.clear()
+        self._query_plans.clear()
+    
     async def _create_tables(self):
         """Create necessary database tables"""
         tables = [
@@ -86,22 +868,193 @@ class Database:
         ]
         
         for table_sql in tables:
-            await self.connection.execute(table_sql)
+            await self._execute(table_sql)
         
-        await self.connection.commit()
+        await self._commit_now()
         logger.info("Database tables created/verified")
     
+    async def _run_migrations(self):
+        """Apply pending schema migrations, each in its own transaction"""
+        await self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        await self._commit_now()
+        
+        current = await self.get_schema_version()
+        
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            
+            try:
+                await self._execute("BEGIN")
+                for statement in statements:
+                    if callable(statement):
+                        await statement(self.connection)
+                    else:
+                        await self._execute(statement)
+                await self._execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                await self._commit_now()
+                logger.info(f"Applied migration {version}: {description}")
+            except Exception as e:
+                await self.connection.rollback()
+                logger.error(f"Migration {version} failed: {e}")
+                raise
+    
+    async def get_schema_version(self) -> int:
+        """Get the current schema version"""
+        row = await self._fetch_one(
+            "SELECT COALESCE(MAX(version), 0) AS version FROM schema_version",
+            use_writer=True
+        )
+        return row['version'] if row else 0
+    
+    # Write-behind methods
+    async def _commit(self, immediate: bool = False):
+        """Commit now, or defer the commit to the next group commit
+        
+        In write-behind mode statements are still executed immediately on the
+        connection, so reads see them and errors surface to the caller; only
+        the commit (and its fsync) is batched.
+        """
+        if not self.write_behind:
+            await self._commit_now()
+            return
+        
+        self._pending_writes += 1
+        if immediate or self._pending_writes >= self.batch_size:
+            await self._commit_pending()
+    
+    async def flush(self):
+        """Write buffered stats and commit all pending writes"""
+        await self.flush_user_stats()
+        await self._commit_pending()
+    
+    async def _commit_pending(self):
+        """Commit all pending writes in a single transaction"""
+        if not self.connection or not self._pending_writes:
+            return
+        
+        pending = self._pending_writes
+        self._pending_writes = 0
+        try:
+            await self._commit_now()
+            logger.debug(f"Flushed {pending} pending writes")
+        except Exception as e:
+            logger.error(f"Failed to flush pending writes: {e}")
+            raise
+    
+    async def _flush_loop(self):
+        """Periodically commit pending writes"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._commit_pending()
+            except Exception:
+                pass  # Already logged, retry on next tick
+    
+    async def _stats_flush_loop(self):
+        """Periodically write buffered user stats"""
+        while True:
+            await asyncio.sleep(self.stats_flush_interval)
+            await self.flush_user_stats()
+    
     # PM Permit methods
+    @property
+    def permit_cache(self) -> PermitCache:
+        """Permit cache of the current account"""
+        account_id = current_account.get()
+        cache = self._permit_caches.get(account_id)
+        if cache is None:
+            cache = self._permit_caches[account_id] = PermitCache(self.permit_cache_size)
+            cache.loaded = self._permits_loaded
+        return cache
+    
+    async def load_pm_permits(self) -> int:
+        """Preload approved users of every account into the permit caches"""
+        rows = await self._fetch_all(
+            "SELECT * FROM pm_permits WHERE approved = 1", use_writer=True
+        )
+        by_account: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_account.setdefault(row.pop('account_id'), []).append(row)
+        
+        self._permits_loaded = True
+        for account_id in self._permit_caches.keys() | by_account.keys():
+            cache = self._permit_caches.setdefault(account_id, PermitCache(self.permit_cache_size))
+            cache.load(by_account.get(account_id, []))
+        logger.info(f"Permit cache loaded: {len(rows)} approved users in {len(by_account)} accounts")
+        return len(rows)
+    
+    async def is_pm_approved(self, user_id: int) -> bool:
+        """Check whether a user is approved for PM"""
+        cache = self.permit_cache
+        if cache.loaded:
+            return cache.is_approved(user_id)
+        
+        permit = await self.get_pm_permit(user_id)
+        return bool(permit and permit['approved'])
+    
     async def get_pm_permit(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get PM permit status for a user"""
-        async with self.connection.execute(
-            "SELECT * FROM pm_permits WHERE user_id = ?", (user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-        return None
+        cache = self.permit_cache
+        hit, row = cache.lookup(user_id)
+        if hit:
+            return dict(row) if row else None
+        
+        row = await self._read_pm_permit(user_id)
+        cache.put(user_id, row)
+        return dict(row) if row else None
+    
+    async def _read_pm_permit(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Read a PM permit row from the database"""
+        row = await self._fetch_one(
+            "SELECT * FROM pm_permits WHERE account_id = ? AND user_id = ?",
+            (current_account.get(), user_id), use_writer=True
+        )
+        if row:
+            del row['account_id']
+        return row
+    
+    async def _refresh_pm_permit(self, user_id: int):
+        """Re-read a PM permit row into the cache after a write"""
+        try:
+            self.permit_cache.put(user_id, await self._read_pm_permit(user_id))
+        except Exception as e:
+            logger.error(f"Failed to refresh PM permit cache: {e}")
+            self.permit_cache.clear()
+    
+    async def get_pm_permit_summary(self) -> Dict[str, Any]:
+        """Get PM permit totals (total, approved, total_warnings, max_warnings)"""
+        summary = await self.get_stats_summary()
+        return {
+            'total': summary['pm_total'],
+            'approved': summary['pm_approved'],
+            'total_warnings': summary['pm_warnings'],
+            'max_warnings': summary['pm_max_warnings']
+        }
+    
+    async def get_top_warned_users(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the users with the most PM warnings"""
+        return await self._fetch_all(
+            """
+            SELECT username, first_name, warnings
+            FROM pm_permits 
+            WHERE account_id = ? AND warnings > 0
+            ORDER BY warnings DESC 
+            LIMIT ?
+            """,
+            (current_account.get(), limit)
+        )
     
     async def add_pm_permit(self, user_id: int, username: str = None, 
                            first_name: str = None, approved: bool = False,
@@ -109,16 +1062,21 @@ class Database:
         """Add or update PM permit entry"""
         try:
             now = datetime.now()
-            await self.connection.execute(
+            await self._execute(
                 """
                 INSERT OR REPLACE INTO pm_permits 
-                (user_id, username, first_name, approved, approved_by, approved_at, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (account_id, user_id, username, first_name, approved, approved_by, approved_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (user_id, username, first_name, approved, 
+                (current_account.get(), user_id, username, first_name, approved, 
                  approved_by, now if approved else None, now)
             )
-            await self.connection.commit()
+            await self._commit()
+            self.permit_cache.put(user_id, _permit_row(
+                user_id, username=username, first_name=first_name,
+                approved=int(approved), approved_by=approved_by,
+                approved_at=str(now) if approved else None, created_at=str(now)
+            ))
             return True
         except Exception as e:
             logger.error(f"Failed to add PM permit: {e}")
@@ -128,15 +1086,16 @@ class Database:
         """Approve a user for PM"""
         try:
             now = datetime.now()
-            await self.connection.execute(
+            await self._execute(
                 """
                 UPDATE pm_permits 
                 SET approved = TRUE, approved_by = ?, approved_at = ?
-                WHERE user_id = ?
+                WHERE account_id = ? AND user_id = ?
                 """,
-                (approved_by, now, user_id)
+                (approved_by, now, current_account.get(), user_id)
             )
-            await self.connection.commit()
+            await self._commit()
+            await self._refresh_pm_permit(user_id)
             return True
         except Exception as e:
             logger.error(f"Failed to approve PM: {e}")
@@ -145,15 +1104,16 @@ class Database:
     async def disapprove_pm(self, user_id: int) -> bool:
         """Disapprove a user for PM"""
         try:
-            await self.connection.execute(
+            await self._execute(
                 """
                 UPDATE pm_permits 
                 SET approved = FALSE, approved_by = NULL, approved_at = NULL
-                WHERE user_id = ?
+                WHERE account_id = ? AND user_id = ?
                 """,
-                (user_id,)
+                (current_account.get(), user_id)
             )
-            await self.connection.commit()
+            await self._commit()
+            await self._refresh_pm_permit(user_id)
             return True
         except Exception as e:
             logger.error(f"Failed to disapprove PM: {e}")
@@ -168,25 +1128,31 @@ class Database:
             warnings = (permit['warnings'] if permit else 0) + 1
             
             if permit:
-                await self.connection.execute(
+                await self._execute(
                     """
                     UPDATE pm_permits 
                     SET warnings = ?, last_warning = ?
-                    WHERE user_id = ?
+                    WHERE account_id = ? AND user_id = ?
                     """,
-                    (warnings, now, user_id)
+                    (warnings, now, current_account.get(), user_id)
                 )
+                permit.update(warnings=warnings, last_warning=str(now))
             else:
-                await self.connection.execute(
+                await self._execute(
                     """
                     INSERT INTO pm_permits 
-                    (user_id, warnings, last_warning, created_at)
-                    VALUES (?, ?, ?, ?)
+                    (account_id, user_id, warnings, last_warning, created_at)
+                    VALUES (?, ?, ?, ?, ?)
                     """,
-                    (user_id, warnings, now, now)
+                    (current_account.get(), user_id, warnings, now, now)
+                )
+                permit = _permit_row(
+                    user_id, warnings=warnings,
+                    last_warning=str(now), created_at=str(now)
                 )
             
-            await self.connection.commit()
+            await self._commit()
+            self.permit_cache.put(user_id, permit)
             return warnings
         except Exception as e:
             logger.error(f"Failed to add PM warning: {e}")
@@ -196,97 +1162,509 @@ class Database:
     async def update_user_stats(self, user_id: int, username: str = None,
                                first_name: str = None, message_count: int = 0,
                                command_count: int = 0) -> bool:
-        """Update user statistics"""
-        try:
-            now = datetime.now()
-            await self.connection.execute(
-                """
-                INSERT OR REPLACE INTO user_stats 
-                (user_id, username, first_name, total_messages, commands_used, last_seen, updated_at)
-                VALUES (
-                    ?, ?, ?, 
-                    COALESCE((SELECT total_messages FROM user_stats WHERE user_id = ?), 0) + ?,
-                    COALESCE((SELECT commands_used FROM user_stats WHERE user_id = ?), 0) + ?,
-                    ?, ?
-                )
-                """,
-                (user_id, username, first_name, user_id, message_count, 
-                 user_id, command_count, now, now)
-            )
-            await self.connection.commit()
+        """Update user statistics and the hourly activity rollup
+        
+        Increments are buffered in memory and written by flush_user_stats().
+        """
+        current_time = datetime.now()
+        now = str(current_time)
+        account_id = current_account.get()
+        
+        bucket = (account_id, current_time.strftime(ACTIVITY_BUCKET_FORMAT), user_id)
+        counts = self._rollup_deltas.get(bucket)
+        if counts is None:
+            counts = self._rollup_deltas[bucket] = [0, 0]
+        counts[0] += message_count
+        counts[1] += command_count
+        
+        key = (account_id, user_id)
+        delta = self._stats_deltas.get(key)
+        if delta is None:
+            delta = self._stats_deltas[key] = {
+                'messages': 0, 'commands': 0, 'first_seen': now
+            }
+        
+        delta['username'] = username
+        delta['first_name'] = first_name
+        delta['messages'] += message_count
+        delta['commands'] += command_count
+        delta['last_seen'] = now
+        
+        if self.stats_flush_interval <= 0:
+            return await self.flush_user_stats()
+        return True
+    
+    async def flush_user_stats(self) -> bool:
+        """Write all buffered stats and rollup increments in one batch"""
+        if not self.connection or not self._stats_deltas:
             return True
-        except Exception as e:
-            logger.error(f"Failed to update user stats: {e}")
-            return False
+        
+        async with self._stats_lock:
+            batch, self._stats_deltas = self._stats_deltas, {}
+            rollup, self._rollup_deltas = self._rollup_deltas, {}
+            try:
+                # Savepoint so a failed batch is undone without touching
+                # other write-behind statements in the same transaction
+                async with self._savepoint("flush_stats"):
+                    await self._executemany(
+                        """
+                        INSERT INTO user_stats 
+                        (account_id, user_id, username, first_name, total_messages, commands_used, last_seen, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(account_id, user_id) DO UPDATE SET
+                            username = excluded.username,
+                            first_name = excluded.first_name,
+                            total_messages = total_messages + excluded.total_messages,
+                            commands_used = commands_used + excluded.commands_used,
+                            last_seen = excluded.last_seen,
+                            updated_at = excluded.updated_at
+                        """,
+                        [
+                            (account_id, user_id, d['username'], d['first_name'], d['messages'],
+                             d['commands'], d['last_seen'], d['last_seen'])
+                            for (account_id, user_id), d in batch.items()
+                        ]
+                    )
+                    await self._executemany(
+                        """
+                        INSERT INTO activity_rollup (account_id, bucket, user_id, messages, commands)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(account_id, bucket, user_id) DO UPDATE SET
+                            messages = messages + excluded.messages,
+                            commands = commands + excluded.commands
+                        """,
+                        [
+                            (account_id, bucket, user_id, messages, commands)
+                            for (account_id, bucket, user_id), (messages, commands) in rollup.items()
+                        ]
+                    )
+                
+                # Commit before releasing the lock: readers must not see the
+                # deltas gone before the rows are visible
+                await self._commit(immediate=True)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to update user stats: {e}")
+                # Keep the increments for the next attempt
+                for key, d in batch.items():
+                    self._merge_stats_delta(self._stats_deltas, key, d)
+                for key, (messages, commands) in rollup.items():
+                    counts = self._rollup_deltas.setdefault(key, [0, 0])
+                    counts[0] += messages
+                    counts[1] += commands
+                return False
+    
+    @staticmethod
+    def _merge_stats_delta(target: Dict[Tuple[int, int], Dict[str, Any]], key: Tuple[int, int],
+                           delta: Dict[str, Any]):
+        """Fold an older delta into target, keeping the newer profile fields"""
+        current = target.get(key)
+        if current is None:
+            target[key] = dict(delta)
+            return
+        current['messages'] += delta['messages']
+        current['commands'] += delta['commands']
+        current['first_seen'] = delta['first_seen']
     
     async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Get user statistics"""
-        async with self.connection.execute(
-            "SELECT * FROM user_stats WHERE user_id = ?", (user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
-        return None
+        """Get user statistics, including increments not yet written
+        
+        The row and the pending increments are read under _stats_lock, so
+        a flush cannot move increments between them mid-read.
+        """
+        account_id = current_account.get()
+        async with self._stats_lock:
+            stats = await self._fetch_one(
+                "SELECT * FROM user_stats WHERE account_id = ? AND user_id = ?", (account_id, user_id)
+            )
+            delta = self._stats_deltas.get((account_id, user_id))
+            delta = dict(delta) if delta else None
+        
+        if stats:
+            del stats['account_id']
+        if delta:
+            if stats is None:
+                stats = {
+                    'user_id': user_id, 'total_messages': 0, 'commands_used': 0,
+                    'created_at': delta['first_seen']
+                }
+            stats.update(
+                username=delta['username'],
+                first_name=delta['first_name'],
+                total_messages=stats['total_messages'] + delta['messages'],
+                commands_used=stats['commands_used'] + delta['commands'],
+                last_seen=delta['last_seen'],
+                updated_at=delta['last_seen']
+            )
+        return stats
+    
+    async def get_stats_summary(self) -> Dict[str, int]:
+        """Get the running totals kept by the summary triggers
+        
+        Returns the current account's users, messages, commands, pm_total,
+        pm_approved, pm_warnings and pm_max_warnings, plus the shared log
+        count, from single rows, so the cost does not grow with the tables
+        (pm_max_warnings is an index lookup). Like the other aggregate reads
+        below, user totals only include flushed stats: buffered increments
+        appear within STATS_FLUSH_INTERVAL, and reads never force a write.
+        """
+        account_id = current_account.get()
+        return await self._fetch_one(
+            """
+            SELECT COALESCE(a.users, 0) as users, COALESCE(a.messages, 0) as messages,
+                COALESCE(a.commands, 0) as commands, COALESCE(a.pm_total, 0) as pm_total,
+                COALESCE(a.pm_approved, 0) as pm_approved, COALESCE(a.pm_warnings, 0) as pm_warnings,
+                COALESCE((SELECT MAX(warnings) FROM pm_permits WHERE account_id = ?), 0) as pm_max_warnings,
+                s.logs
+            FROM stats_summary s
+            LEFT JOIN account_summary a ON a.account_id = ?
+            WHERE s.id = 1
+            """,
+            (account_id, account_id)
+        )
+    
+    async def get_user_totals(self) -> Dict[str, int]:
+        """Get user, message and command totals across all users"""
+        summary = await self.get_stats_summary()
+        return {
+            'users': summary['users'],
+            'messages': summary['messages'],
+            'commands': summary['commands']
+        }
+    
+    async def count_active_users(self, since: datetime) -> int:
+        """Count users seen after a time"""
+        row = await self._fetch_one(
+            "SELECT COUNT(*) as count FROM user_stats WHERE account_id = ? AND last_seen > ?",
+            (current_account.get(), since)
+        )
+        return row['count'] if row else 0
+    
+    async def get_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the users with the most commands"""
+        return await self._fetch_all(
+            """
+            SELECT username, first_name, commands_used, total_messages
+            FROM user_stats 
+            WHERE account_id = ? AND commands_used > 0
+            ORDER BY commands_used DESC 
+            LIMIT ?
+            """,
+            (current_account.get(), limit)
+        )
+    
+    async def get_engagement_levels(self) -> List[Dict[str, Any]]:
+        """Count users per engagement level, busiest level first"""
+        return await self._fetch_all(
+            """
+            SELECT level as engagement, count
+            FROM engagement_summary
+            WHERE account_id = ? AND count > 0
+            ORDER BY count DESC
+            """,
+            (current_account.get(),)
+        )
+    
+    async def get_activity(self, since: datetime) -> List[Dict[str, Any]]:
+        """Get hourly activity rows (bucket, user_id, messages, commands) since a time"""
+        return await self._fetch_all(
+            """
+            SELECT bucket, user_id, messages, commands
+            FROM activity_rollup
+            WHERE account_id = ? AND bucket >= ?
+            ORDER BY bucket
+            """,
+            (current_account.get(), since.strftime(ACTIVITY_BUCKET_FORMAT))
+        )
     
     # Plugin settings methods
+    async def _load_plugin_settings(self):
+        """Load every plugin setting into memory"""
+        rows = await self._fetch_all(
+            "SELECT account_id, plugin_name, setting_key, user_id, setting_value FROM plugin_settings",
+            use_writer=True
+        )
+        self._settings = {
+            (row['account_id'], row['plugin_name'], row['setting_key'], row['user_id']): row['setting_value']
+            for row in rows
+        }
+        logger.info(f"Loaded {len(self._settings)} plugin settings")
+    
     async def get_plugin_setting(self, plugin_name: str, setting_key: str, 
                                 user_id: int = 0) -> Optional[str]:
-        """Get plugin setting value"""
-        async with self.connection.execute(
-            """
-            SELECT setting_value FROM plugin_settings 
-            WHERE plugin_name = ? AND setting_key = ? AND user_id = ?
-            """,
-            (plugin_name, setting_key, user_id)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        """Get plugin setting value (served from memory)"""
+        return self._settings.get((current_account.get(), plugin_name, setting_key, user_id))
     
     async def set_plugin_setting(self, plugin_name: str, setting_key: str,
                                 setting_value: str, user_id: int = 0) -> bool:
         """Set plugin setting value"""
         try:
             now = datetime.now()
-            await self.connection.execute(
+            await self._execute(
                 """
                 INSERT OR REPLACE INTO plugin_settings 
-                (plugin_name, setting_key, setting_value, user_id, updated_at)
-                VALUES (?, ?, ?, ?, ?)
+                (account_id, plugin_name, setting_key, setting_value, user_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
                 """,
-                (plugin_name, setting_key, setting_value, user_id, now)
+                (current_account.get(), plugin_name, setting_key, setting_value, user_id, now)
             )
-            await self.connection.commit()
+            await self._commit()
+            self._settings[(current_account.get(), plugin_name, setting_key, user_id)] = setting_value
             return True
         except Exception as e:
             logger.error(f"Failed to set plugin setting: {e}")
             return False
     
+    async def invalidate_plugin_setting(self, plugin_name: str, setting_key: str,
+                                        user_id: int = 0):
+        """Re-read one setting from the database"""
+        row = await self._fetch_one(
+            """
+            SELECT setting_value FROM plugin_settings 
+            WHERE account_id = ? AND plugin_name = ? AND setting_key = ? AND user_id = ?
+            """,
+            (current_account.get(), plugin_name, setting_key, user_id), use_writer=True
+        )
+        key = (current_account.get(), plugin_name, setting_key, user_id)
+        if row:
+            self._settings[key] = row['setting_value']
+        else:
+            self._settings.pop(key, None)
+    
     # Logging methods
     async def add_log(self, level: str, message: str, user_id: int = None,
                      chat_id: int = None) -> bool:
         """Add log entry to database"""
         try:
-            await self.connection.execute(
-                """
-                INSERT INTO bot_logs (level, message, user_id, chat_id)
+            table = await self._log_partition() if self.log_partitioning else "bot_logs"
+            await self._execute(
+                f"""
+                INSERT INTO {table} (level, message, user_id, chat_id)
                 VALUES (?, ?, ?, ?)
                 """,
                 (level, message, user_id, chat_id)
             )
-            await self.connection.commit()
+            await self._commit()
             return True
         except Exception as e:
             logger.error(f"Failed to add log: {e}")
             return False
     
+    @property
+    def _log_source(self) -> str:
+        """Table or view that covers every log entry"""
+        return LOG_VIEW if self._log_partitions else "bot_logs"
+    
+    async def get_recent_logs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the most recent log entries"""
+        return await self._fetch_all(
+            f"""
+            SELECT level, message, timestamp
+            FROM {self._log_source}
+            ORDER BY timestamp DESC
+            LIMIT ?
+            """,
+            (limit,)
+        )
+    
+    async def get_log_level_counts(self, since: datetime) -> List[Dict[str, Any]]:
+        """Count log entries per level since a (UTC) time"""
+        return await self._fetch_all(
+            f"""
+            SELECT level, COUNT(*) as count
+            FROM {self._log_source}
+            WHERE timestamp > ?
+            GROUP BY level
+            ORDER BY count DESC
+            """,
+            (since.strftime("%Y-%m-%d %H:%M:%S"),)
+        )
+    
+    async def count_logs(self) -> int:
+        """Count all log entries"""
+        row = await self._fetch_one("SELECT logs as count FROM stats_summary WHERE id = 1")
+        return row['count'] if row else 0
+    
+    async def _load_log_partitions(self):
+        """Discover existing log partitions"""
+        rows = await self._fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (f"{LOG_PARTITION_PREFIX}[0-9]*",), use_writer=True
+        )
+        self._log_partitions = sorted(row['name'] for row in rows)
+        if self._log_partitions:
+            await self._refresh_log_view(self._log_partitions)
+    
+    async def _log_partition(self) -> str:
+        """Get (creating if needed) today's log partition"""
+        name = f"{LOG_PARTITION_PREFIX}{datetime.utcnow().strftime('%Y%m%d')}"
+        if self._log_partitions and self._log_partitions[-1] == name:
+            return name
+        
+        async with self._log_partition_lock:
+            if name not in self._log_partitions:
+                await self._execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {name} (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        level TEXT NOT NULL,
+                        message TEXT NOT NULL,
+                        user_id INTEGER,
+                        chat_id INTEGER,
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                await self._execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{name}_timestamp ON {name} (timestamp, level)"
+                )
+                for statement in _log_summary_triggers(name):
+                    await self._execute(statement)
+                partitions = sorted(self._log_partitions + [name])
+                await self._refresh_log_view(partitions)
+                await self._commit(immediate=True)
+                self._log_partitions = partitions
+                logger.info(f"Created log partition {name}")
+        return name
+    
+    async def _refresh_log_view(self, partitions: List[str]):
+        """Recreate the view spanning bot_logs and the given partitions"""
+        selects = [f"SELECT {LOG_COLUMNS} FROM bot_logs"]
+        selects += [f"SELECT {LOG_COLUMNS} FROM {name}" for name in partitions]
+        await self._execute(f"DROP VIEW IF EXISTS {LOG_VIEW}")
+        await self._execute(
+            f"CREATE VIEW {LOG_VIEW} AS " + " UNION ALL ".join(selects)
+        )
+    
+    async def prune_logs(self) -> int:
+        """Apply log retention by age and row cap, returning rows removed
+        
+        Rows are deleted in chunks of log_prune_chunk with a commit and a
+        yield to the event loop in between, so the writer is never held for
+        long. Partitions older than the retention window are dropped whole.
+        """
+        async with self._prune_lock:
+            removed = await self._prune_logs()
+        
+        if removed:
+            logger.info(f"Pruned {removed} log entries")
+        return removed
+    
+    async def _prune_logs(self) -> int:
+        """Apply log retention (callers hold the prune lock)"""
+        removed = 0
+        
+        if self.log_retention_days > 0:
+            cutoff = datetime.utcnow() - timedelta(days=self.log_retention_days)
+            cutoff_partition = f"{LOG_PARTITION_PREFIX}{cutoff.strftime('%Y%m%d')}"
+            
+            for name in [p for p in self._log_partitions if p < cutoff_partition]:
+                removed += await self._drop_log_partition(name)
+            
+            for table in ["bot_logs"] + self._log_partitions:
+                removed += await self._delete_logs_chunked(
+                    table, "timestamp < ?", (cutoff.strftime("%Y-%m-%d %H:%M:%S"),)
+                )
+        
+        if self.log_max_rows > 0:
+            removed += await self._enforce_log_row_cap()
+        return removed
+    
+    async def _enforce_log_row_cap(self) -> int:
+        """Delete the oldest log entries beyond log_max_rows"""
+        if await self.count_logs() <= self.log_max_rows:
+            return 0
+        
+        counts = []
+        for table in ["bot_logs"] + self._log_partitions:
+            row = await self._fetch_one(f"SELECT COUNT(*) as count FROM {table}")
+            counts.append((table, row['count']))
+        
+        excess = sum(count for _, count in counts) - self.log_max_rows
+        removed = 0
+        for table, count in counts:  # Oldest first
+            if excess <= 0:
+                break
+            if table != "bot_logs" and count <= excess:
+                deleted = await self._drop_log_partition(table)
+            else:
+                deleted = await self._delete_logs_chunked(
+                    table, order_by="id", limit=min(count, excess)
+                )
+            excess -= deleted
+            removed += deleted
+        return removed
+    
+    async def _delete_logs_chunked(self, table: str, where: Optional[str] = None,
+                                   parameters: tuple = (), order_by: str = "timestamp",
+                                   limit: Optional[int] = None) -> int:
+        """Delete matching rows a chunk at a time, committing between chunks"""
+        condition = f"WHERE {where}" if where else ""
+        deleted = 0
+        while limit is None or deleted < limit:
+            chunk = self.log_prune_chunk
+            if limit is not None:
+                chunk = min(chunk, limit - deleted)
+            
+            cursor = await self._execute(
+                f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} {condition} ORDER BY {order_by} LIMIT ?
+                )
+                """,
+                parameters + (chunk,)
+            )
+            count = cursor.rowcount
+            await cursor.close()
+            await self._commit(immediate=True)
+            
+            deleted += count
+            if count < chunk:
+                break
+            await asyncio.sleep(0)  # Let queued writes through
+        return deleted
+    
+    async def _drop_log_partition(self, name: str) -> int:
+        """Drop a whole log partition, returning its row count"""
+        async with self._log_partition_lock:
+            # DROP TABLE skips the delete triggers, so settle the summary here
+            row = await self._fetch_one(f"SELECT COUNT(*) as count FROM {name}", use_writer=True)
+            await self._execute(
+                "UPDATE stats_summary SET logs = logs - ? WHERE id = 1", (row['count'],)
+            )
+            
+            partitions = [p for p in self._log_partitions if p != name]
+            if partitions:
+                await self._refresh_log_view(partitions)
+            else:
+                await self._execute(f"DROP VIEW IF EXISTS {LOG_VIEW}")
+            await self._execute(f"DROP TABLE IF EXISTS {name}")
+            await self._commit(immediate=True)
+            self._log_partitions = partitions
+        logger.info(f"Dropped log partition {name}")
+        return row['count'] if row else 0
+    
+    async def _prune_loop(self):
+        """Run log retention in the background"""
+        while True:
+            try:
+                await self.prune_logs()
+            except Exception as e:
+                logger.error(f"Failed to prune logs: {e}")
+            await asyncio.sleep(self.log_prune_interval)
+    
     # General methods
     async def execute_query(self, query: str, parameters: tuple = ()) -> bool:
         """Execute a custom query"""
         try:
-            await self.connection.execute(query, parameters)
-            await self.connection.commit()
+            await self._execute(query, parameters)
+            await self._commit()
+            
+            # Raw writes bypass the in-memory caches, so rebuild them
+            if self._permits_loaded and "pm_permits" in query.lower():
+                await self.load_pm_permits()
+            if "plugin_settings" in query.lower():
+                await self._load_plugin_settings()
             return True
         except Exception as e:
             logger.error(f"Failed to execute query: {e}")
@@ -295,16 +1673,206 @@ class Database:
     async def fetch_query(self, query: str, parameters: tuple = ()) -> List[Dict[str, Any]]:
         """Fetch results from a custom query"""
         try:
-            async with self.connection.execute(query, parameters) as cursor:
-                rows = await cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
+            return await self._fetch_all(query, parameters)
         except Exception as e:
             logger.error(f"Failed to fetch query: {e}")
             return []
     
+    async def iter_query(self, query: str, parameters: tuple = (),
+                         row_type: str = "dict", chunk_size: int = 500,
+                         chunked: bool = False) -> AsyncIterator[Any]:
+        """Stream results from a custom query in constant memory
+        
+        Rows are fetched chunk_size at a time from a pooled reader and yielded
+        one by one, or as lists when chunked is set. row_type picks the shape:
+        "tuple", "dict" or "record" (a slotted namedtuple). The reader, and its
+        WAL snapshot, is held until the iterator is exhausted or closed.
+        """
+        # Only time spent in SQLite counts; streams stay out of the slow-query
+        # log since they are long-running by design
+        elapsed = 0.0
+        async with self._reader() as conn:
+            try:
+                start = time.perf_counter()
+                async with conn.execute(query, parameters) as cursor:
+                    elapsed += time.perf_counter() - start
+                    if cursor.description is None:
+                        return
+                    
+                    columns = tuple(desc[0] for desc in cursor.description)
+                    make_row = _row_factory(columns, row_type)
+                    while True:
+                        start = time.perf_counter()
+                        rows = await cursor.fetchmany(chunk_size)
+                        elapsed += time.perf_counter() - start
+                        if not rows:
+                            break
+                        if make_row:
+                            rows = [make_row(row) for row in rows]
+                        if chunked:
+                            yield rows
+                        else:
+                            for row in rows:
+                                yield row
+            finally:
+                if self.query_stats_enabled:
+                    self.query_stats.record(normalize_sql(query), elapsed)
+    
+    # Bulk transfer methods
+    async def export_rows(self, table: str, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream the current account's rows of a transfer table as lists of row dicts"""
+        columns = TRANSFER_TABLES[table]
+        if table == "user_stats":
+            await self.flush_user_stats()
+        await self._commit_pending()
+        
+        async for rows in self.iter_query(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE account_id = ? ORDER BY user_id",
+            (current_account.get(),), chunk_size=chunk_size, chunked=True
+        ):
+            yield rows
+    
+    async def import_rows(self, table: str, rows: ImportRows,
+                          batch_size: int = 5000) -> int:
+        """Upsert row dicts into a transfer table, returning rows written
+        
+        Rows (a plain or async iterable) are written with executemany,
+        batch_size per transaction, so memory stays flat however many rows
+        arrive. Columns are taken from the first row (unknown keys are
+        ignored, user_id is required); an existing row only has those
+        columns updated. Rows go to the current account. A failed batch is
+        rolled back and the error re-raised; earlier batches stay committed.
+        """
+        account_id = current_account.get()
+        columns = query = None
+        written = 0
+        async for batch in iter_batches(rows, batch_size):
+            if query is None:
+                columns = [c for c in TRANSFER_TABLES[table] if c in batch[0]]
+                if "user_id" not in columns:
+                    raise ValueError(f"Rows for {table} need a user_id column")
+                
+                # Upsert only the supplied columns, so a partial or older-format
+                # file does not reset the rest of an existing row
+                updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "user_id")
+                query = (
+                    f"INSERT INTO {table} (account_id, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' for _ in columns)}) "
+                    f"ON CONFLICT(account_id, user_id) DO "
+                    + (f"UPDATE SET {updates}" if updates else "NOTHING")
+                )
+                
+                if table == "user_stats":
+                    await self.flush_user_stats()
+                await self._commit_pending()
+            
+            params = [(account_id, *(row.get(c) for c in columns)) for row in batch]
+            # Savepoint so a failed batch leaves other pending writes alone
+            async with self._savepoint("import_rows"):
+                await self._executemany(query, params)
+            await self._commit_now()
+            written += len(params)
+        
+        if query is None:
+            return 0
+        if table == "pm_permits":
+            self.permit_cache.clear()
+            if self._permits_loaded:
+                await self.load_pm_permits()
+        logger.info(f"Imported {written} rows into {table}")
+        return written
+    
+    # Backup methods
+    async def backup(self, dest_path: str, compress: bool = False,
+                     pages: int = 256, step_delay: float = 0.05,
+                     max_restarts: int = 3) -> str:
+        """Copy the live database to dest_path with SQLite's online backup API
+        
+        Pages are copied in steps of `pages` with a `step_delay` pause between
+        them, on a dedicated read-only connection running in its own thread, so
+        neither the event loop nor the writer is held. Writes from the bot
+        restart a stepped copy; after max_restarts it finishes in one step from
+        a single WAL snapshot instead. With compress set the copy is gzipped to
+        dest_path + ".gz". Returns the final path and raises on failure.
+        """
+        dest = Path(dest_path)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(dest.name + ".tmp")
+        
+        await self.flush()
+        
+        # In-memory databases are only reachable through the writer
+        if self._is_file_database():
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            source = await aiosqlite.connect(uri, uri=True)
+        else:
+            source = self.connection
+        
+        restarts = 0
+        last_remaining = None
+        
+        def progress(status, remaining, total):
+            nonlocal restarts, last_remaining
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > max_restarts:
+                    raise sqlite3.OperationalError("backup restarted too often")
+            last_remaining = remaining
+        
+        target = sqlite3.connect(tmp_path, check_same_thread=False)
+        try:
+            try:
+                await source.backup(target, pages=max(1, pages),
+                                    progress=progress, sleep=step_delay)
+            except sqlite3.OperationalError:
+                if restarts <= max_restarts:
+                    raise
+                logger.warning(
+                    f"Backup restarted {restarts} times, copying in a single step"
+                )
+                await source.backup(target, pages=-1)
+        except Exception:
+            target.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        finally:
+            if source is not self.connection:
+                await source.close()
+        target.close()
+        
+        if compress:
+            final_path = dest.with_name(dest.name + ".gz")
+            await asyncio.get_running_loop().run_in_executor(
+                None, _gzip_file, tmp_path, final_path
+            )
+        else:
+            final_path = dest
+            os.replace(tmp_path, final_path)
+        
+        logger.info(f"Database backed up to {final_path}")
+        return str(final_path)
+    
     async def close(self):
         """Close database connection"""
+        for task in (self._flush_task, self._stats_task, self._prune_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._flush_task = self._stats_task = self._prune_task = None
+        
         if self.connection:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # Already logged
             await self.connection.close()
+            self.connection = None
+            
+            for reader in self._readers:
+                await reader.close()
+            self._readers.clear()
+            self._reader_pool = None
             logger.info("Database connection closed")
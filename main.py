@@ -9,14 +9,20 @@ import logging
 import os
 import signal
 import sys
+import time
 from datetime import datetime
 
+# Everything imported from here on counts towards the "imports" startup phase
+IMPORT_START = time.perf_counter()
+
 from pyrogram import Client, filters
 from pyrogram.errors import ApiIdInvalid, ApiIdPublishedFlood, AuthKeyUnregistered
 
 from config import Config
-from database import Database
+from storage import create_database
 from plugin_loader import PluginLoader
+from profiler import StartupProfiler, profile_imports
+from supervisor import TaskSupervisor
 from utils.helpers import format_uptime
 
 # Configure logging
@@ -31,35 +37,88 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# What startup imports, for the import profile; main itself is left out as
+# importing it configures logging and builds the UserBot
+STARTUP_MODULES = ["pyrogram", "config", "storage", "plugin_loader", "profiler", "supervisor", "utils.helpers"]
+
+class Account:
+    """One Telegram session served by the shared UserBot runtime"""
+    
+    def __init__(self, account_id: int, session_string: str):
+        self.id = account_id
+        self.session_string = session_string
+        self.client = None
+        self.me = None
+    
+    @property
+    def name(self) -> str:
+        """Display name for logs and messages"""
+        if self.me:
+            return f"{self.me.first_name} ({self.me.username or self.me.id})"
+        return f"account {self.id}"
+
 class UserBot:
-    """Main UserBot class"""
+    """Main UserBot class
+    
+    Every session in SESSION_STRING/SESSION_STRINGS gets its own client, while
+    the plugin code, plugin loader, database and background tasks are shared.
+    """
     
     def __init__(self):
         self.start_time = datetime.now()
+        self.profiler = StartupProfiler(IMPORT_START)
+        self.profiler.record("imports", time.perf_counter() - IMPORT_START)
         self.config = Config()
-        self.db = Database()
+        self.db = create_database(
+            self.config.DATABASE_URL,
+            write_behind=self.config.DB_WRITE_BEHIND,
+            batch_size=self.config.DB_BATCH_SIZE,
+            flush_interval=self.config.DB_FLUSH_INTERVAL,
+            permit_cache_size=self.config.PM_PERMIT_CACHE_SIZE,
+            stats_flush_interval=self.config.STATS_FLUSH_INTERVAL,
+            read_pool_size=self.config.DB_READ_POOL_SIZE,
+            log_retention_days=self.config.LOG_RETENTION_DAYS,
+            log_max_rows=self.config.LOG_MAX_ROWS,
+            log_prune_interval=self.config.LOG_PRUNE_INTERVAL,
+            log_prune_chunk=self.config.LOG_PRUNE_CHUNK,
+            log_partitioning=self.config.LOG_PARTITIONING,
+            query_stats=self.config.DB_QUERY_STATS,
+            slow_query_ms=self.config.DB_SLOW_QUERY_MS
+        )
+        self.tasks = TaskSupervisor(self.config.TASK_CONCURRENCY)
+        self.accounts = [
+            Account(account_id, session) for account_id, session in enumerate(self.config.get_sessions())
+        ]
         self.client = None
         self.plugin_loader = None
         self.running = False
+        self.stop_event = None
+        self._stopped = False
         
     async def initialize(self):
         """Initialize the userbot"""
         try:
             # Initialize database
-            await self.db.initialize()
+            with self.profiler.phase("database"):
+                await self.db.initialize()
             logger.info("Database initialized successfully")
             
-            # Create Pyrogram client
-            self.client = Client(
-                name="userbot",
-                api_id=self.config.API_ID,
-                api_hash=self.config.API_HASH,
-                session_string=self.config.SESSION_STRING,
-                in_memory=False
-            )
+            # Create a Pyrogram client per account
+            with self.profiler.phase("client setup"):
+                for account in self.accounts:
+                    account.client = Client(
+                        name="userbot" if account.id == 0 else f"userbot-{account.id}",
+                        api_id=self.config.API_ID,
+                        api_hash=self.config.API_HASH,
+                        session_string=account.session_string,
+                        in_memory=False
+                    )
+            self.client = self.accounts[0].client
             
-            # Initialize plugin loader
-            self.plugin_loader = PluginLoader(self.client, self.db, self.config)
+            # Initialize the plugin loader shared by every account
+            self.plugin_loader = PluginLoader(self.client, self.db, self.config, self.tasks)
+            for account in self.accounts[1:]:
+                self.plugin_loader.add_client(account.client, account.id)
             
             logger.info("UserBot initialized successfully")
             return True
@@ -71,33 +130,53 @@ class UserBot:
     async def start(self):
         """Start the userbot"""
         try:
-            # Start the client
-            await self.client.start()
+            # Start every client concurrently
+            with self.profiler.phase("connect"):
+                results = await asyncio.gather(
+                    *(account.client.start() for account in self.accounts), return_exceptions=True
+                )
+            await self._drop_failed_accounts(results)
             
             # Get bot info
-            me = await self.client.get_me()
-            logger.info(f"UserBot started as {me.first_name} ({me.username or me.id})")
+            with self.profiler.phase("get_me"):
+                results = await asyncio.gather(
+                    *(account.client.get_me() for account in self.accounts), return_exceptions=True
+                )
+            for account, result in zip(self.accounts, results):
+                if not isinstance(result, Exception):
+                    account.me = result
+            await self._drop_failed_accounts(results)
+            
+            me = self.accounts[0].me
+            for account in self.accounts:
+                logger.info(f"UserBot started as {account.name} (account {account.id})")
             
             # Load plugins
-            await self.plugin_loader.load_all_plugins()
+            with self.profiler.phase("plugins"):
+                await self.plugin_loader.load_all_plugins()
             
             # Set running flag
             self.running = True
+            self.profiler.finish()
             
-            # Send startup message if configured
+            # Send startup message if configured (in the background)
             if self.config.LOG_CHAT_ID:
-                try:
-                    await self.client.send_message(
-                        self.config.LOG_CHAT_ID,
-                        f"🤖 **UserBot Started**\n\n"
-                        f"**User:** {me.first_name}\n"
-                        f"**Username:** @{me.username or 'None'}\n"
-                        f"**ID:** `{me.id}`\n"
-                        f"**Plugins Loaded:** {len(self.plugin_loader.loaded_plugins)}\n"
-                        f"**Start Time:** {self.start_time.strftime('%Y-%m-%d %H:%M:%S UTC')}"
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to send startup message: {e}")
+                self.tasks.spawn("startup.log_chat", self.client.send_message(
+                    self.config.LOG_CHAT_ID,
+                    f"🤖 **UserBot Started**\n\n"
+                    f"**User:** {me.first_name}\n"
+                    f"**Username:** @{me.username or 'None'}\n"
+                    f"**ID:** `{me.id}`\n"
+                    f"**Accounts:** {len(self.accounts)}\n"
+                    f"**Plugins Loaded:** {len(self.plugin_loader.loaded_plugins)} "
+                    f"(+{len(self.plugin_loader.lazy_plugins)} on first use)\n"
+                    f"**Start Time:** {self.start_time.strftime('%Y-%m-%d %H:%M:%S UTC')}\n\n"
+                    f"{self.profiler.format_breakdown(self.plugin_loader)}"
+                ))
+            
+            # Written in the background; the import profile runs a second interpreter
+            if self.config.STARTUP_REPORT:
+                self.tasks.spawn("startup.report", self.write_startup_report())
             
             logger.info("UserBot is running...")
             
@@ -108,31 +187,111 @@ class UserBot:
             logger.error(f"Failed to start UserBot: {e}")
             raise
     
-    async def stop(self):
-        """Stop the userbot"""
-        try:
-            logger.info("Stopping UserBot...")
+    async def _drop_failed_accounts(self, results: list):
+        """Raise if the primary account failed; stop serving extra accounts that did
+        
+        An account whose client connected but then failed (get_me) is
+        disconnected before it is dropped.
+        """
+        for account, result in list(zip(self.accounts, results)):
+            if not isinstance(result, Exception):
+                continue
+            if account.id == 0:
+                raise result
+            logger.error(f"Account {account.id} failed to start, skipping it: {result}")
+            self.plugin_loader.remove_client(account.id)
+            self.accounts.remove(account)
+            if account.client.is_connected:
+                try:
+                    await account.client.stop()
+                except Exception as e:
+                    logger.error(f"Failed to stop client of account {account.id}: {e}")
+    
+    async def write_startup_report(self):
+        """Write the startup report to STARTUP_REPORT, profiling imports first if enabled"""
+        if self.config.STARTUP_IMPORT_PROFILE:
+            modules = STARTUP_MODULES + [type(self.db).__module__] + [
+                f"plugins.{name}" for name in self.plugin_loader.get_loaded_plugins()
+            ]
+            try:
+                self.profiler.imports = await profile_imports(
+                    modules, cwd=os.path.dirname(os.path.abspath(__file__))
+                )
+                logger.info("Slowest imports: " + ", ".join(
+                    f"{entry['module']} {entry['self_ms']:.1f}ms" for entry in self.profiler.imports[:5]
+                ))
+            except Exception as e:
+                logger.error(f"Import profiling failed: {e}")
+        
+        self.profiler.write_report(self.config.STARTUP_REPORT, self.plugin_loader)
+    
+    def request_stop(self, reason: str = "requested"):
+        """Ask the run loop to shut down (safe to call more than once)"""
+        if self.stop_event and not self.stop_event.is_set():
+            logger.info(f"Shutdown {reason}")
             self.running = False
-            
-            # Unload plugins
-            if self.plugin_loader:
-                await self.plugin_loader.unload_all_plugins()
-            
-            # Stop client
-            if self.client:
-                await self.client.stop()
-            
-            # Close database
-            if self.db:
-                await self.db.close()
-            
-            logger.info("UserBot stopped successfully")
-            
+            self.stop_event.set()
+    
+    async def _shutdown_phase(self, name: str, coro) -> bool:
+        """Run one shutdown phase, logging its duration; a failure does not stop later phases"""
+        start = time.perf_counter()
+        try:
+            await coro
+            return True
         except Exception as e:
-            logger.error(f"Error stopping UserBot: {e}")
+            logger.error(f"Shutdown phase '{name}' failed: {e}")
+            return False
+        finally:
+            logger.info(f"Shutdown phase '{name}' took {(time.perf_counter() - start) * 1000:.0f}ms")
+    
+    async def stop(self):
+        """Stop the userbot in phases, within SHUTDOWN_TIMEOUT
+        
+        New updates are ignored first, then in-flight handlers and
+        background writes get the remaining time, buffered writes are
+        flushed, and only then are the clients disconnected.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        
+        logger.info("Stopping UserBot...")
+        self.running = False
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.config.SHUTDOWN_TIMEOUT
+        
+        def remaining() -> float:
+            return max(0.0, deadline - time.monotonic())
+        
+        if self.plugin_loader:
+            # Stop accepting updates, then let running handlers finish; half
+            # the budget at most, so their background writes still get time
+            self.plugin_loader.stop_accepting()
+            await self._shutdown_phase("in-flight handlers", self.plugin_loader.wait_idle(remaining() / 2))
+            await self._shutdown_phase("unload plugins", self.plugin_loader.unload_all_plugins())
+        
+        # Let background writes finish before the database is flushed and closed
+        await self._shutdown_phase("background tasks", self.tasks.drain(remaining()))
+        
+        # Drain buffered stats and pending database writes
+        if self.db:
+            await self._shutdown_phase("flush database", self.db.flush())
+        
+        clients = [
+            account.client for account in self.accounts
+            if account.client and account.client.is_connected
+        ]
+        if clients:
+            await self._shutdown_phase("stop clients", asyncio.gather(*(client.stop() for client in clients)))
+        
+        if self.db:
+            await self._shutdown_phase("close database", self.db.close())
+        
+        logger.info(f"UserBot stopped in {(time.perf_counter() - start) * 1000:.0f}ms")
     
     async def run(self):
         """Main run loop"""
+        self.stop_event = asyncio.Event()
         try:
             # Initialize
             if not await self.initialize():
@@ -141,9 +300,8 @@ class UserBot:
             # Start
             await self.start()
             
-            # Keep running
-            while self.running:
-                await asyncio.sleep(1)
+            # Wait until a signal (or a plugin) requests shutdown
+            await self.stop_event.wait()
                 
         except KeyboardInterrupt:
             logger.info("Received keyboard interrupt")
@@ -157,16 +315,24 @@ class UserBot:
 # Global userbot instance
 userbot = UserBot()
 
-def signal_handler(signum, frame):
-    """Handle shutdown signals"""
-    logger.info(f"Received signal {signum}")
-    userbot.running = False
+def install_signal_handlers():
+    """Route SIGINT/SIGTERM to the run loop's stop event"""
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(
+                signum, userbot.request_stop, f"on signal {signal.Signals(signum).name}"
+            )
+        except NotImplementedError:
+            # Windows event loops have no add_signal_handler
+            signal.signal(signum, lambda sig, frame: loop.call_soon_threadsafe(
+                userbot.request_stop, f"on signal {signal.Signals(sig).name}"
+            ))
 
 async def main():
     """Main entry point"""
     # Set up signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    install_signal_handlers()
     
     try:
         # Run the userbot
@@ -0,0 +1,520 @@
+"""
+In-memory storage backend for UserBot
+Dict-and-index engine with zero I/O for benchmarks and ephemeral replicas
+"""
+
+import asyncio
+import bisect
+import gzip
+import heapq
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+
+from storage import (
+    StorageBackend, current_account, PM_PERMIT_COLUMNS, ACTIVITY_BUCKET_FORMAT, TRANSFER_TABLES,
+    ImportRows, iter_batches
+)
+
+logger = logging.getLogger(__name__)
+
+# SQLite's CURRENT_TIMESTAMP format, used for log timestamps and defaults
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Same bands as the SQLite engagement query
+ENGAGEMENT_LEVELS = (
+    (0, 'Inactive'),
+    (5, 'Low'),
+    (20, 'Medium'),
+    (50, 'High'),
+)
+
+def _engagement(commands_used: int) -> str:
+    """Get the engagement level for a command count"""
+    for limit, level in ENGAGEMENT_LEVELS:
+        if commands_used <= limit:
+            return level
+    return 'Very High'
+
+def _utc_now() -> str:
+    """Current UTC time as SQLite's CURRENT_TIMESTAMP would store it"""
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+def _write_snapshot(snapshot: Dict[str, Any], dest: Path, compress: bool):
+    """Encode a snapshot as JSON (gzipped if asked) and write it to dest atomically"""
+    payload = json.dumps(snapshot, default=str).encode("utf-8")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(dest.name + ".tmp")
+    try:
+        with (gzip.open(tmp_path, "wb", compresslevel=6) if compress else open(tmp_path, "wb")) as handle:
+            handle.write(payload)
+        os.replace(tmp_path, dest)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+class AccountData:
+    """Permits, stats, activity and settings of one account"""
+    
+    def __init__(self):
+        self.pm_permits: Dict[int, Dict[str, Any]] = {}
+        self.approved_users = set()
+        self.pm_warnings = 0
+        self.user_stats: Dict[int, Dict[str, Any]] = {}
+        self.user_totals = {'messages': 0, 'commands': 0}
+        self.plugin_settings: Dict[Tuple[str, str, int], str] = {}
+        
+        # activity_rollup: sorted bucket index -> {user_id: [messages, commands]}
+        self.activity_buckets: List[str] = []
+        self.activity: Dict[str, Dict[int, List[int]]] = {}
+
+class MemoryDatabase(StorageBackend):
+    """In-memory storage backend
+    
+    Rows are kept as dicts shaped like the SQLite tables so plugins see the
+    same data either way, with one AccountData per account. Nothing is
+    persisted, and raw SQL (execute_query, fetch_query, iter_query) is not
+    supported (supports_sql is False). Backups are JSON snapshots.
+    """
+    
+    supports_sql = False
+    
+    def __init__(self, log_retention_days: int = 0, log_max_rows: int = 0,
+                 log_prune_interval: float = 3600, **options):
+        # SQLite-only options (write-behind, pools, ...) are accepted and ignored
+        self.log_retention_days = log_retention_days
+        self.log_max_rows = log_max_rows
+        self.log_prune_interval = log_prune_interval
+        self._prune_task = None
+        
+        self.accounts: Dict[int, AccountData] = {}
+        
+        # bot_logs: append-only, so timestamps stay sorted for bisect
+        self.logs: List[Dict[str, Any]] = []
+        self.log_timestamps: List[str] = []
+        self._next_log_id = 1
+    
+    # Lifecycle methods
+    async def initialize(self):
+        """Initialize the in-memory store"""
+        if self.log_retention_days > 0 or self.log_max_rows > 0:
+            self._prune_task = asyncio.create_task(self._prune_loop())
+        logger.info("In-memory database initialized (nothing will be persisted)")
+    
+    async def flush(self):
+        """Nothing is buffered"""
+    
+    async def close(self):
+        """Release all data"""
+        if self._prune_task:
+            self._prune_task.cancel()
+            try:
+                await self._prune_task
+            except asyncio.CancelledError:
+                pass
+            self._prune_task = None
+        self.accounts.clear()
+        self.logs.clear()
+        self.log_timestamps.clear()
+        logger.info("In-memory database closed")
+    
+    def _data(self) -> AccountData:
+        """Data of the current account"""
+        account_id = current_account.get()
+        data = self.accounts.get(account_id)
+        if data is None:
+            data = self.accounts[account_id] = AccountData()
+        return data
+    
+    # PM Permit methods
+    def _put_pm_permit(self, row: Dict[str, Any]):
+        """Store a permit row and keep the approval index and totals current"""
+        data = self._data()
+        old = data.pm_permits.get(row['user_id'])
+        if old is not row:
+            data.pm_warnings += row['warnings'] - (old['warnings'] if old else 0)
+        data.pm_permits[row['user_id']] = row
+        if row['approved']:
+            data.approved_users.add(row['user_id'])
+        else:
+            data.approved_users.discard(row['user_id'])
+    
+    async def load_pm_permits(self) -> int:
+        """Approved users are always indexed"""
+        return sum(len(data.approved_users) for data in self.accounts.values())
+    
+    async def is_pm_approved(self, user_id: int) -> bool:
+        """Check whether a user is approved for PM"""
+        return user_id in self._data().approved_users
+    
+    async def get_pm_permit(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get PM permit status for a user"""
+        row = self._data().pm_permits.get(user_id)
+        return dict(row) if row else None
+    
+    async def get_pm_permit_summary(self) -> Dict[str, Any]:
+        """Get PM permit totals (total, approved, total_warnings, max_warnings)"""
+        data = self._data()
+        return {
+            'total': len(data.pm_permits),
+            'approved': len(data.approved_users),
+            'total_warnings': data.pm_warnings,
+            'max_warnings': max((row['warnings'] for row in data.pm_permits.values()), default=0)
+        }
+    
+    async def get_top_warned_users(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the users with the most PM warnings"""
+        rows = heapq.nlargest(
+            limit,
+            (row for row in self._data().pm_permits.values() if row['warnings'] > 0),
+            key=lambda row: row['warnings']
+        )
+        return [
+            {'username': row['username'], 'first_name': row['first_name'],
+             'warnings': row['warnings']}
+            for row in rows
+        ]
+    
+    async def add_pm_permit(self, user_id: int, username: str = None,
+                           first_name: str = None, approved: bool = False,
+                           approved_by: int = None) -> bool:
+        """Add or update PM permit entry"""
+        now = str(datetime.now())
+        row = dict.fromkeys(PM_PERMIT_COLUMNS)
+        row.update(
+            user_id=user_id, username=username, first_name=first_name,
+            approved=int(approved), approved_by=approved_by,
+            approved_at=now if approved else None, warnings=0, created_at=now
+        )
+        self._put_pm_permit(row)
+        return True
+    
+    async def approve_pm(self, user_id: int, approved_by: int) -> bool:
+        """Approve a user for PM"""
+        row = self._data().pm_permits.get(user_id)
+        if row:
+            row.update(approved=1, approved_by=approved_by, approved_at=str(datetime.now()))
+            self._put_pm_permit(row)
+        return True
+    
+    async def disapprove_pm(self, user_id: int) -> bool:
+        """Disapprove a user for PM"""
+        row = self._data().pm_permits.get(user_id)
+        if row:
+            row.update(approved=0, approved_by=None, approved_at=None)
+            self._put_pm_permit(row)
+        return True
+    
+    async def add_pm_warning(self, user_id: int) -> int:
+        """Add warning to PM permit and return total warnings"""
+        data = self._data()
+        now = str(datetime.now())
+        row = data.pm_permits.get(user_id)
+        if row is None:
+            row = dict.fromkeys(PM_PERMIT_COLUMNS)
+            row.update(user_id=user_id, approved=0, warnings=0, created_at=now)
+            self._put_pm_permit(row)
+        
+        row['warnings'] += 1
+        row['last_warning'] = now
+        data.pm_warnings += 1
+        return row['warnings']
+    
+    # User statistics methods
+    async def update_user_stats(self, user_id: int, username: str = None,
+                               first_name: str = None, message_count: int = 0,
+                               command_count: int = 0) -> bool:
+        """Update user statistics and the hourly activity rollup"""
+        data = self._data()
+        current_time = datetime.now()
+        now = str(current_time)
+        
+        row = data.user_stats.get(user_id)
+        if row is None:
+            row = data.user_stats[user_id] = {
+                'user_id': user_id, 'total_messages': 0, 'commands_used': 0,
+                'created_at': _utc_now()
+            }
+        row.update(
+            username=username,
+            first_name=first_name,
+            total_messages=row['total_messages'] + message_count,
+            commands_used=row['commands_used'] + command_count,
+            last_seen=now,
+            updated_at=now
+        )
+        data.user_totals['messages'] += message_count
+        data.user_totals['commands'] += command_count
+        
+        bucket = current_time.strftime(ACTIVITY_BUCKET_FORMAT)
+        users = data.activity.get(bucket)
+        if users is None:
+            users = data.activity[bucket] = {}
+            bisect.insort(data.activity_buckets, bucket)
+        counts = users.setdefault(user_id, [0, 0])
+        counts[0] += message_count
+        counts[1] += command_count
+        return True
+    
+    async def flush_user_stats(self) -> bool:
+        """Statistics are applied immediately"""
+        return True
+    
+    async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user statistics"""
+        row = self._data().user_stats.get(user_id)
+        return dict(row) if row else None
+    
+    async def get_stats_summary(self) -> Dict[str, int]:
+        """Get running totals (users, messages, commands, pm_total, pm_approved,
+        pm_warnings, pm_max_warnings, logs)"""
+        data = self._data()
+        pm_data = await self.get_pm_permit_summary()
+        return {
+            'users': len(data.user_stats),
+            **data.user_totals,
+            'pm_total': pm_data['total'],
+            'pm_approved': pm_data['approved'],
+            'pm_warnings': pm_data['total_warnings'],
+            'pm_max_warnings': pm_data['max_warnings'],
+            'logs': len(self.logs)
+        }
+    
+    async def get_user_totals(self) -> Dict[str, int]:
+        """Get user, message and command totals across all users"""
+        data = self._data()
+        return {'users': len(data.user_stats), **data.user_totals}
+    
+    async def count_active_users(self, since: datetime) -> int:
+        """Count users seen after a time"""
+        since = str(since)
+        return sum(1 for row in self._data().user_stats.values() if row['last_seen'] > since)
+    
+    async def get_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the users with the most commands"""
+        rows = heapq.nlargest(
+            limit,
+            (row for row in self._data().user_stats.values() if row['commands_used'] > 0),
+            key=lambda row: row['commands_used']
+        )
+        return [
+            {'username': row['username'], 'first_name': row['first_name'],
+             'commands_used': row['commands_used'], 'total_messages': row['total_messages']}
+            for row in rows
+        ]
+    
+    async def get_engagement_levels(self) -> List[Dict[str, Any]]:
+        """Count users per engagement level, busiest level first"""
+        counts: Dict[str, int] = {}
+        for row in self._data().user_stats.values():
+            level = _engagement(row['commands_used'])
+            counts[level] = counts.get(level, 0) + 1
+        return [
+            {'engagement': level, 'count': count}
+            for level, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        ]
+    
+    async def get_activity(self, since: datetime) -> List[Dict[str, Any]]:
+        """Get hourly activity rows (bucket, user_id, messages, commands) since a time"""
+        data = self._data()
+        start = bisect.bisect_left(data.activity_buckets, since.strftime(ACTIVITY_BUCKET_FORMAT))
+        return [
+            {'bucket': bucket, 'user_id': user_id, 'messages': messages, 'commands': commands}
+            for bucket in data.activity_buckets[start:]
+            for user_id, (messages, commands) in data.activity[bucket].items()
+        ]
+    
+    # Plugin settings methods
+    async def get_plugin_setting(self, plugin_name: str, setting_key: str,
+                                user_id: int = 0) -> Optional[str]:
+        """Get plugin setting value"""
+        return self._data().plugin_settings.get((plugin_name, setting_key, user_id))
+    
+    async def set_plugin_setting(self, plugin_name: str, setting_key: str,
+                                setting_value: str, user_id: int = 0) -> bool:
+        """Set plugin setting value"""
+        self._data().plugin_settings[(plugin_name, setting_key, user_id)] = setting_value
+        return True
+    
+    async def invalidate_plugin_setting(self, plugin_name: str, setting_key: str,
+                                        user_id: int = 0):
+        """Settings are never cached separately"""
+    
+    # Logging methods
+    async def add_log(self, level: str, message: str, user_id: int = None,
+                     chat_id: int = None) -> bool:
+        """Add log entry"""
+        timestamp = _utc_now()
+        self.logs.append({
+            'id': self._next_log_id, 'level': level, 'message': message,
+            'user_id': user_id, 'chat_id': chat_id, 'timestamp': timestamp
+        })
+        self.log_timestamps.append(timestamp)
+        self._next_log_id += 1
+        return True
+    
+    async def get_recent_logs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the most recent log entries"""
+        return [
+            {'level': log['level'], 'message': log['message'], 'timestamp': log['timestamp']}
+            for log in reversed(self.logs[-limit:])
+        ] if limit > 0 else []
+    
+    async def get_log_level_counts(self, since: datetime) -> List[Dict[str, Any]]:
+        """Count log entries per level since a (UTC) time"""
+        start = bisect.bisect_right(self.log_timestamps, since.strftime(TIMESTAMP_FORMAT))
+        counts: Dict[str, int] = {}
+        for log in self.logs[start:]:
+            counts[log['level']] = counts.get(log['level'], 0) + 1
+        return [
+            {'level': level, 'count': count}
+            for level, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        ]
+    
+    async def count_logs(self) -> int:
+        """Count all log entries"""
+        return len(self.logs)
+    
+    async def prune_logs(self) -> int:
+        """Apply log retention, returning rows removed"""
+        removed = 0
+        if self.log_retention_days > 0:
+            cutoff = datetime.utcnow() - timedelta(days=self.log_retention_days)
+            removed += self._drop_oldest_logs(
+                bisect.bisect_left(self.log_timestamps, cutoff.strftime(TIMESTAMP_FORMAT))
+            )
+        if self.log_max_rows > 0 and len(self.logs) > self.log_max_rows:
+            removed += self._drop_oldest_logs(len(self.logs) - self.log_max_rows)
+        if removed:
+            logger.info(f"Pruned {removed} log entries")
+        return removed
+    
+    def _drop_oldest_logs(self, count: int) -> int:
+        """Remove the oldest log entries"""
+        del self.logs[:count]
+        del self.log_timestamps[:count]
+        return count
+    
+    async def _prune_loop(self):
+        """Run log retention in the background"""
+        while True:
+            await self.prune_logs()
+            await asyncio.sleep(self.log_prune_interval)
+    
+    # Query instrumentation methods
+    def get_query_stats(self, limit: int = 10, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """No SQL runs in the in-memory backend"""
+        return []
+    
+    def get_slow_queries(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """No SQL runs in the in-memory backend"""
+        return []
+    
+    def reset_query_stats(self):
+        """No SQL runs in the in-memory backend"""
+    
+    # Bulk transfer methods
+    async def export_rows(self, table: str, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream a transfer table as lists of up to chunk_size row dicts"""
+        data = self._data()
+        columns = TRANSFER_TABLES[table]
+        store = data.pm_permits if table == "pm_permits" else data.user_stats
+        user_ids = sorted(store)
+        for start in range(0, len(user_ids), chunk_size):
+            yield [
+                {column: store[user_id].get(column) for column in columns}
+                for user_id in user_ids[start:start + chunk_size]
+                if user_id in store
+            ]
+    
+    async def import_rows(self, table: str, rows: ImportRows,
+                          batch_size: int = 5000) -> int:
+        """Upsert row dicts (a plain or async iterable) into a transfer table, returning rows written
+        
+        An existing row only has the supplied columns updated.
+        """
+        data = self._data()
+        columns = TRANSFER_TABLES[table]
+        written = 0
+        async for batch in iter_batches(rows, batch_size):
+            for values in batch:
+                if values.get('user_id') is None:
+                    raise ValueError(f"Rows for {table} need a user_id column")
+                
+                existing = (data.pm_permits if table == "pm_permits" else data.user_stats).get(values['user_id'])
+                row = dict(existing) if existing else {column: None for column in columns}
+                row.update((column, values[column]) for column in columns if column in values)
+                if table == "pm_permits":
+                    row['approved'] = int(bool(row['approved']))
+                    row['warnings'] = row['warnings'] or 0
+                    self._put_pm_permit(row)
+                else:
+                    row['total_messages'] = row['total_messages'] or 0
+                    row['commands_used'] = row['commands_used'] or 0
+                    old = data.user_stats.get(row['user_id'])
+                    data.user_totals['messages'] += row['total_messages'] - (old['total_messages'] if old else 0)
+                    data.user_totals['commands'] += row['commands_used'] - (old['commands_used'] if old else 0)
+                    data.user_stats[row['user_id']] = row
+                written += 1
+        return written
+    
+    # Backup methods
+    async def backup(self, dest_path: str, compress: bool = False,
+                     pages: int = 256, step_delay: float = 0.05,
+                     max_restarts: int = 3) -> str:
+        """Write every account's rows and the logs to a JSON snapshot
+        
+        The snapshot is copied on the event loop in one step, so it is
+        consistent and the paging options are ignored; encoding, compression
+        and the write run in the default executor. dest_path's suffix is
+        replaced with .json (.json.gz when compressed), since the copy is
+        not a SQLite file.
+        """
+        snapshot = {
+            'accounts': {
+                str(account_id): {
+                    'pm_permits': [dict(row) for row in data.pm_permits.values()],
+                    'user_stats': [dict(row) for row in data.user_stats.values()],
+                    'plugin_settings': [
+                        {'plugin_name': plugin_name, 'setting_key': setting_key,
+                         'user_id': user_id, 'setting_value': value}
+                        for (plugin_name, setting_key, user_id), value in data.plugin_settings.items()
+                    ],
+                    'activity_rollup': [
+                        {'bucket': bucket, 'user_id': user_id, 'messages': messages, 'commands': commands}
+                        for bucket in data.activity_buckets
+                        for user_id, (messages, commands) in data.activity[bucket].items()
+                    ]
+                }
+                for account_id, data in self.accounts.items()
+            },
+            'bot_logs': list(self.logs)
+        }
+        
+        dest = Path(dest_path).with_suffix(".json.gz" if compress else ".json")
+        await asyncio.get_running_loop().run_in_executor(None, _write_snapshot, snapshot, dest, compress)
+        
+        logger.info(f"In-memory database backed up to {dest}")
+        return str(dest)
+    
+    # General methods
+    async def execute_query(self, query: str, parameters: tuple = ()) -> bool:
+        """Raw SQL is not supported by the in-memory backend"""
+        logger.error("Failed to execute query: raw SQL is not supported by the in-memory backend")
+        return False
+    
+    async def fetch_query(self, query: str, parameters: tuple = ()) -> List[Dict[str, Any]]:
+        """Raw SQL is not supported by the in-memory backend"""
+        logger.error("Failed to fetch query: raw SQL is not supported by the in-memory backend")
+        return []
+    
+    async def iter_query(self, query: str, parameters: tuple = (),
+                         row_type: str = "dict", chunk_size: int = 500,
+                         chunked: bool = False) -> AsyncIterator[Any]:
+        """Raw SQL is not supported by the in-memory backend"""
+        logger.error("Failed to iterate query: raw SQL is not supported by the in-memory backend")
+        return
+        yield  # Makes this an async generator
@@ -3,32 +3,490 @@ Plugin loader system for UserBot
 Handles dynamic loading and management of plugins
 """
 
+import ast
+import asyncio
+import contextvars
+import functools
+import gc
 import importlib
 import inspect
+import json
 import logging
 import os
+import re
 import sys
+import time
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable, Tuple
 
 from pyrogram import Client, filters
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler, InlineQueryHandler
 from pyrogram.types import Message
 
-from database import Database
+from storage import StorageBackend, current_account
 from config import Config
+from supervisor import TaskSupervisor
+from utils.metrics import LatencyRegistry
 
 logger = logging.getLogger(__name__)
 
+# Handler classes for the handler_type names used by the decorators below
+HANDLER_TYPES = {
+    'on_message': MessageHandler,
+    'on_callback_query': CallbackQueryHandler,
+    'on_inline_query': InlineQueryHandler,
+}
+
+# The command router runs in its own group ahead of plugin handlers, so it
+# never shadows them (Pyrogram stops at the first match within a group)
+COMMAND_GROUP = -1
+HANDLER_GROUP = 0
+
+# Same argument splitting as pyrogram's filters.command (quotes group words)
+COMMAND_ARGS_RE = re.compile(r"([\"'])(.*?)(?<!\\)\1|(\S+)")
+ESCAPED_QUOTE_RE = re.compile(r"\\([\"'])")
+
+# Bump when the manifest entry format changes
+MANIFEST_VERSION = 2
+
+# Seconds to wait after an unload before checking the old objects were collected
+LEAK_CHECK_DELAY = 1.0
+
+# Decorators that register event handlers; plugins using them load eagerly
+EVENT_DECORATORS = {'handler', 'message_handler', 'callback_handler', 'inline_handler'}
+
+def scan_plugin(path: Path) -> Dict[str, Any]:
+    """Read a plugin's commands without importing it
+    
+    Commands come from __plugin_info__['commands'] and from the names and
+    aliases of its @command decorators. A plugin is marked eager when it
+    registers event handlers, declares no commands, names a command with
+    something other than a literal, or sets __plugin_info__['lazy'] to
+    False (e.g. to start background tasks).
+    """
+    tree = ast.parse(path.read_text(encoding="utf-8"), str(path))
+    
+    info = {}
+    decorated = []
+    has_events = False
+    dynamic_names = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == '__plugin_info__'
+            for target in node.targets
+        ):
+            info = ast.literal_eval(node.value)
+        elif isinstance(node, ast.AsyncFunctionDef):
+            for decorator in node.decorator_list:
+                func = decorator.func if isinstance(decorator, ast.Call) else decorator
+                name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+                if name in EVENT_DECORATORS:
+                    has_events = True
+                elif name == 'command' and isinstance(decorator, ast.Call):
+                    arguments = decorator.args[:2] + [
+                        keyword.value for keyword in decorator.keywords
+                        if keyword.arg in ('names', 'aliases')
+                    ]
+                    try:
+                        for argument in arguments:
+                            value = ast.literal_eval(argument)
+                            decorated.extend([value] if isinstance(value, str) else value or [])
+                    except (ValueError, TypeError):
+                        dynamic_names = True
+    
+    commands = list(dict.fromkeys(
+        name.lower() for name in [*info.get('commands', []), *decorated]
+    ))
+    return {
+        'commands': commands,
+        'eager': has_events or dynamic_names or not commands or info.get('lazy') is False
+    }
+
+def get_requires(module) -> List[str]:
+    """Get the plugins a module lists in __plugin_info__['requires']"""
+    return list(getattr(module, '__plugin_info__', {}).get('requires', []))
+
+def find_cycles(graph: Dict[str, List[str]]) -> set:
+    """Get the nodes of a dependency graph that lie on a cycle"""
+    on_cycle = set()
+    state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+    
+    def visit(node: str, path: List[str]):
+        state[node] = 1
+        path.append(node)
+        for dependency in graph.get(node, []):
+            if state.get(dependency) == 1:
+                on_cycle.update(path[path.index(dependency):])
+            elif dependency in graph and not state.get(dependency):
+                visit(dependency, path)
+        path.pop()
+        state[node] = 2
+    
+    for node in graph:
+        if not state.get(node):
+            visit(node, [])
+    return on_cycle
+
+class CommandRouter:
+    """Single prefix-aware dispatcher for all plugin commands
+    
+    The prefix is stripped once per update and the command name is resolved
+    with one dict lookup, so dispatch cost does not grow with the number of
+    plugins. Handlers see message.command exactly as filters.command would
+    set it.
+    """
+    
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.commands: Dict[str, Tuple[str, Callable]] = {}
+    
+    def register(self, plugin_name: str, names: List[str], func: Callable) -> List[str]:
+        """Register a handler under its names, returning any conflicts"""
+        conflicts = []
+        for name in names:
+            existing = self.commands.get(name)
+            if existing:
+                conflicts.append(
+                    f"{self.prefix}{name} from {plugin_name}.{func.__name__} "
+                    f"(already registered by {existing[0]}.{existing[1].__name__})"
+                )
+                continue
+            self.commands[name] = (plugin_name, func)
+        return conflicts
+    
+    def unregister(self, plugin_name: str):
+        """Remove every command owned by a plugin"""
+        self.commands = {
+            name: entry for name, entry in self.commands.items()
+            if entry[0] != plugin_name
+        }
+    
+    def get_commands(self, plugin_name: str) -> List[str]:
+        """Get the command names owned by a plugin"""
+        return [name for name, entry in self.commands.items() if entry[0] == plugin_name]
+    
+    def resolve(self, text: Optional[str]) -> Optional[Tuple[Callable, List[str]]]:
+        """Parse a message text into (handler, command list), if it is a command"""
+        if not text or not text.startswith(self.prefix):
+            return None
+        
+        body = text[len(self.prefix):]
+        parts = body.split(None, 1)
+        if not parts or body[0].isspace():
+            return None
+        
+        name = parts[0]
+        rest = parts[1] if len(parts) > 1 else ""
+        entry = self.commands.get(name.lower())
+        if entry is None:
+            return None
+        
+        args = [
+            ESCAPED_QUOTE_RE.sub(r"\1", match.group(2) or match.group(3) or "")
+            for match in COMMAND_ARGS_RE.finditer(rest)
+        ]
+        return entry[1], [name.lower()] + args
+    
+    async def dispatch(self, client: Client, message: Message):
+        """Run the handler for a command message"""
+        resolved = self.resolve(message.text or message.caption)
+        if resolved is None:
+            return
+        
+        func, message.command = resolved
+        try:
+            await func(client, message)
+        except Exception as e:
+            logger.error(f"Command {message.command[0]} failed: {e}")
+
+# Context of the handler currently running in this task
+_current_context: contextvars.ContextVar = contextvars.ContextVar("handler_context")
+
+def spawn_detached(spawn: Callable, name: str, coro) -> Optional[asyncio.Task]:
+    """Spawn a task that keeps only the current account from the caller's context
+    
+    A task copies the context it is created in; spawned from a handler, it
+    would otherwise hold the HandlerContext, and so the plugin, alive.
+    """
+    account_id = current_account.get()
+    context = contextvars.Context()
+    context.run(current_account.set, account_id)
+    return context.run(spawn, name, coro)
+
+class HandlerContext:
+    """State shared by the middleware around one handler call"""
+    
+    def __init__(self, plugin_name: str, handler_name: str, kind: str, client: Client, update,
+                 account_id: int = 0, plugin: Optional["PluginContext"] = None):
+        self.plugin_name = plugin_name
+        self.handler_name = handler_name
+        self.kind = kind  # "command" or "event"
+        self.client = client
+        self.account_id = account_id
+        self.plugin = plugin
+        self.update = update
+        self.result = None
+        self.error: Optional[Exception] = None
+        self.audit_entries: List[Tuple[str, str, Optional[int]]] = []
+    
+    @property
+    def key(self) -> str:
+        """Name used for handler statistics"""
+        return f"{self.plugin_name}.{self.handler_name}"
+    
+    def audit(self, text: str, user_id: int = None, level: str = "INFO"):
+        """Queue a log entry, written after the handler has replied"""
+        self.audit_entries.append((level, text, user_id))
+
+class PluginContext:
+    """What a plugin works with, handed over by the loader instead of module globals
+    
+    A plugin opts in by declaring a ctx parameter: init_plugin(ctx),
+    cleanup_plugin(ctx) and handlers taking ctx receive this object. A new
+    context is made for every load, so a reload starts clean. client and
+    cache resolve to the account of the update being handled, so one
+    loaded plugin serves every account.
+    """
+    
+    def __init__(self, name: str, loader: "PluginLoader"):
+        self.name = name
+        self.loader = loader
+        self.db = loader.db
+        self.config = loader.config
+        self.tasks = loader.tasks
+        
+        # Timings the plugin records itself, shown in get_plugin_info
+        self.metrics = LatencyRegistry()
+        
+        # State shared by every account, and per-account caches
+        self.shared: Dict[str, Any] = {}
+        self._caches: Dict[int, Dict[str, Any]] = {}
+        self._services = set()
+    
+    @property
+    def account_id(self) -> int:
+        """Account of the update being handled (0 outside handlers)"""
+        return current_account.get()
+    
+    @property
+    def client(self) -> Client:
+        """Client of the current account"""
+        return self.loader.clients.get(self.account_id, self.loader.client)
+    
+    @property
+    def cache(self) -> Dict[str, Any]:
+        """Scratch dict for the current account, dropped on unload"""
+        return self._caches.setdefault(self.account_id, {})
+    
+    @contextmanager
+    def timed(self, key: str):
+        """Record the enclosed block's duration in metrics (failures count as errors)"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.metrics.record(key, time.perf_counter() - start, error=True)
+            raise
+        self.metrics.record(key, time.perf_counter() - start)
+    
+    def spawn(self, name: str, coro) -> Optional[asyncio.Task]:
+        """Run a one-shot background task named after the plugin"""
+        return self.tasks.spawn(f"{self.name}.{name}", coro)
+    
+    def start_service(self, name: str, factory: Callable) -> asyncio.Task:
+        """Run a supervised service, stopped automatically when the plugin unloads"""
+        name = f"{self.name}.{name}"
+        self._services.add(name)
+        return self.tasks.start_service(name, factory)
+    
+    async def stop_service(self, name: str):
+        """Stop a service started with start_service"""
+        name = f"{self.name}.{name}"
+        self._services.discard(name)
+        await self.tasks.stop_service(name)
+    
+    async def get_setting(self, key: str, default: Any = None, kind: Optional[type] = None,
+                          user_id: int = 0) -> Any:
+        """Get one of the plugin's typed settings for the current account"""
+        return await self.db.get_setting(self.name, key, default, kind, user_id)
+    
+    async def set_setting(self, key: str, value: Any, user_id: int = 0) -> bool:
+        """Set one of the plugin's typed settings for the current account"""
+        return await self.db.set_setting(self.name, key, value, user_id)
+    
+    def audit(self, text: str, user_id: int = None, level: str = "INFO"):
+        """Log an action from a handler once it has replied"""
+        current_context().audit(text, user_id, level)
+    
+    async def close(self):
+        """Stop the plugin's services and drop its caches"""
+        for name in list(self._services):
+            await self.tasks.stop_service(name)
+        self._services.clear()
+        self._caches.clear()
+        self.shared.clear()
+
+def takes_context(func: Callable) -> bool:
+    """Check whether a plugin function declares a ctx parameter"""
+    try:
+        return 'ctx' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+class Middleware:
+    """Hooks run around every plugin handler
+    
+    before() runs in registration order ahead of the handler; after() and
+    error() run in reverse order once it returns or raises. error()
+    returns True when it has dealt with the exception.
+    """
+    
+    async def before(self, ctx: HandlerContext):
+        pass
+    
+    async def after(self, ctx: HandlerContext):
+        pass
+    
+    async def error(self, ctx: HandlerContext, exc: Exception) -> bool:
+        return False
+
+class ErrorMiddleware(Middleware):
+    """Report handler failures, editing the command message with the error"""
+    
+    async def error(self, ctx: HandlerContext, exc: Exception) -> bool:
+        logger.error(f"Handler {ctx.key} failed: {exc}")
+        if ctx.kind != "command":
+            return True
+        try:
+            await ctx.update.edit(f"❌ **Error:** {str(exc)}")
+        except Exception as e:
+            logger.error(f"Failed to report error for {ctx.key}: {e}")
+        return True
+
+class StatsMiddleware(Middleware):
+    """Count completed commands in user statistics, off the reply path"""
+    
+    def __init__(self, db: StorageBackend, spawn: Callable):
+        self.db = db
+        self.spawn = spawn
+    
+    async def after(self, ctx: HandlerContext):
+        user = getattr(ctx.update, 'from_user', None)
+        if ctx.kind == "command" and user:
+            self.spawn("middleware.stats", self.db.update_user_stats(
+                user.id, user.username, user.first_name, command_count=1
+            ))
+
+class AuditMiddleware(Middleware):
+    """Write queued audit entries to the database log, off the reply path"""
+    
+    def __init__(self, db: StorageBackend, spawn: Callable):
+        self.db = db
+        self.spawn = spawn
+    
+    async def after(self, ctx: HandlerContext):
+        chat = getattr(ctx.update, 'chat', None)
+        for level, text, user_id in ctx.audit_entries:
+            self.spawn("middleware.audit", self.db.add_log(level, text, user_id, chat.id if chat else None))
+
 class PluginLoader:
-    """Plugin loader and manager"""
+    """Plugin loader and manager
+    
+    Plugins are imported and initialized once, with the primary client;
+    their handlers are registered on the client of every account, and each
+    update runs with current_account set to the account that received it.
+    """
     
-    def __init__(self, client: Client, db: Database, config: Config):
+    def __init__(self, client: Client, db: StorageBackend, config: Config,
+                 tasks: Optional[TaskSupervisor] = None):
         self.client = client
+        self.clients: Dict[int, Client] = {0: client}
+        self._client_accounts: Dict[int, int] = {id(client): 0}
         self.db = db
         self.config = config
         self.loaded_plugins: Dict[str, Any] = {}
+        self.plugin_contexts: Dict[str, PluginContext] = {}
         self.plugin_handlers: Dict[str, List] = {}
         self.plugins_dir = Path("plugins")
+        self.router = CommandRouter(config.BOT_PREFIX)
+        self.command_conflicts: List[str] = []
+        self._router_handler = None
+        
+        # Plugins registered as stubs, imported on their first command
+        self.lazy_plugins: Dict[str, List[str]] = {}
+        self._lazy_locks: Dict[str, asyncio.Lock] = {}
+        self._loading = set()
+        
+        # Leak check results from the last unload of each plugin
+        self.leak_reports: Dict[str, List[str]] = {}
+        
+        # Seconds spent importing each plugin and in its init_plugin, from its last load
+        self.import_times: Dict[str, float] = {}
+        self.init_times: Dict[str, float] = {}
+        
+        # Latency and error histograms keyed by "plugin.handler"
+        self.handler_stats = LatencyRegistry()
+        
+        # Background work (middleware side effects, watcher, leak checks)
+        self.tasks = tasks or TaskSupervisor()
+        
+        # Handlers running now; new updates are dropped once accepting is False
+        self.accepting = True
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        
+        # Middleware around every handler
+        self.middlewares: List[Middleware] = [
+            ErrorMiddleware(),
+            StatsMiddleware(db, self._spawn_detached),
+            AuditMiddleware(db, self._spawn_detached),
+        ]
+    
+    def _spawn_detached(self, name: str, coro) -> Optional[asyncio.Task]:
+        """Spawn loader work that must not hold on to the running handler"""
+        return spawn_detached(self.tasks.spawn, name, coro)
+    
+    def add_middleware(self, middleware: Middleware):
+        """Add a middleware; it wraps handlers inside the existing ones"""
+        self.middlewares.append(middleware)
+    
+    def add_client(self, client: Client, account_id: int):
+        """Serve another account, registering the router and loaded handlers on its client"""
+        self.clients[account_id] = client
+        self._client_accounts[id(client)] = account_id
+        if self._router_handler is not None:
+            client.add_handler(self._router_handler, COMMAND_GROUP)
+        for handlers in self.plugin_handlers.values():
+            for handler, group in handlers:
+                client.add_handler(handler, group)
+    
+    def remove_client(self, account_id: int):
+        """Stop serving an account, removing every handler from its client"""
+        client = self.clients.pop(account_id, None)
+        if client is None:
+            return
+        self._client_accounts.pop(id(client), None)
+        if self._router_handler is not None:
+            client.remove_handler(self._router_handler, COMMAND_GROUP)
+        for handlers in self.plugin_handlers.values():
+            for handler, group in handlers:
+                client.remove_handler(handler, group)
+    
+    def account_of(self, client: Client) -> int:
+        """Get the account id a client serves"""
+        return self._client_accounts.get(id(client), 0)
+    
+    def install_router(self):
+        """Register the command router with every client (once)"""
+        if self._router_handler is None:
+            self._router_handler = MessageHandler(
+                self.router.dispatch, filters.me & (filters.text | filters.caption)
+            )
+            for client in self.clients.values():
+                client.add_handler(self._router_handler, COMMAND_GROUP)
     
     async def load_all_plugins(self):
         """Load all plugins from plugins directory"""
@@ -36,26 +494,202 @@ class PluginLoader:
             logger.warning("Plugins directory not found")
             return
         
-        plugin_files = [
-            f.stem for f in self.plugins_dir.glob("*.py") 
-            if f.stem != "__init__" and not f.stem.startswith("_")
-        ]
+        self.install_router()
         
-        loaded_count = 0
+        # Sorted so the winner of a command conflict is deterministic
+        plugin_files = sorted(self._snapshot_plugins())
+        
+        manifest = self.load_manifest(plugin_files) if self.config.LAZY_PLUGINS else {}
+        
+        # Import eager plugins now; deferred ones only get router stubs
+        lazy = {}
+        modules = {}
         for plugin_name in plugin_files:
             if self.config.is_plugin_disabled(plugin_name):
                 logger.info(f"Plugin {plugin_name} is disabled")
                 continue
-                
-            if await self.load_plugin(plugin_name):
+            
+            entry = manifest.get(plugin_name)
+            if entry and not entry['eager']:
+                lazy[plugin_name] = entry['commands']
+                continue
+            
+            module = self._import_plugin(plugin_name)
+            if module:
+                modules[plugin_name] = module
+        
+        # A plugin required at startup is needed at startup
+        pending = list(modules)
+        while pending:
+            for dependency in get_requires(modules[pending.pop()]):
+                if dependency in lazy and dependency not in modules:
+                    del lazy[dependency]
+                    module = self._import_plugin(dependency)
+                    if module:
+                        modules[dependency] = module
+                        pending.append(dependency)
+        
+        initialized = await self._init_plugins(modules)
+        
+        # Register in name order so the winner of a command conflict is deterministic
+        loaded_count = 0
+        for plugin_name in plugin_files:
+            if plugin_name in lazy:
+                await self._register_lazy_plugin(plugin_name, lazy[plugin_name])
+            elif initialized.get(plugin_name) and await self._activate_plugin(plugin_name, modules[plugin_name]):
                 loaded_count += 1
         
-        logger.info(f"Loaded {loaded_count}/{len(plugin_files)} plugins")
+        logger.info(
+            f"Loaded {loaded_count}/{len(plugin_files)} plugins "
+            f"({len(self.lazy_plugins)} deferred until first use)"
+        )
+        if self.config.PLUGIN_WATCH:
+            self.start_watcher()
+        
+        if self.init_times:
+            slowest = sorted(self.init_times.items(), key=lambda item: item[1], reverse=True)
+            logger.info("Plugin init times: " + ", ".join(
+                f"{name} {seconds * 1000:.1f}ms" for name, seconds in slowest
+            ))
+    
+    async def _init_plugins(self, modules: Dict[str, Any]) -> Dict[str, bool]:
+        """Initialize plugins concurrently, each after the plugins it requires
+        
+        Every plugin waits only on its own dependencies, so independent
+        plugins overlap their init I/O. Plugins in a dependency cycle, or
+        requiring one that is missing or failed, are not loaded.
+        """
+        cycles = find_cycles({name: get_requires(module) for name, module in modules.items()})
+        for plugin_name in cycles:
+            logger.error(f"Plugin {plugin_name} is part of a dependency cycle")
+        
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        async def init_after_dependencies(plugin_name: str) -> bool:
+            for dependency in get_requires(modules[plugin_name]):
+                if dependency in self.loaded_plugins:
+                    continue
+                if dependency not in tasks or not await tasks[dependency]:
+                    logger.error(f"Plugin {plugin_name} requires {dependency}, which is not available")
+                    return False
+            return await self._init_plugin(plugin_name, modules[plugin_name])
+        
+        for plugin_name in modules:
+            if plugin_name not in cycles:
+                tasks[plugin_name] = asyncio.create_task(init_after_dependencies(plugin_name))
+        
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks, results))
+    
+    def load_manifest(self, plugin_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get manifest entries for plugins, rescanning files that changed
+        
+        Entries are cached in PLUGIN_MANIFEST keyed by file mtime and size,
+        so an unchanged tree is described without parsing any plugin.
+        """
+        manifest_path = Path(self.config.PLUGIN_MANIFEST)
+        cached = {}
+        try:
+            data = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if data.get('version') == MANIFEST_VERSION:
+                cached = data.get('plugins', {})
+        except (OSError, ValueError):
+            pass
+        
+        manifest = {}
+        changed = len(cached) != len(plugin_names)
+        for plugin_name in plugin_names:
+            path = self.plugins_dir / f"{plugin_name}.py"
+            try:
+                stat = path.stat()
+                entry = cached.get(plugin_name)
+                if not entry or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                    entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, **scan_plugin(path)}
+                    changed = True
+                manifest[plugin_name] = entry
+            except (OSError, SyntaxError, ValueError) as e:
+                # Unreadable metadata: fall back to importing the plugin eagerly
+                logger.warning(f"Cannot scan plugin {plugin_name}: {e}")
+        
+        if changed:
+            try:
+                tmp_path = manifest_path.with_name(f"{manifest_path.name}.tmp")
+                tmp_path.write_text(
+                    json.dumps({'version': MANIFEST_VERSION, 'plugins': manifest}, indent=1),
+                    encoding="utf-8"
+                )
+                os.replace(tmp_path, manifest_path)
+            except OSError as e:
+                logger.warning(f"Failed to write plugin manifest: {e}")
+        
+        return manifest
+    
+    async def _register_lazy_plugin(self, plugin_name: str, commands: List[str]):
+        """Register router stubs that import a plugin on its first command"""
+        loader = self
+        
+        async def lazy_stub(client, message):
+            if not loader.accepting or not await loader._load_lazy_plugin(plugin_name):
+                return
+            
+            # Re-resolve now that the real handlers replaced the stubs
+            resolved = loader.router.resolve(message.text or message.caption)
+            if resolved and resolved[0] is not lazy_stub:
+                func, message.command = resolved
+                await func(client, message)
+        
+        conflicts = self.router.register(plugin_name, commands, lazy_stub)
+        await self._report_conflicts(conflicts)
+        self.lazy_plugins[plugin_name] = commands
+        logger.info(f"Plugin deferred: {plugin_name} ({', '.join(commands)})")
+    
+    async def _load_lazy_plugin(self, plugin_name: str) -> bool:
+        """Import a deferred plugin (once, even under concurrent commands)"""
+        lock = self._lazy_locks.setdefault(plugin_name, asyncio.Lock())
+        async with lock:
+            if plugin_name in self.loaded_plugins:
+                return True
+            if plugin_name not in self.lazy_plugins:
+                return False
+            
+            start = time.perf_counter()
+            if not await self.load_plugin(plugin_name):
+                return False
+            logger.info(f"Lazy-loaded {plugin_name} in {(time.perf_counter() - start) * 1000:.1f}ms")
+            return True
     
     async def load_plugin(self, plugin_name: str) -> bool:
-        """Load a specific plugin"""
+        """Load a specific plugin, loading deferred plugins it requires first"""
+        module = self._import_plugin(plugin_name)
+        if module is None:
+            return False
+        return await self._start_plugin(plugin_name, module)
+    
+    async def _start_plugin(self, plugin_name: str, module) -> bool:
+        """Initialize and activate an imported plugin, loading deferred plugins it requires first"""
+        self._loading.add(plugin_name)
+        try:
+            for dependency in get_requires(module):
+                if dependency in self.loaded_plugins:
+                    continue
+                if dependency in self._loading:
+                    logger.error(f"Plugin {plugin_name} is part of a dependency cycle")
+                elif dependency in self.lazy_plugins and await self._load_lazy_plugin(dependency):
+                    continue
+                else:
+                    logger.error(f"Plugin {plugin_name} requires {dependency}, which is not loaded")
+                sys.modules.pop(f"plugins.{plugin_name}", None)
+                return False
+            
+            if not await self._init_plugin(plugin_name, module):
+                return False
+            return await self._activate_plugin(plugin_name, module)
+        finally:
+            self._loading.discard(plugin_name)
+    
+    def _import_plugin(self, plugin_name: str):
+        """Import (or re-import) a plugin module"""
         try:
-            # Import the plugin module
             module_path = f"plugins.{plugin_name}"
             
             # Remove from cache if already loaded
@@ -63,15 +697,71 @@ class PluginLoader:
                 del sys.modules[module_path]
             
             # Import the module
+            start = time.perf_counter()
             module = importlib.import_module(module_path)
+            self.import_times[plugin_name] = time.perf_counter() - start
+            
+            # Give plugins that ask for it access to the loader (and its tasks)
+            if hasattr(module, 'plugin_loader_ref'):
+                module.plugin_loader_ref = self
             
-            # Initialize plugin if it has an init function
-            if hasattr(module, 'init_plugin'):
-                await module.init_plugin(self.client, self.db, self.config)
+            return module
+            
+        except Exception as e:
+            logger.error(f"Failed to load plugin {plugin_name}: {e}")
+            return None
+    
+    async def _init_plugin(self, plugin_name: str, module) -> bool:
+        """Run a plugin's init function under PLUGIN_INIT_TIMEOUT, recording its duration
+        
+        init_plugin(ctx) gets a fresh PluginContext; the older
+        init_plugin(client, db, config) form is still called as before.
+        """
+        ctx = self.plugin_contexts[plugin_name] = PluginContext(plugin_name, self)
+        if not hasattr(module, 'init_plugin'):
+            self.init_times[plugin_name] = 0.0
+            return True
+        
+        timeout = self.config.PLUGIN_INIT_TIMEOUT or None
+        start = time.perf_counter()
+        try:
+            if takes_context(module.init_plugin):
+                init = module.init_plugin(ctx=ctx)
+            else:
+                init = module.init_plugin(self.client, self.db, self.config)
+            await asyncio.wait_for(init, timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.error(f"Plugin {plugin_name} init timed out after {timeout}s")
+            await self.db.add_log("ERROR", f"Plugin {plugin_name} init timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Failed to initialize plugin {plugin_name}: {e}")
+        finally:
+            self.init_times[plugin_name] = time.perf_counter() - start
+        
+        await self.plugin_contexts.pop(plugin_name).close()
+        sys.modules.pop(f"plugins.{plugin_name}", None)
+        return False
+    
+    async def _activate_plugin(self, plugin_name: str, module) -> bool:
+        """Register an initialized plugin's commands and handlers"""
+        try:
+            # Swap any lazy stubs for the real handlers; until now the stubs
+            # kept routing commands that arrived during the plugin's init
+            stub_commands = self.lazy_plugins.pop(plugin_name, None)
+            if stub_commands is not None:
+                self.router.unregister(plugin_name)
             
-            # Register handlers
             await self._register_plugin_handlers(plugin_name, module)
             
+            # Commands the scan missed had no route until now
+            unscanned = set(self.router.get_commands(plugin_name)) - set(stub_commands or ())
+            if stub_commands is not None and unscanned:
+                logger.warning(
+                    f"Plugin {plugin_name} registers commands missing from its lazy stubs: "
+                    f"{', '.join(sorted(unscanned))}; add them to __plugin_info__['commands']"
+                )
+            
             # Store plugin reference
             self.loaded_plugins[plugin_name] = module
             
@@ -80,32 +770,58 @@ class PluginLoader:
             
         except Exception as e:
             logger.error(f"Failed to load plugin {plugin_name}: {e}")
+            ctx = self.plugin_contexts.pop(plugin_name, None)
+            if ctx:
+                await ctx.close()
             return False
     
-    async def unload_plugin(self, plugin_name: str) -> bool:
-        """Unload a specific plugin"""
+    async def unload_plugin(self, plugin_name: str, check_leaks: bool = False) -> bool:
+        """Unload a specific plugin
+        
+        With check_leaks, the old module, its handler functions and handler
+        objects are tracked by weakref and reported (in leak_reports and the
+        logs) if they are still alive shortly after the unload.
+        """
         try:
             if plugin_name not in self.loaded_plugins:
                 return False
             
-            # Remove handlers
+            refs = self._track_plugin_objects(plugin_name) if check_leaks else None
+            
+            # Remove handlers and commands
             if plugin_name in self.plugin_handlers:
-                for handler in self.plugin_handlers[plugin_name]:
-                    self.client.remove_handler(*handler)
+                for handler, group in self.plugin_handlers[plugin_name]:
+                    for client in self.clients.values():
+                        client.remove_handler(handler, group)
                 del self.plugin_handlers[plugin_name]
+            self.router.unregister(plugin_name)
             
             # Cleanup plugin if it has a cleanup function
             module = self.loaded_plugins[plugin_name]
+            ctx = self.plugin_contexts.pop(plugin_name, None)
             if hasattr(module, 'cleanup_plugin'):
-                await module.cleanup_plugin()
+                if takes_context(module.cleanup_plugin):
+                    await module.cleanup_plugin(ctx=ctx)
+                else:
+                    await module.cleanup_plugin()
+            if ctx:
+                await ctx.close()
+                del ctx
             
             # Remove from loaded plugins
             del self.loaded_plugins[plugin_name]
             
-            # Remove from module cache
+            # Remove from module cache, and from the package import set it on
             module_path = f"plugins.{plugin_name}"
             if module_path in sys.modules:
                 del sys.modules[module_path]
+            package = sys.modules.get("plugins")
+            if package is not None and getattr(package, plugin_name, None) is module:
+                delattr(package, plugin_name)
+            del module
+            
+            if refs:
+                self._spawn_detached("plugins.leak_check", self._check_leaks(plugin_name, refs))
             
             logger.info(f"Plugin unloaded: {plugin_name}")
             return True
@@ -115,35 +831,266 @@ class PluginLoader:
             return False
     
     async def reload_plugin(self, plugin_name: str) -> bool:
-        """Reload a specific plugin"""
-        if plugin_name in self.loaded_plugins:
-            await self.unload_plugin(plugin_name)
-        return await self.load_plugin(plugin_name)
+        """Reload a specific plugin from its current source
+        
+        The new source is imported before the running version is unloaded;
+        if it fails to import, initialize or register, the running version
+        is kept (or put back and initialized again).
+        """
+        if plugin_name in self.lazy_plugins:
+            return await self._refresh_lazy_plugin(plugin_name)
+        old_module = self.loaded_plugins.get(plugin_name)
+        if old_module is None:
+            return await self.load_plugin(plugin_name)
+        
+        module_path = f"plugins.{plugin_name}"
+        module = self._import_plugin(plugin_name)
+        if module is None:
+            sys.modules[module_path] = old_module
+            logger.error(f"Keeping the running version of {plugin_name}")
+            return False
+        
+        refs = self._track_plugin_objects(plugin_name)
+        await self.unload_plugin(plugin_name)
+        sys.modules[module_path] = module
+        if await self._start_plugin(plugin_name, module):
+            self._spawn_detached("plugins.leak_check", self._check_leaks(plugin_name, refs))
+            return True
+        
+        logger.error(f"Reload of {plugin_name} failed, restoring the previous version")
+        await self.db.add_log("ERROR", f"Reload of {plugin_name} failed, restoring the previous version")
+        sys.modules[module_path] = old_module
+        package = sys.modules.get("plugins")
+        if package is not None:
+            setattr(package, plugin_name, old_module)
+        if not await self._start_plugin(plugin_name, old_module):
+            logger.error(f"Failed to restore plugin {plugin_name}")
+        return False
+    
+    async def _refresh_lazy_plugin(self, plugin_name: str) -> bool:
+        """Re-read a deferred plugin's commands (it has not been imported yet)"""
+        try:
+            entry = scan_plugin(self.plugins_dir / f"{plugin_name}.py")
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.error(f"Cannot scan plugin {plugin_name}: {e}")
+            return False
+        
+        self.router.unregister(plugin_name)
+        del self.lazy_plugins[plugin_name]
+        if entry['eager'] or not self.config.LAZY_PLUGINS:
+            return await self.load_plugin(plugin_name)
+        await self._register_lazy_plugin(plugin_name, entry['commands'])
+        return True
+    
+    def _track_plugin_objects(self, plugin_name: str) -> Dict[str, weakref.ref]:
+        """Take weak references to a loaded plugin's module and handlers"""
+        module = self.loaded_plugins[plugin_name]
+        refs = {plugin_name: weakref.ref(module)}
+        if plugin_name in self.plugin_contexts:
+            refs[f"{plugin_name} (PluginContext)"] = weakref.ref(self.plugin_contexts[plugin_name])
+        for name, obj in vars(module).items():
+            if hasattr(obj, '_command_info') or hasattr(obj, '_handler_info'):
+                refs[f"{plugin_name}.{name}"] = weakref.ref(obj)
+        for handler, group in self.plugin_handlers.get(plugin_name, []):
+            refs[f"{plugin_name}.{handler.callback.__name__} ({type(handler).__name__})"] = weakref.ref(handler)
+        return refs
+    
+    async def _check_leaks(self, plugin_name: str, refs: Dict[str, weakref.ref]):
+        """Report objects of an unloaded plugin that were not garbage-collected"""
+        # Let the unloading command and cancelled tasks finish first
+        await asyncio.sleep(LEAK_CHECK_DELAY)
+        gc.collect()
+        
+        leaked = [name for name, ref in refs.items() if ref() is not None]
+        self.leak_reports[plugin_name] = leaked
+        if leaked:
+            logger.warning(f"Plugin {plugin_name} leaked after unload: {', '.join(leaked)}")
+            await self.db.add_log("WARNING", f"Plugin {plugin_name} leaked after unload: {', '.join(leaked)}")
+        else:
+            logger.info(f"Plugin {plugin_name} fully released after unload")
+    
+    def _snapshot_plugins(self) -> Dict[str, Tuple[int, int]]:
+        """Get (mtime, size) for every plugin file"""
+        snapshot = {}
+        for path in self.plugins_dir.glob("*.py"):
+            if path.stem == "__init__" or path.stem.startswith("_"):
+                continue
+            try:
+                stat = path.stat()
+                snapshot[path.stem] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return snapshot
+    
+    def start_watcher(self):
+        """Start reloading plugins whose files change (once)"""
+        self.tasks.start_service("plugins.watcher", self._watch_plugins)
+        logger.info(f"Watching {self.plugins_dir} every {self.config.PLUGIN_WATCH_INTERVAL}s")
+    
+    async def stop_watcher(self):
+        """Stop the plugin file watcher"""
+        await self.tasks.stop_service("plugins.watcher")
+    
+    async def _watch_plugins(self):
+        """Poll plugin file mtimes and reload only the files that changed"""
+        snapshot = self._snapshot_plugins()
+        while True:
+            await asyncio.sleep(self.config.PLUGIN_WATCH_INTERVAL)
+            try:
+                current = self._snapshot_plugins()
+                for plugin_name in sorted(current.keys() | snapshot.keys()):
+                    if current.get(plugin_name) != snapshot.get(plugin_name):
+                        await self._apply_plugin_change(plugin_name, plugin_name in current)
+                snapshot = current
+            except Exception as e:
+                logger.error(f"Plugin watcher error: {e}")
+    
+    async def _apply_plugin_change(self, plugin_name: str, exists: bool):
+        """Reload, load or unload a plugin after its file changed"""
+        if self.config.is_plugin_disabled(plugin_name):
+            return
+        
+        if not exists:
+            if plugin_name in self.lazy_plugins:
+                self.router.unregister(plugin_name)
+                del self.lazy_plugins[plugin_name]
+            await self.unload_plugin(plugin_name, check_leaks=True)
+            logger.info(f"Plugin file removed: {plugin_name}")
+            return
+        
+        # Keep the running version if the new source does not even parse
+        try:
+            scan_plugin(self.plugins_dir / f"{plugin_name}.py")
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.error(f"Not reloading {plugin_name}: {e}")
+            await self.db.add_log("ERROR", f"Not reloading {plugin_name}: {e}")
+            return
+        
+        if await self.reload_plugin(plugin_name):
+            logger.info(f"Plugin file changed, reloaded: {plugin_name}")
+            await self.db.add_log("INFO", f"Reloaded plugin {plugin_name} after file change")
     
     async def _register_plugin_handlers(self, plugin_name: str, module):
-        """Register handlers from a plugin module"""
+        """Register commands and handlers from a plugin module"""
         handlers = []
+        ctx = self.plugin_contexts.get(plugin_name)
         
-        # Look for handler functions in the module
         for name, obj in inspect.getmembers(module):
-            if inspect.iscoroutinefunction(obj) and hasattr(obj, '_handler_info'):
+            if not inspect.iscoroutinefunction(obj):
+                continue
+            
+            # Commands go through the router
+            if hasattr(obj, '_command_info'):
+                conflicts = self.router.register(
+                    plugin_name, obj._command_info['names'], self._wrap(plugin_name, obj, "command", ctx)
+                )
+                await self._report_conflicts(conflicts)
+            
+            # Everything else is a regular Pyrogram handler
+            elif hasattr(obj, '_handler_info'):
                 handler_info = obj._handler_info
-                
-                # Create the handler
-                handler = (
-                    getattr(self.client, handler_info['handler_type']),
-                    handler_info['filters']
+                handler = HANDLER_TYPES[handler_info['handler_type']](
+                    self._wrap(plugin_name, obj, "event", ctx), handler_info['filters']
                 )
-                
-                # Add the handler
-                self.client.add_handler(handler[0](handler_info['filters'])(obj))
-                handlers.append(handler)
+                for client in self.clients.values():
+                    client.add_handler(handler, HANDLER_GROUP)
+                handlers.append((handler, HANDLER_GROUP))
         
         if handlers:
             self.plugin_handlers[plugin_name] = handlers
     
+    async def _report_conflicts(self, conflicts: List[str]):
+        """Log command conflicts and record them on the loader"""
+        for conflict in conflicts:
+            logger.warning(f"Command conflict: {conflict}")
+            await self.db.add_log("WARNING", f"Command conflict: {conflict}")
+        self.command_conflicts.extend(conflicts)
+    
+    def _wrap(self, plugin_name: str, func: Callable, kind: str,
+              plugin_ctx: Optional[PluginContext] = None) -> Callable:
+        """Wrap a handler in the middleware chain, recording its latency and any error
+        
+        The recorded latency covers the handler alone; after() hooks run
+        once it has replied and schedule their writes in the background.
+        Handlers declaring a ctx parameter are passed plugin_ctx as ctx.
+        """
+        loader = self
+        stats = self.handler_stats
+        middlewares = self.middlewares
+        extra = {'ctx': plugin_ctx} if takes_context(func) else {}
+        
+        @functools.wraps(func)
+        async def wrapper(client, update, *args):
+            if not loader.accepting:
+                return None
+            
+            ctx = HandlerContext(plugin_name, func.__name__, kind, client, update,
+                                 loader.account_of(client), plugin_ctx)
+            token = _current_context.set(ctx)
+            account_token = current_account.set(ctx.account_id)
+            loader._inflight += 1
+            loader._idle.clear()
+            try:
+                start = time.perf_counter()
+                try:
+                    for middleware in middlewares:
+                        await middleware.before(ctx)
+                    ctx.result = await func(client, update, *args, **extra)
+                except Exception as e:
+                    stats.record(ctx.key, time.perf_counter() - start, error=True)
+                    ctx.error = e
+                    handled = False
+                    for middleware in reversed(middlewares):
+                        try:
+                            handled = await middleware.error(ctx, e) or handled
+                        except Exception as hook_error:
+                            logger.error(f"Middleware error hook failed for {ctx.key}: {hook_error}")
+                    if not handled:
+                        raise
+                    return None
+                
+                stats.record(ctx.key, time.perf_counter() - start)
+                for middleware in reversed(middlewares):
+                    try:
+                        await middleware.after(ctx)
+                    except Exception as e:
+                        logger.error(f"Middleware after hook failed for {ctx.key}: {e}")
+                return ctx.result
+            finally:
+                current_account.reset(account_token)
+                _current_context.reset(token)
+                # Timers and tasks created by the handler keep a copy of its
+                # context (and so ctx) around; let go of the plugin and update
+                ctx.plugin = ctx.update = None
+                loader._inflight -= 1
+                if not loader._inflight:
+                    loader._idle.set()
+        return wrapper
+    
+    def stop_accepting(self):
+        """Ignore new updates from now on; handlers already running carry on"""
+        self.accepting = False
+    
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait for in-flight handlers to finish, returning False on timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._inflight} handlers still running after {timeout:.1f}s")
+            return False
+    
+    def get_handler_stats(self, plugin_name: Optional[str] = None, limit: Optional[int] = 10,
+                          sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Get handler latency summaries, heaviest first, optionally for one plugin"""
+        rows = self.handler_stats.top(len(self.handler_stats.histograms), sort_by)
+        if plugin_name:
+            rows = [row for row in rows if row['key'].startswith(f"{plugin_name}.")]
+        return rows[:limit]
+    
     async def unload_all_plugins(self):
         """Unload all loaded plugins"""
+        await self.stop_watcher()
         plugin_names = list(self.loaded_plugins.keys())
         for plugin_name in plugin_names:
             await self.unload_plugin(plugin_name)
@@ -153,6 +1100,10 @@ class PluginLoader:
         """Get list of loaded plugin names"""
         return list(self.loaded_plugins.keys())
     
+    def get_lazy_plugins(self) -> List[str]:
+        """Get list of plugins deferred until their first command"""
+        return list(self.lazy_plugins.keys())
+    
     def is_plugin_loaded(self, plugin_name: str) -> bool:
         """Check if a plugin is loaded"""
         return plugin_name in self.loaded_plugins
@@ -168,7 +1119,13 @@ class PluginLoader:
             'name': plugin_name,
             'loaded': True,
             'handlers': len(self.plugin_handlers.get(plugin_name, [])),
+            'import_ms': self.import_times.get(plugin_name, 0.0) * 1000,
+            'init_ms': self.init_times.get(plugin_name, 0.0) * 1000,
+            'registered_commands': self.router.get_commands(plugin_name),
+            'handler_stats': self.get_handler_stats(plugin_name, limit=None),
         }
+        if plugin_name in self.plugin_contexts:
+            info['metrics'] = self.plugin_contexts[plugin_name].metrics.top(None)
         
         # Add plugin metadata if available
         if hasattr(module, '__plugin_info__'):
@@ -176,6 +1133,17 @@ class PluginLoader:
         
         return info
 
+def current_context() -> HandlerContext:
+    """Get the context of the handler being run"""
+    ctx = _current_context.get(None)
+    if ctx is None:
+        raise RuntimeError("No plugin handler is running")
+    return ctx
+
+def audit(text: str, user_id: int = None, level: str = "INFO"):
+    """Log an action from a handler once it has replied"""
+    current_context().audit(text, user_id, level)
+
 # Decorator for plugin handlers
 def handler(handler_type: str, filters_obj):
     """Decorator to mark plugin handler functions"""
@@ -187,6 +1155,20 @@ def handler(handler_type: str, filters_obj):
         return func
     return decorator
 
+def command(names, aliases=None):
+    """Decorator for prefix commands sent by the account owner
+    
+    Commands are dispatched by the loader's router using Config.BOT_PREFIX;
+    names and aliases are matched case-insensitively.
+    """
+    names = [names] if isinstance(names, str) else list(names)
+    def decorator(func):
+        func._command_info = {
+            'names': [name.lower() for name in names + list(aliases or [])]
+        }
+        return func
+    return decorator
+
 # Convenience decorators
 def message_handler(filters_obj):
     """Decorator for message handlers"""
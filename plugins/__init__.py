@@ -15,7 +15,8 @@ AVAILABLE_PLUGINS = [
     "ping",
     "info",
     "stats",
-    "utils"
+    "utils",
+    "backup"
 ]
 
 # Plugin categories
@@ -23,5 +24,5 @@ PLUGIN_CATEGORIES = {
     "core": ["alive", "ping"],
     "moderation": ["pm_permit"],
     "information": ["info", "stats"],
-    "utilities": ["utils"]
+    "utilities": ["utils", "backup"]
 }
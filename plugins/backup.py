@@ -0,0 +1,158 @@
+"""
+Backup plugin for UserBot
+Online database backups and bulk export/import of permits and stats
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from pyrogram.types import Message
+
+from plugin_loader import command
+from transfer import export_table, import_table, resolve_table, detect_format
+from utils.helpers import format_bytes
+
+logger = logging.getLogger(__name__)
+
+# Plugin info
+__plugin_info__ = {
+    'name': 'Backup',
+    'description': 'Online database backups and data export/import',
+    'version': '1.0.0',
+    'commands': ['backup', 'export', 'import'],
+    'lazy': False  # Scheduled backups start in init_plugin
+}
+
+# Backup files are named userbot-YYYYmmdd-HHMMSS.db[.gz] (.json[.gz] from memory://)
+BACKUP_PREFIX = "userbot-"
+
+async def init_plugin(ctx):
+    """Initialize the backup plugin"""
+    # One backup at a time, whether scheduled or from .backup
+    ctx.shared['lock'] = asyncio.Lock()
+    
+    # Stopped by the loader when the plugin unloads
+    if ctx.config.BACKUP_INTERVAL > 0:
+        ctx.start_service("scheduled", lambda: backup_loop(ctx))
+
+async def run_backup(ctx) -> str:
+    """Back up the database into BACKUP_DIR and rotate old copies"""
+    async with ctx.shared['lock']:
+        backup_dir = Path(ctx.config.BACKUP_DIR)
+        dest = backup_dir / f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+        
+        path = await ctx.db.backup(
+            str(dest),
+            compress=ctx.config.BACKUP_COMPRESS,
+            pages=ctx.config.BACKUP_PAGES,
+            step_delay=ctx.config.BACKUP_STEP_DELAY
+        )
+        rotate_backups(backup_dir, ctx.config.BACKUP_KEEP)
+        return path
+
+def rotate_backups(backup_dir: Path, keep: int):
+    """Delete all but the newest keep backups"""
+    if keep <= 0:
+        return
+    
+    backups = sorted(
+        p for p in backup_dir.glob(f"{BACKUP_PREFIX}*")
+        if not p.name.endswith(".tmp")
+    )
+    for old in backups[:-keep]:
+        try:
+            old.unlink()
+        except OSError as e:
+            logger.error(f"Failed to delete old backup {old}: {e}")
+
+async def backup_loop(ctx):
+    """Take scheduled backups"""
+    while True:
+        await asyncio.sleep(ctx.config.BACKUP_INTERVAL)
+        try:
+            await run_backup(ctx)
+        except Exception as e:
+            logger.error(f"Scheduled backup failed: {e}")
+            await ctx.db.add_log("ERROR", f"Scheduled backup failed: {e}")
+
+@command("backup")
+async def backup_command(client, message: Message, ctx):
+    """Back up the database"""
+    if ctx.shared['lock'].locked():
+        await message.edit("⏳ **A backup is already running...**")
+    else:
+        await message.edit("💾 **Backing up database...**")
+    
+    start = time.perf_counter()
+    with ctx.timed("backup"):
+        path = await run_backup(ctx)
+    elapsed = time.perf_counter() - start
+    
+    backup_text = f"✅ **Backup Complete**\n\n"
+    backup_text += f"**File:** `{path}`\n"
+    backup_text += f"**Size:** {format_bytes(Path(path).stat().st_size)}\n"
+    backup_text += f"**Time:** {elapsed:.2f}s"
+    
+    await message.edit(backup_text)
+
+@command("export")
+async def export_command(client, message: Message, ctx):
+    """Export PM permits or user stats as a JSONL/CSV document"""
+    if len(message.command) < 2:
+        await message.edit(f"❌ **Usage:** `{ctx.config.BOT_PREFIX}export <permits|stats> [jsonl|csv]`")
+        return
+    
+    table = resolve_table(message.command[1])
+    fmt = detect_format("", message.command[2] if len(message.command) > 2 else None)
+    
+    await message.edit(f"📤 **Exporting {table}...**")
+    
+    backup_dir = Path(ctx.config.BACKUP_DIR)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    path = backup_dir / f"export-{table}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    
+    # The file only exists to be sent; rotate_backups does not clean it up
+    try:
+        start = time.perf_counter()
+        count = await export_table(ctx.db, table, str(path), fmt)
+        elapsed = time.perf_counter() - start
+        
+        await client.send_document(
+            message.chat.id,
+            str(path),
+            caption=f"📤 **{table}:** {count:,} rows ({format_bytes(path.stat().st_size)})"
+        )
+    finally:
+        path.unlink(missing_ok=True)
+    await message.edit(f"✅ **Exported {count:,} rows** from `{table}` in {elapsed:.2f}s")
+
+@command("import")
+async def import_command(client, message: Message, ctx):
+    """Import PM permits or user stats from a replied JSONL/CSV document"""
+    reply = message.reply_to_message
+    if len(message.command) < 2 or not reply or not reply.document:
+        await message.edit(f"❌ **Usage:** Reply to a JSONL/CSV file with `{ctx.config.BOT_PREFIX}import <permits|stats>`")
+        return
+    
+    table = resolve_table(message.command[1])
+    fmt = detect_format(reply.document.file_name or "")
+    
+    await message.edit(f"📥 **Importing into {table}...**")
+    
+    backup_dir = Path(ctx.config.BACKUP_DIR)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    path = await reply.download(
+        file_name=str(backup_dir.resolve() / f"import-{table}-{reply.id}.{fmt}")
+    )
+    
+    try:
+        start = time.perf_counter()
+        count = await import_table(ctx.db, table, path, fmt)
+        elapsed = time.perf_counter() - start
+    finally:
+        Path(path).unlink(missing_ok=True)
+    
+    await message.edit(f"✅ **Imported {count:,} rows** into `{table}` in {elapsed:.2f}s")
+    ctx.audit(f"Imported {count} rows into {table}", message.from_user.id)
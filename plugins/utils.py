@@ -7,317 +7,282 @@ import asyncio
 import os
 import platform
 import sys
+import time
 from datetime import datetime
-from pyrogram import filters
 from pyrogram.types import Message
 
-from plugin_loader import message_handler
+from plugin_loader import command
 
 # Plugin info
 __plugin_info__ = {
     'name': 'Utils',
     'description': 'Various utility commands and tools',
     'version': '1.0.0',
-    'commands': ['help', 'plugins', 'reload', 'logs', 'eval', 'exec', 'restart']
+    'commands': ['help', 'plugins', 'reload', 'logs', 'handlerstats', 'tasks', 'eval', 'sysinfo', 'restart']
 }
 
-# Global variables
-client_ref = None
-db_ref = None
-config_ref = None
-plugin_loader_ref = None
-
-async def init_plugin(client, db, config):
-    """Initialize the utils plugin"""
-    global client_ref, db_ref, config_ref
-    client_ref = client
-    db_ref = db
-    config_ref = config
-
-@message_handler(filters.command("help", ".") & filters.me)
-async def help_command(client, message: Message):
+@command("help")
+async def help_command(client, message: Message, ctx):
     """Show help information"""
-    try:
-        help_text = f"🤖 **UserBot Help**\n\n"
-        help_text += f"**Prefix:** `{config_ref.BOT_PREFIX}`\n\n"
-        
-        # Core commands
-        help_text += f"**🔧 Core Commands:**\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}alive` - Show bot status\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}ping` - Test response time\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}uptime` - Show uptime\n"
-        help_text += f"└ `{config_ref.BOT_PREFIX}help` - Show this help\n\n"
-        
-        # PM Permit commands
-        help_text += f"**🛡️ PM Permit:**\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}approve` - Approve user\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}disapprove` - Disapprove user\n" 
-        help_text += f"├ `{config_ref.BOT_PREFIX}block` - Block user\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}unblock` - Unblock user\n"
-        help_text += f"└ `{config_ref.BOT_PREFIX}pmguard` - Toggle PM permit\n\n"
-        
-        # Info commands
-        help_text += f"**ℹ️ Information:**\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}info` - User information\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}id` - Get IDs\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}chatinfo` - Chat information\n"
-        help_text += f"└ `{config_ref.BOT_PREFIX}msginfo` - Message info\n\n"
-        
-        # Stats commands
-        help_text += f"**📊 Statistics:**\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}stats` - Bot statistics\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}mystats` - Your stats\n"
-        help_text += f"└ `{config_ref.BOT_PREFIX}usage` - Usage analytics\n\n"
-        
-        # Utils commands
-        help_text += f"**🔨 Utilities:**\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}plugins` - List plugins\n"
-        help_text += f"├ `{config_ref.BOT_PREFIX}reload` - Reload plugin\n"
-        help_text += f"└ `{config_ref.BOT_PREFIX}logs` - Show recent logs"
-        
-        await message.edit(help_text)
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+    help_text = f"🤖 **UserBot Help**\n\n"
+    help_text += f"**Prefix:** `{ctx.config.BOT_PREFIX}`\n\n"
+    
+    # Core commands
+    help_text += f"**🔧 Core Commands:**\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}alive` - Show bot status\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}ping` - Test response time\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}uptime` - Show uptime\n"
+    help_text += f"└ `{ctx.config.BOT_PREFIX}help` - Show this help\n\n"
+    
+    # PM Permit commands
+    help_text += f"**🛡️ PM Permit:**\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}approve` - Approve user\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}disapprove` - Disapprove user\n" 
+    help_text += f"├ `{ctx.config.BOT_PREFIX}block` - Block user\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}unblock` - Unblock user\n"
+    help_text += f"└ `{ctx.config.BOT_PREFIX}pmguard` - Toggle PM permit\n\n"
+    
+    # Info commands
+    help_text += f"**ℹ️ Information:**\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}info` - User information\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}id` - Get IDs\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}chatinfo` - Chat information\n"
+    help_text += f"└ `{ctx.config.BOT_PREFIX}msginfo` - Message info\n\n"
+    
+    # Stats commands
+    help_text += f"**📊 Statistics:**\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}stats` - Bot statistics\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}mystats` - Your stats\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}usage` - Usage analytics\n"
+    help_text += f"└ `{ctx.config.BOT_PREFIX}dbstats` - Database query stats\n\n"
+    
+    # Utils commands
+    help_text += f"**🔨 Utilities:**\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}plugins` - List plugins\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}reload` - Reload plugin\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}handlerstats` - Handler latency stats\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}tasks` - Background task stats\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}backup` - Back up database\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}export` - Export permits/stats\n"
+    help_text += f"├ `{ctx.config.BOT_PREFIX}import` - Import permits/stats\n"
+    help_text += f"└ `{ctx.config.BOT_PREFIX}logs` - Show recent logs"
+    
+    await message.edit(help_text)
 
-@message_handler(filters.command("plugins", ".") & filters.me)
-async def plugins_command(client, message: Message):
-    """List loaded plugins"""
-    try:
-        # This requires access to plugin loader - we'll implement a basic version
-        plugins_text = f"🔌 **Loaded Plugins**\n\n"
-        
-        # Basic plugin info (since we can't easily access plugin loader here)
-        plugins_info = [
-            {"name": "alive", "status": "✅", "desc": "Bot status and uptime"},
-            {"name": "pm_permit", "status": "✅", "desc": "PM auto-approval system"},
-            {"name": "ping", "status": "✅", "desc": "Network latency testing"},
-            {"name": "info", "status": "✅", "desc": "User and chat information"},
-            {"name": "stats", "status": "✅", "desc": "Usage statistics"},
-            {"name": "utils", "status": "✅", "desc": "Utility commands"}
-        ]
-        
-        for plugin in plugins_info:
-            plugins_text += f"{plugin['status']} **{plugin['name'].title()}**\n"
-            plugins_text += f"    └ {plugin['desc']}\n\n"
-        
-        plugins_text += f"**Total:** {len(plugins_info)} plugins loaded"
-        
-        await message.edit(plugins_text)
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+@command("plugins")
+async def plugins_command(client, message: Message, ctx):
+    """List loaded and deferred plugins"""
+    plugins_text = f"🔌 **Plugins**\n\n"
+    
+    for plugin_name in ctx.loader.get_loaded_plugins():
+        info = await ctx.loader.get_plugin_info(plugin_name)
+        plugins_text += f"✅ **{plugin_name}** (import {info['import_ms']:.0f}ms, init {info['init_ms']:.0f}ms)\n"
+        plugins_text += f"    └ {info.get('description', 'No description')}\n\n"
+    
+    # Deferred plugins are imported on their first command
+    for plugin_name in ctx.loader.get_lazy_plugins():
+        commands = ", ".join(ctx.loader.lazy_plugins[plugin_name])
+        plugins_text += f"💤 **{plugin_name}**\n"
+        plugins_text += f"    └ Loads on first use: {commands}\n\n"
+    
+    plugins_text += f"**Total:** {len(ctx.loader.get_loaded_plugins())} loaded, "
+    plugins_text += f"{len(ctx.loader.get_lazy_plugins())} deferred"
+    
+    await message.edit(plugins_text)
 
-@message_handler(filters.command("reload", ".") & filters.me)
-async def reload_command(client, message: Message):
+@command("reload")
+async def reload_command(client, message: Message, ctx):
     """Reload a plugin"""
-    try:
-        if len(message.command) < 2:
-            await message.edit("❌ **Usage:** `.reload <plugin_name>`")
-            return
-        
-        plugin_name = message.command[1].lower()
-        
-        # For now, just show a message (full implementation would require plugin loader reference)
-        await message.edit(f"🔄 **Reloading plugin:** {plugin_name}\n\n⚠️ Plugin reload functionality requires advanced implementation.")
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+    if len(message.command) < 2:
+        await message.edit(f"❌ **Usage:** `{ctx.config.BOT_PREFIX}reload <plugin_name>`")
+        return
+    
+    plugin_name = message.command[1].lower()
+    
+    if not (ctx.loader.plugins_dir / f"{plugin_name}.py").exists():
+        await message.edit(f"❌ **Plugin not found:** `{plugin_name}`")
+        return
+    
+    await message.edit(f"🔄 **Reloading plugin:** {plugin_name}...")
+    
+    start = time.perf_counter()
+    reloaded = await ctx.loader.reload_plugin(plugin_name)
+    elapsed = (time.perf_counter() - start) * 1000
+    
+    if not reloaded:
+        await message.edit(f"❌ **Failed to reload** `{plugin_name}`\n\nCheck `{ctx.config.BOT_PREFIX}logs` for details.")
+    elif ctx.loader.is_plugin_loaded(plugin_name):
+        await message.edit(f"✅ **Reloaded** `{plugin_name}` in {elapsed:.1f}ms")
+    else:
+        await message.edit(f"✅ **Refreshed** `{plugin_name}` (loads on first use)")
 
-@message_handler(filters.command("logs", ".") & filters.me)
-async def logs_command(client, message: Message):
+@command("logs")
+async def logs_command(client, message: Message, ctx):
     """Show recent logs"""
-    try:
-        # Get recent logs from database
-        limit = 10
-        if len(message.command) > 1:
+    # Get recent logs from database
+    limit = 10
+    if len(message.command) > 1:
+        try:
+            limit = min(int(message.command[1]), 20)  # Max 20 logs
+        except:
+            pass
+    
+    recent_logs = await ctx.db.get_recent_logs(limit)
+    
+    logs_text = f"📝 **Recent Logs** (Last {limit})\n\n"
+    
+    if recent_logs:
+        for log in recent_logs:
+            # Format timestamp
             try:
-                limit = min(int(message.command[1]), 20)  # Max 20 logs
+                timestamp = datetime.fromisoformat(log['timestamp']).strftime('%H:%M:%S')
             except:
-                pass
-        
-        recent_logs = await db_ref.fetch_query("""
-            SELECT level, message, timestamp
-            FROM bot_logs 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        """, (limit,))
-        
-        logs_text = f"📝 **Recent Logs** (Last {limit})\n\n"
-        
-        if recent_logs:
-            for log in recent_logs:
-                # Format timestamp
-                try:
-                    timestamp = datetime.fromisoformat(log['timestamp']).strftime('%H:%M:%S')
-                except:
-                    timestamp = "Unknown"
-                
-                # Level emoji
-                level_emoji = {
-                    'INFO': 'ℹ️',
-                    'WARNING': '⚠️',
-                    'ERROR': '❌',
-                    'DEBUG': '🐛'
-                }.get(log['level'], '📋')
-                
-                logs_text += f"{level_emoji} `{timestamp}` **{log['level']}**\n"
-                logs_text += f"    └ {log['message'][:100]}{'...' if len(log['message']) > 100 else ''}\n\n"
-        else:
-            logs_text += "No logs available."
-        
-        await message.edit(logs_text)
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+                timestamp = "Unknown"
+            
+            # Level emoji
+            level_emoji = {
+                'INFO': 'ℹ️',
+                'WARNING': '⚠️',
+                'ERROR': '❌',
+                'DEBUG': '🐛'
+            }.get(log['level'], '📋')
+            
+            logs_text += f"{level_emoji} `{timestamp}` **{log['level']}**\n"
+            logs_text += f"    └ {log['message'][:100]}{'...' if len(log['message']) > 100 else ''}\n\n"
+    else:
+        logs_text += "No logs available."
+    
+    await message.edit(logs_text)
+
+@command("handlerstats")
+async def handlerstats_command(client, message: Message, ctx):
+    """Show per-handler latency and error statistics"""
+    if len(message.command) > 1 and message.command[1].lower() == "reset":
+        ctx.loader.handler_stats.clear()
+        await message.edit("✅ **Handler statistics reset**")
+        return
+    
+    # Optional plugin filter, e.g. .handlerstats pm_permit
+    plugin_name = message.command[1].lower() if len(message.command) > 1 else None
+    handler_stats = ctx.loader.get_handler_stats(plugin_name, limit=10)
+    
+    stats_text = f"⏱️ **Handler Statistics**"
+    stats_text += f" ({plugin_name})\n\n" if plugin_name else "\n\n"
+    
+    if handler_stats:
+        for stat in handler_stats:
+            stats_text += f"**{stat['key']}**\n"
+            stats_text += f"├ **Calls:** {stat['count']:,}"
+            if stat['errors']:
+                stats_text += f" | **Errors:** {stat['errors']:,}"
+            stats_text += f" | **Total:** {stat['total_ms']:.0f}ms\n"
+            stats_text += (
+                f"└ **p50/p95/p99:** {stat['p50_ms']:.1f}/{stat['p95_ms']:.1f}/"
+                f"{stat['p99_ms']:.1f}ms | **Max:** {stat['max_ms']:.1f}ms\n\n"
+            )
+    else:
+        stats_text += "No handler calls recorded yet."
+    
+    await message.edit(stats_text)
+
+@command("tasks")
+async def tasks_command(client, message: Message, ctx):
+    """Show background task counts, timings and recent failures"""
+    stats = ctx.loader.tasks.get_stats(limit=10)
+    
+    tasks_text = f"🧵 **Background Tasks**\n\n"
+    tasks_text += f"**Pending:** {stats['pending']} (limit {stats['max_concurrency']} at a time)\n"
+    tasks_text += f"**Services:** {', '.join(stats['services']) or 'None'}\n\n"
+    
+    for stat in stats['tasks']:
+        tasks_text += f"**{stat['key']}**\n"
+        tasks_text += f"├ **Runs:** {stat['count']:,}"
+        if stat['errors']:
+            tasks_text += f" | **Errors:** {stat['errors']:,}"
+        tasks_text += f"\n└ **p50/p95:** {stat['p50_ms']:.1f}/{stat['p95_ms']:.1f}ms\n\n"
+    
+    if stats['failures']:
+        tasks_text += f"**Recent Failures:**\n"
+        for failure in stats['failures'][:5]:
+            tasks_text += f"├ `{failure['timestamp'].strftime('%H:%M:%S')}` {failure['name']}: {failure['error']}\n"
+    
+    await message.edit(tasks_text)
 
-@message_handler(filters.command("eval", ".") & filters.me)
-async def eval_command(client, message: Message):
+@command("eval")
+async def eval_command(client, message: Message, ctx):
     """Evaluate Python expression"""
+    if len(message.command) < 2:
+        await message.edit(f"❌ **Usage:** `{ctx.config.BOT_PREFIX}eval <expression>`")
+        return
+    
+    # Get expression
+    expression = message.text.split(None, 1)[1]
+    
+    # Safety warning
+    await message.edit("⚠️ **Warning:** Eval can be dangerous. Use with caution!")
+    await asyncio.sleep(2)
+    
     try:
-        if len(message.command) < 2:
-            await message.edit("❌ **Usage:** `.eval <expression>`")
-            return
+        # Evaluate expression
+        result = eval(expression)
         
-        # Get expression
-        expression = message.text.split(None, 1)[1]
+        result_text = f"📊 **Eval Result**\n\n"
+        result_text += f"**Expression:** `{expression}`\n"
+        result_text += f"**Result:** `{result}`\n"
+        result_text += f"**Type:** `{type(result).__name__}`"
         
-        # Safety warning
-        await message.edit("⚠️ **Warning:** Eval can be dangerous. Use with caution!")
-        await asyncio.sleep(2)
+        await message.edit(result_text)
         
-        try:
-            # Evaluate expression
-            result = eval(expression)
-            
-            result_text = f"📊 **Eval Result**\n\n"
-            result_text += f"**Expression:** `{expression}`\n"
-            result_text += f"**Result:** `{result}`\n"
-            result_text += f"**Type:** `{type(result).__name__}`"
-            
-            await message.edit(result_text)
-            
-        except Exception as eval_error:
-            await message.edit(f"❌ **Eval Error:** `{str(eval_error)}`")
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+    except Exception as eval_error:
+        await message.edit(f"❌ **Eval Error:** `{str(eval_error)}`")
 
-@message_handler(filters.command("sysinfo", ".") & filters.me)
+@command("sysinfo")
 async def sysinfo_command(client, message: Message):
     """Show system information"""
+    info_text = f"💻 **System Information**\n\n"
+    
+    # Python info
+    info_text += f"**Python:**\n"
+    info_text += f"├ Version: {sys.version.split()[0]}\n"
+    info_text += f"├ Implementation: {platform.python_implementation()}\n"
+    info_text += f"└ Executable: `{sys.executable}`\n\n"
+    
+    # System info
+    info_text += f"**System:**\n"
+    info_text += f"├ OS: {platform.system()} {platform.release()}\n"
+    info_text += f"├ Architecture: {platform.architecture()[0]}\n"
+    info_text += f"├ Machine: {platform.machine()}\n"
+    info_text += f"└ Processor: {platform.processor() or 'Unknown'}\n\n"
+    
+    # Process info
     try:
-        info_text = f"💻 **System Information**\n\n"
-        
-        # Python info
-        info_text += f"**Python:**\n"
-        info_text += f"├ Version: {sys.version.split()[0]}\n"
-        info_text += f"├ Implementation: {platform.python_implementation()}\n"
-        info_text += f"└ Executable: `{sys.executable}`\n\n"
-        
-        # System info
-        info_text += f"**System:**\n"
-        info_text += f"├ OS: {platform.system()} {platform.release()}\n"
-        info_text += f"├ Architecture: {platform.architecture()[0]}\n"
-        info_text += f"├ Machine: {platform.machine()}\n"
-        info_text += f"└ Processor: {platform.processor() or 'Unknown'}\n\n"
-        
-        # Process info
-        try:
-            import psutil
-            process = psutil.Process()
-            info_text += f"**Process:**\n"
-            info_text += f"├ PID: {process.pid}\n"
-            info_text += f"├ Memory: {process.memory_info().rss / 1024 / 1024:.1f} MB\n"
-            info_text += f"├ CPU: {process.cpu_percent():.1f}%\n"
-            info_text += f"└ Threads: {process.num_threads()}\n\n"
-        except ImportError:
-            pass
-        
-        # Environment
-        info_text += f"**Environment:**\n"
-        info_text += f"├ Working Dir: `{os.getcwd()}`\n"
-        info_text += f"├ User: {os.getenv('USER', 'Unknown')}\n"
-        info_text += f"└ Shell: {os.getenv('SHELL', 'Unknown')}"
-        
-        await message.edit(info_text)
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
+        import psutil
+        process = psutil.Process()
+        info_text += f"**Process:**\n"
+        info_text += f"├ PID: {process.pid}\n"
+        info_text += f"├ Memory: {process.memory_info().rss / 1024 / 1024:.1f} MB\n"
+        info_text += f"├ CPU: {process.cpu_percent():.1f}%\n"
+        info_text += f"└ Threads: {process.num_threads()}\n\n"
+    except ImportError:
+        pass
+    
+    # Environment
+    info_text += f"**Environment:**\n"
+    info_text += f"├ Working Dir: `{os.getcwd()}`\n"
+    info_text += f"├ User: {os.getenv('USER', 'Unknown')}\n"
+    info_text += f"└ Shell: {os.getenv('SHELL', 'Unknown')}"
+    
+    await message.edit(info_text)
 
-@message_handler(filters.command("restart", ".") & filters.me)
-async def restart_command(client, message: Message):
+@command("restart")
+async def restart_command(client, message: Message, ctx):
     """Restart the userbot"""
-    try:
-        await message.edit("🔄 **Restarting UserBot...**\n\nPlease wait a moment.")
-        
-        # Log the restart
-        await db_ref.add_log("INFO", "UserBot restart requested by user")
-        
-        # In a real implementation, this would trigger a restart
-        # For now, just show a message
-        await asyncio.sleep(2)
-        await message.edit("⚠️ **Restart functionality requires process management.**\n\nUse your hosting platform's restart feature.")
-        
-        # Log command usage
-        await db_ref.update_user_stats(
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.first_name,
-            command_count=1
-        )
-        
-    except Exception as e:
-        await message.edit(f"❌ **Error:** {str(e)}")
-
-async def cleanup_plugin():
-    """Cleanup when plugin is unloaded"""
-    pass
+    await message.edit("🔄 **Restarting UserBot...**\n\nPlease wait a moment.")
+    
+    # Log the restart
+    ctx.audit("UserBot restart requested by user")
+    
+    # In a real implementation, this would trigger a restart
+    # For now, just show a message
+    await asyncio.sleep(2)
+    await message.edit("⚠️ **Restart functionality requires process management.**\n\nUse your hosting platform's restart feature.")
@@ -0,0 +1,176 @@
+"""
+Startup profiler for UserBot
+Times each startup phase and writes a cold-start report to track regressions
+"""
+
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+class StartupProfiler:
+    """Wall time of the startup phases, plus per-plugin import and init times
+    
+    Phases are recorded in the order they ran. finish() fixes the total;
+    the report combines phases with the plugin loader's timings.
+    """
+    
+    def __init__(self, start: Optional[float] = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.started_at = datetime.now()
+        self.phases: List[Dict[str, Any]] = []
+        self.total = None
+        self.imports: List[Dict[str, Any]] = []
+    
+    def record(self, name: str, seconds: float):
+        """Record a phase measured elsewhere"""
+        self.phases.append({'name': name, 'ms': round(seconds * 1000, 2)})
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as one phase (failed phases are kept too)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+    
+    def finish(self) -> float:
+        """Fix the total startup time, returning it in seconds"""
+        if self.total is None:
+            self.total = time.perf_counter() - self.start
+        return self.total
+    
+    def report(self, plugin_loader=None) -> Dict[str, Any]:
+        """Build the JSON-serializable startup report"""
+        from plugins import __version__
+        
+        plugins = {}
+        if plugin_loader:
+            for name in sorted(set(plugin_loader.import_times) | set(plugin_loader.init_times)):
+                plugins[name] = {
+                    'import_ms': round(plugin_loader.import_times.get(name, 0.0) * 1000, 2),
+                    'init_ms': round(plugin_loader.init_times.get(name, 0.0) * 1000, 2)
+                }
+        
+        return {
+            'report_version': REPORT_VERSION,
+            'version': __version__,
+            'python': platform.python_version(),
+            'started_at': self.started_at.isoformat(timespec="seconds"),
+            'total_ms': round(self.finish() * 1000, 2),
+            'phases': self.phases,
+            'plugins': plugins,
+            'deferred_plugins': sorted(plugin_loader.lazy_plugins) if plugin_loader else [],
+            'imports': self.imports
+        }
+    
+    def format_breakdown(self, plugin_loader=None, limit: int = 3) -> str:
+        """Format the phases and slowest plugins for a Telegram message"""
+        text = f"**Startup:** {self.finish() * 1000:.0f}ms\n"
+        text += "\n".join(f"• {phase['name']}: {phase['ms']:.0f}ms" for phase in self.phases)
+        
+        if plugin_loader:
+            plugin_times = {
+                name: plugin_loader.import_times.get(name, 0.0) + plugin_loader.init_times.get(name, 0.0)
+                for name in set(plugin_loader.import_times) | set(plugin_loader.init_times)
+            }
+            slowest = sorted(plugin_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+            if slowest:
+                text += "\n**Slowest Plugins:** " + ", ".join(
+                    f"{name} {seconds * 1000:.0f}ms" for name, seconds in slowest
+                )
+        return text
+    
+    def write_report(self, path: str, plugin_loader=None) -> Optional[Dict[str, Any]]:
+        """Write the report as JSON, logging the change from the previous one
+        
+        Returns the previous report, if there was a readable one.
+        """
+        report = self.report(plugin_loader)
+        
+        previous = None
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                previous = json.load(handle)
+        except (OSError, ValueError):
+            pass
+        
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(report, handle, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write startup report {path}: {e}")
+            Path(tmp_path).unlink(missing_ok=True)
+            return previous
+        
+        if previous and previous.get('total_ms'):
+            change = report['total_ms'] - previous['total_ms']
+            logger.info(
+                f"Startup took {report['total_ms']:.0f}ms "
+                f"({change:+.0f}ms vs {previous.get('version', '?')} at {previous.get('started_at', '?')})"
+            )
+        else:
+            logger.info(f"Startup took {report['total_ms']:.0f}ms")
+        return previous
+
+def parse_importtime(output: str, limit: int = 25) -> List[Dict[str, Any]]:
+    """Parse `python -X importtime` output into the most expensive modules
+    
+    Modules are ranked by self time, which excludes their own imports and
+    so does not double count; depth is how deeply the import was nested.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            imports.append({
+                'module': name.strip(),
+                'depth': (len(name) - len(name.lstrip(" ")) - 1) // 2,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000
+            })
+        except ValueError:
+            continue  # Header line
+    
+    imports.sort(key=lambda entry: entry['self_ms'], reverse=True)
+    return imports[:limit]
+
+async def profile_imports(modules: List[str], cwd: Optional[str] = None,
+                          timeout: float = 60.0) -> List[Dict[str, Any]]:
+    """Import modules in a fresh interpreter under -X importtime
+    
+    Runs in a subprocess so this process's warm module cache does not
+    hide the cold-start cost. The modules are really imported there, so
+    they should be free of import-time side effects.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-X", "importtime", "-c",
+        "; ".join(f"import {module}" for module in modules),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    
+    return parse_importtime(stderr.decode(errors="replace"))
@@ -0,0 +1,318 @@
+"""
+Storage backend interface for UserBot
+Defines the operations plugins rely on and selects an engine from DATABASE_URL
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import islice
+from typing import List, Optional, Dict, Any, AsyncIterable, AsyncIterator, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+# String forms accepted as True for boolean settings
+TRUE_VALUES = ("true", "1", "yes", "on")
+
+# Row shapes shared by every engine
+PM_PERMIT_COLUMNS = (
+    'user_id', 'username', 'first_name', 'approved', 'approved_by',
+    'approved_at', 'warnings', 'last_warning', 'created_at'
+)
+USER_STATS_COLUMNS = (
+    'user_id', 'username', 'first_name', 'total_messages', 'commands_used',
+    'last_seen', 'created_at', 'updated_at'
+)
+
+# Tables that can be bulk exported and imported, keyed by name
+TRANSFER_TABLES = {
+    'pm_permits': PM_PERMIT_COLUMNS,
+    'user_stats': USER_STATS_COLUMNS,
+}
+
+# activity_rollup bucket format (local time, truncated to the hour)
+ACTIVITY_BUCKET_FORMAT = "%Y-%m-%d %H:00"
+
+# Account whose data the current task reads and writes (0 = primary session).
+# Set by the plugin loader for every update; tasks spawned from a handler
+# inherit it.
+current_account: ContextVar[int] = ContextVar("current_account", default=0)
+
+@contextmanager
+def use_account(account_id: int):
+    """Scope storage calls in the enclosed block to one account"""
+    token = current_account.set(account_id)
+    try:
+        yield
+    finally:
+        current_account.reset(token)
+
+# Rows handed to import_rows, from memory or streamed from a file
+ImportRows = Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]
+
+async def iter_batches(rows: ImportRows, size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Group a plain or async iterable of rows into lists of up to size rows"""
+    if not hasattr(rows, '__aiter__'):
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield batch
+        return
+    
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def encode_setting(value: Any) -> str:
+    """Encode a setting value for the TEXT setting_value column"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return json.dumps(value)
+
+def decode_setting(raw: str, kind: type) -> Any:
+    """Decode a stored setting as bool, int, float, str or JSON (dict/list)"""
+    if kind is bool:
+        return raw.strip().lower() in TRUE_VALUES
+    if kind in (int, float, str):
+        return kind(raw)
+    return json.loads(raw)
+
+class StorageBackend(ABC):
+    """Interface implemented by every storage engine
+    
+    Permits, user stats, activity and plugin settings belong to the account
+    in current_account; logs are shared by every account in the process.
+    """
+    
+    # False for engines without SQL: execute_query, fetch_query and
+    # iter_query then do nothing, and there are no query statistics
+    supports_sql = True
+    
+    # Lifecycle methods
+    @abstractmethod
+    async def initialize(self):
+        """Prepare the backend for use"""
+    
+    @abstractmethod
+    async def flush(self):
+        """Persist everything buffered so far"""
+    
+    @abstractmethod
+    async def close(self):
+        """Flush and release resources"""
+    
+    # PM Permit methods
+    @abstractmethod
+    async def load_pm_permits(self) -> int:
+        """Preload approved users, returning how many were loaded"""
+    
+    @abstractmethod
+    async def is_pm_approved(self, user_id: int) -> bool:
+        """Check whether a user is approved for PM"""
+    
+    @abstractmethod
+    async def get_pm_permit(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get PM permit status for a user"""
+    
+    @abstractmethod
+    async def get_pm_permit_summary(self) -> Dict[str, Any]:
+        """Get PM permit totals (total, approved, total_warnings, max_warnings)"""
+    
+    @abstractmethod
+    async def get_top_warned_users(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the users with the most PM warnings"""
+    
+    @abstractmethod
+    async def add_pm_permit(self, user_id: int, username: str = None,
+                            first_name: str = None, approved: bool = False,
+                            approved_by: int = None) -> bool:
+        """Add or update PM permit entry"""
+    
+    @abstractmethod
+    async def approve_pm(self, user_id: int, approved_by: int) -> bool:
+        """Approve a user for PM"""
+    
+    @abstractmethod
+    async def disapprove_pm(self, user_id: int) -> bool:
+        """Disapprove a user for PM"""
+    
+    @abstractmethod
+    async def add_pm_warning(self, user_id: int) -> int:
+        """Add warning to PM permit and return total warnings"""
+    
+    # User statistics methods
+    @abstractmethod
+    async def update_user_stats(self, user_id: int, username: str = None,
+                                first_name: str = None, message_count: int = 0,
+                                command_count: int = 0) -> bool:
+        """Update user statistics and the hourly activity rollup"""
+    
+    @abstractmethod
+    async def flush_user_stats(self) -> bool:
+        """Persist buffered user statistics"""
+    
+    @abstractmethod
+    async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get user statistics"""
+    
+    @abstractmethod
+    async def get_stats_summary(self) -> Dict[str, int]:
+        """Get running totals (users, messages, commands, pm_total, pm_approved,
+        pm_warnings, pm_max_warnings, logs) in constant time"""
+    
+    @abstractmethod
+    async def get_user_totals(self) -> Dict[str, int]:
+        """Get user, message and command totals across all users"""
+    
+    @abstractmethod
+    async def count_active_users(self, since: datetime) -> int:
+        """Count users seen after a time"""
+    
+    @abstractmethod
+    async def get_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the users with the most commands"""
+    
+    @abstractmethod
+    async def get_engagement_levels(self) -> List[Dict[str, Any]]:
+        """Count users per engagement level, busiest level first"""
+    
+    @abstractmethod
+    async def get_activity(self, since: datetime) -> List[Dict[str, Any]]:
+        """Get hourly activity rows (bucket, user_id, messages, commands) since a time"""
+    
+    # Plugin settings methods
+    @abstractmethod
+    async def get_plugin_setting(self, plugin_name: str, setting_key: str,
+                                 user_id: int = 0) -> Optional[str]:
+        """Get plugin setting value"""
+    
+    @abstractmethod
+    async def set_plugin_setting(self, plugin_name: str, setting_key: str,
+                                 setting_value: str, user_id: int = 0) -> bool:
+        """Set plugin setting value"""
+    
+    @abstractmethod
+    async def invalidate_plugin_setting(self, plugin_name: str, setting_key: str,
+                                        user_id: int = 0):
+        """Drop any cached copy of a setting changed outside this backend"""
+    
+    async def get_setting(self, plugin_name: str, setting_key: str, default: Any = None,
+                          kind: Optional[type] = None, user_id: int = 0) -> Any:
+        """Get a typed plugin setting
+        
+        The value is decoded as kind, or as the type of default when kind is
+        not given (raw text if neither is). Missing or undecodable values
+        return default.
+        """
+        raw = await self.get_plugin_setting(plugin_name, setting_key, user_id)
+        if raw is None:
+            return default
+        
+        kind = kind or (type(default) if default is not None else None)
+        if kind is None:
+            return raw
+        try:
+            return decode_setting(raw, kind)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid {kind.__name__} setting {plugin_name}.{setting_key}: {e}")
+            return default
+    
+    async def set_setting(self, plugin_name: str, setting_key: str, value: Any,
+                          user_id: int = 0) -> bool:
+        """Set a typed plugin setting (bool, int, float, str or JSON value)"""
+        return await self.set_plugin_setting(
+            plugin_name, setting_key, encode_setting(value), user_id
+        )
+    
+    # Logging methods
+    @abstractmethod
+    async def add_log(self, level: str, message: str, user_id: int = None,
+                      chat_id: int = None) -> bool:
+        """Add log entry"""
+    
+    @abstractmethod
+    async def get_recent_logs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the most recent log entries"""
+    
+    @abstractmethod
+    async def get_log_level_counts(self, since: datetime) -> List[Dict[str, Any]]:
+        """Count log entries per level since a (UTC) time"""
+    
+    @abstractmethod
+    async def count_logs(self) -> int:
+        """Count all log entries"""
+    
+    @abstractmethod
+    async def prune_logs(self) -> int:
+        """Apply log retention, returning rows removed"""
+    
+    # Query instrumentation methods
+    @abstractmethod
+    def get_query_stats(self, limit: int = 10, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Get per-statement latency summaries, heaviest first"""
+    
+    @abstractmethod
+    def get_slow_queries(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the most recent slow statements, newest first"""
+    
+    @abstractmethod
+    def reset_query_stats(self):
+        """Forget all query timings"""
+    
+    # Bulk transfer methods
+    @abstractmethod
+    def export_rows(self, table: str, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream a transfer table as lists of up to chunk_size row dicts"""
+    
+    @abstractmethod
+    async def import_rows(self, table: str, rows: ImportRows,
+                          batch_size: int = 5000) -> int:
+        """Upsert row dicts (a plain or async iterable) into a transfer table, returning rows written"""
+    
+    # Backup methods
+    @abstractmethod
+    async def backup(self, dest_path: str, compress: bool = False,
+                     pages: int = 256, step_delay: float = 0.05,
+                     max_restarts: int = 3) -> str:
+        """Write a consistent copy of the store, returning its path"""
+    
+    # General methods
+    @abstractmethod
+    async def execute_query(self, query: str, parameters: tuple = ()) -> bool:
+        """Execute a custom query"""
+    
+    @abstractmethod
+    async def fetch_query(self, query: str, parameters: tuple = ()) -> List[Dict[str, Any]]:
+        """Fetch results from a custom query"""
+    
+    @abstractmethod
+    def iter_query(self, query: str, parameters: tuple = (),
+                   row_type: str = "dict", chunk_size: int = 500,
+                   chunked: bool = False) -> AsyncIterator[Any]:
+        """Stream results from a custom query"""
+
+def create_database(url: str, **options) -> StorageBackend:
+    """Create the storage backend selected by a DATABASE_URL
+    
+    Supported URLs:
+        sqlite:///path/to/file.db  SQLite file (sqlite:///:memory: for a private one)
+        memory://                  Pure in-memory engine, nothing is persisted
+    """
+    if url.startswith("sqlite:///"):
+        from database import Database
+        return Database(url[10:] or "userbot.db", **options)
+    
+    if url.startswith("memory://"):
+        from memory_database import MemoryDatabase
+        return MemoryDatabase(**options)
+    
+    raise ValueError(f"Unsupported DATABASE_URL: {url}")
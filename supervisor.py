@@ -0,0 +1,149 @@
+"""
+Background task supervisor for UserBot
+Runs named fire-and-forget tasks and long-lived services, and drains them at shutdown
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from utils.metrics import LatencyRegistry
+
+logger = logging.getLogger(__name__)
+
+class TaskSupervisor:
+    """Owner of the bot's background work
+    
+    One-shot tasks (spawn) run at most max_concurrency at a time; the rest
+    wait their turn. Services (start_service) are long-running loops that
+    are restarted if they crash. Failures are logged and counted per task
+    name, and drain() lets pending work finish before shutdown.
+    """
+    
+    def __init__(self, max_concurrency: int = 32, restart_delay: float = 5.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.restart_delay = restart_delay
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._tasks: Dict[asyncio.Task, str] = {}
+        self._services: Dict[str, asyncio.Task] = {}
+        self._closed = False
+        
+        # Run time and failures keyed by task name
+        self.metrics = LatencyRegistry()
+        self.failures = deque(maxlen=20)
+        self.rejected = 0
+    
+    def spawn(self, name: str, coro: Awaitable) -> Optional[asyncio.Task]:
+        """Run a one-shot task in the background
+        
+        Returns None (and drops the coroutine) once the supervisor is closed.
+        """
+        if self._closed:
+            coro.close()
+            self.rejected += 1
+            logger.warning(f"Task {name} rejected: supervisor is closed")
+            return None
+        
+        task = asyncio.create_task(self._run(name, coro), name=name)
+        self._tasks[task] = name
+        task.add_done_callback(self._tasks.pop)
+        return task
+    
+    async def _run(self, name: str, coro: Awaitable):
+        """Run one task under the concurrency limit, recording its outcome"""
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                await coro
+            except asyncio.CancelledError:
+                self.metrics.record(name, time.perf_counter() - start, error=True)
+                raise
+            except Exception as e:
+                self.metrics.record(name, time.perf_counter() - start, error=True)
+                self._record_failure(name, e)
+            else:
+                self.metrics.record(name, time.perf_counter() - start)
+    
+    def start_service(self, name: str, factory: Callable[[], Awaitable]) -> asyncio.Task:
+        """Run a long-lived coroutine, restarting it if it fails (once per name)"""
+        if name in self._services:
+            return self._services[name]
+        task = asyncio.create_task(self._supervise(name, factory), name=name)
+        self._services[name] = task
+        return task
+    
+    async def _supervise(self, name: str, factory: Callable[[], Awaitable]):
+        """Keep a service running until it returns or is cancelled"""
+        try:
+            while True:
+                try:
+                    await factory()
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._record_failure(name, e)
+                    self.metrics.record(name, 0.0, error=True)
+                    logger.info(f"Restarting service {name} in {self.restart_delay}s")
+                    await asyncio.sleep(self.restart_delay)
+        finally:
+            if self._services.get(name) is asyncio.current_task():
+                del self._services[name]
+    
+    async def stop_service(self, name: str):
+        """Cancel a service and wait for it to exit"""
+        task = self._services.pop(name, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    
+    def _record_failure(self, name: str, error: Exception):
+        """Log a task failure and keep it for get_stats"""
+        logger.error(f"Task {name} failed: {type(error).__name__}: {error}")
+        self.failures.append({
+            'name': name,
+            'error': f"{type(error).__name__}: {error}",
+            'timestamp': datetime.now()
+        })
+    
+    async def drain(self, timeout: float = 10.0) -> int:
+        """Stop services, wait up to timeout for tasks, then cancel the rest
+        
+        Tasks spawned while draining are waited for too. Returns the number
+        of tasks that had to be cancelled; afterwards new tasks are rejected.
+        """
+        for name in list(self._services):
+            await self.stop_service(name)
+        
+        deadline = time.monotonic() + timeout
+        while self._tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.wait(list(self._tasks), timeout=remaining)
+        
+        self._closed = True
+        pending = list(self._tasks)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                f"Cancelled {len(pending)} background tasks still running after {timeout}s: "
+                + ", ".join(sorted({task.get_name() for task in pending}))
+            )
+        return len(pending)
+    
+    def get_stats(self, limit: int = 10) -> Dict[str, Any]:
+        """Get task counts, per-name timings and recent failures"""
+        return {
+            'pending': len(self._tasks),
+            'services': sorted(self._services),
+            'max_concurrency': self.max_concurrency,
+            'rejected': self.rejected,
+            'tasks': self.metrics.top(limit, sort_by="count"),
+            'failures': list(reversed(self.failures))
+        }
@@ -0,0 +1,253 @@
+"""
+Tests for the SQLite storage backend
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+from database import Database, MIGRATIONS, PermitCache, normalize_sql
+from storage import use_account
+
+def run(coro, timeout: float = 10.0):
+    """Run a coroutine on a fresh event loop, failing instead of hanging"""
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+async def open_database(tmp_path, **options) -> Database:
+    """Open a file database with the background loops switched off"""
+    options.setdefault('stats_flush_interval', 0)
+    db = Database(str(tmp_path / "test.db"), **options)
+    await db.initialize()
+    return db
+
+def test_failed_stats_batch_keeps_concurrent_writes(tmp_path, monkeypatch):
+    """A statement queued while a stats batch runs survives the batch's rollback"""
+    async def scenario():
+        db = await open_database(tmp_path, write_behind=True, stats_flush_interval=60)
+        await db.update_user_stats(1, "alice", "Alice", message_count=2)
+        
+        try:
+            executemany = db._executemany
+            concurrent = []
+            
+            async def failing_executemany(query, rows):
+                await executemany(query, rows)
+                if "activity_rollup" in query:
+                    # Another coroutine writes while the savepoint is open
+                    concurrent.append(asyncio.create_task(db.add_log("INFO", "during flush")))
+                    await asyncio.sleep(0.05)
+                    raise RuntimeError("injected failure")
+            
+            monkeypatch.setattr(db, "_executemany", failing_executemany)
+            assert await db.flush_user_stats() is False
+            assert await concurrent[0] is True
+            monkeypatch.setattr(db, "_executemany", executemany)
+            
+            await db.flush()
+            logs = await db.fetch_query("SELECT message FROM bot_logs")
+            assert [row['message'] for row in logs] == ["during flush"]
+            
+            # The failed increments were kept and written by the next flush
+            stats = await db.fetch_query("SELECT total_messages FROM user_stats WHERE user_id = 1")
+            assert stats == [{'total_messages': 2}]
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_user_stats_read_during_flush_counts_once(tmp_path, monkeypatch):
+    """A read racing a flush sees each increment exactly once"""
+    async def scenario():
+        db = await open_database(tmp_path, stats_flush_interval=60)
+        try:
+            await db.update_user_stats(1, "alice", "Alice", message_count=3)
+            await db.flush_user_stats()
+            await db.update_user_stats(1, "alice", "Alice", message_count=2)
+            
+            executemany = db._executemany
+            reads = []
+            
+            async def slow_executemany(query, rows):
+                if "user_stats" in query:
+                    reads.append(asyncio.create_task(db.get_user_stats(1)))
+                    await asyncio.sleep(0.05)
+                return await executemany(query, rows)
+            
+            monkeypatch.setattr(db, "_executemany", slow_executemany)
+            await db.flush_user_stats()
+            assert (await reads[0])['total_messages'] == 5
+            assert (await db.get_user_stats(1))['total_messages'] == 5
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_aggregate_reads_do_not_flush(tmp_path):
+    """Summary reads leave buffered increments for the flush loop"""
+    async def scenario():
+        db = await open_database(tmp_path, stats_flush_interval=60)
+        try:
+            await db.update_user_stats(1, "alice", "Alice", command_count=1)
+            summary = await db.get_stats_summary()
+            await db.get_top_users()
+            assert summary['commands'] == 0
+            assert db._stats_deltas
+            
+            await db.flush_user_stats()
+            assert (await db.get_stats_summary())['commands'] == 1
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+# Schema written by the first release, before any migration existed
+BASELINE_SCHEMA = """
+CREATE TABLE pm_permits (
+    user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+    approved BOOLEAN DEFAULT FALSE, approved_by INTEGER, approved_at TIMESTAMP,
+    warnings INTEGER DEFAULT 0, last_warning TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE user_stats (
+    user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT,
+    total_messages INTEGER DEFAULT 0, commands_used INTEGER DEFAULT 0,
+    last_seen TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE plugin_settings (
+    plugin_name TEXT, setting_key TEXT, setting_value TEXT, user_id INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (plugin_name, setting_key, user_id)
+);
+CREATE TABLE bot_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, level TEXT NOT NULL, message TEXT NOT NULL,
+    user_id INTEGER, chat_id INTEGER, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO pm_permits (user_id, username, approved, warnings) VALUES (1, 'alice', 1, 0), (2, 'bob', 0, 3);
+INSERT INTO user_stats (user_id, username, total_messages, commands_used) VALUES (1, 'alice', 10, 60), (2, 'bob', 4, 2);
+INSERT INTO plugin_settings (plugin_name, setting_key, setting_value) VALUES ('pm_permit', 'enabled', 'false');
+INSERT INTO bot_logs (level, message) VALUES ('INFO', 'started');
+"""
+
+def test_migrations_upgrade_a_baseline_database(tmp_path):
+    """A pre-migration database reaches the latest version with its rows in account 0"""
+    path = tmp_path / "test.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    
+    async def scenario():
+        db = await open_database(tmp_path)
+        try:
+            assert await db.get_schema_version() == MIGRATIONS[-1][0]
+            
+            summary = await db.get_stats_summary()
+            assert (summary['users'], summary['messages'], summary['commands']) == (2, 14, 62)
+            assert (summary['pm_total'], summary['pm_approved'], summary['pm_warnings']) == (2, 1, 3)
+            assert summary['logs'] == 1
+            assert await db.is_pm_approved(1) and not await db.is_pm_approved(2)
+            assert await db.get_setting("pm_permit", "enabled", True) is False
+            levels = {row['engagement']: row['count'] for row in await db.get_engagement_levels()}
+            assert levels == {'Very High': 1, 'Low': 1}
+            
+            # Another account starts empty and does not see account 0's rows
+            with use_account(1):
+                assert (await db.get_stats_summary())['users'] == 0
+                assert not await db.is_pm_approved(1)
+                await db.update_user_stats(1, "alice", "Alice", command_count=1)
+            assert (await db.get_user_stats(1))['commands_used'] == 60
+        finally:
+            await db.close()
+    
+    run(scenario())
+    
+    # Reopening runs no migration twice
+    async def reopen():
+        db = await open_database(tmp_path)
+        try:
+            rows = await db.fetch_query("SELECT version FROM schema_version ORDER BY version")
+            assert [row['version'] for row in rows] == [m[0] for m in MIGRATIONS]
+        finally:
+            await db.close()
+    
+    run(reopen())
+
+def test_buffered_increments_merge_across_a_failed_flush(tmp_path, monkeypatch):
+    """Increments kept after a failed flush fold into newer ones exactly once"""
+    async def scenario():
+        db = await open_database(tmp_path, stats_flush_interval=60)
+        try:
+            await db.update_user_stats(1, "old", "Old", message_count=2, command_count=1)
+            first_seen = db._stats_deltas[(0, 1)]['first_seen']
+            
+            async def failing_executemany(query, rows):
+                raise RuntimeError("injected failure")
+            
+            executemany = db._executemany
+            monkeypatch.setattr(db, "_executemany", failing_executemany)
+            assert await db.flush_user_stats() is False
+            monkeypatch.setattr(db, "_executemany", executemany)
+            
+            await db.update_user_stats(1, "new", "New", message_count=1)
+            delta = db._stats_deltas[(0, 1)]
+            assert (delta['messages'], delta['commands']) == (3, 1)
+            assert delta['first_seen'] == first_seen
+            
+            assert await db.flush_user_stats() is True
+            stats = await db.get_user_stats(1)
+            assert (stats['username'], stats['total_messages'], stats['commands_used']) == ("new", 3, 1)
+            activity = await db.get_activity(datetime.now() - timedelta(hours=1))
+            assert [(row['messages'], row['commands']) for row in activity] == [(3, 1)]
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_normalize_sql_groups_statement_shapes():
+    """Literals, IN lists, partitions and whitespace do not split histograms"""
+    assert normalize_sql("SELECT *  FROM t\n WHERE id = 5 AND name = 'x'") == \
+        "SELECT * FROM t WHERE id = ? AND name = ?"
+    assert normalize_sql("DELETE FROM t WHERE id IN (?, ?, ?)") == "DELETE FROM t WHERE id IN (?, ...)"
+    assert normalize_sql("SELECT COUNT(*) FROM bot_logs_20260101") == "SELECT COUNT(*) FROM bot_logs_*"
+
+def test_permit_cache_pins_approved_and_evicts_oldest_unapproved():
+    """Approved rows never leave; unapproved rows are a bounded LRU"""
+    cache = PermitCache(max_size=2)
+    cache.load([{'user_id': 1, 'approved': 1}])
+    for user_id in (2, 3):
+        cache.put(user_id, {'user_id': user_id, 'approved': 0})
+    cache.lookup(2)  # 3 is now the least recently used
+    cache.put(4, None)
+    
+    assert cache.lookup(1) == (True, {'user_id': 1, 'approved': 1})
+    assert cache.lookup(3) == (False, None)
+    assert cache.lookup(2)[0] and cache.lookup(4) == (True, None)
+    
+    cache.put(2, {'user_id': 2, 'approved': 1})
+    assert cache.is_approved(2) and 2 not in cache.unapproved
+
+def test_import_of_a_partial_row_keeps_other_columns(tmp_path):
+    """Columns missing from an imported row keep their stored values"""
+    async def scenario():
+        db = await open_database(tmp_path)
+        try:
+            await db.add_pm_permit(1, "a", "Alice")
+            await db.approve_pm(1, 99)
+            await db.add_pm_warning(1)
+            await db.add_pm_warning(1)
+            await db.get_pm_permit(1)  # Cached before the import
+            await db.update_user_stats(1, "a", "Alice", message_count=5)
+            
+            assert await db.import_rows("pm_permits", [{'user_id': 1, 'username': "b"}, {'user_id': 2}]) == 2
+            assert await db.import_rows("user_stats", [{'user_id': 1, 'commands_used': 7}]) == 1
+            
+            permit = await db.get_pm_permit(1)
+            assert (permit['username'], permit['first_name'], permit['approved'], permit['warnings']) == \
+                ("b", "Alice", 1, 2)
+            assert await db.is_pm_approved(1)
+            assert (await db.get_pm_permit(2))['approved'] == 0
+            stats = await db.get_user_stats(1)
+            assert (stats['username'], stats['total_messages'], stats['commands_used']) == ("a", 5, 7)
+        finally:
+            await db.close()
+    
+    run(scenario())
@@ -0,0 +1,133 @@
+"""
+Tests for the in-memory storage backend
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+
+import memory_database
+from memory_database import MemoryDatabase
+
+def run(coro, timeout: float = 10.0):
+    """Run a coroutine on a fresh event loop, failing instead of hanging"""
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+def test_log_retention_runs_in_background():
+    """LOG_MAX_ROWS is enforced without anyone calling prune_logs"""
+    async def scenario():
+        db = MemoryDatabase(log_max_rows=2, log_prune_interval=0.01)
+        await db.initialize()
+        try:
+            for i in range(5):
+                await db.add_log("INFO", f"entry {i}")
+            await asyncio.sleep(0.05)
+            assert [log['message'] for log in await db.get_recent_logs()] == ["entry 4", "entry 3"]
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_log_retention_is_off_by_default():
+    """Without retention settings no log is ever dropped"""
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            for i in range(5):
+                await db.add_log("INFO", f"entry {i}")
+            assert await db.prune_logs() == 0
+            assert await db.count_logs() == 5
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_backup_writes_json_snapshot(tmp_path):
+    """backup() stores every account's rows and the logs as JSON"""
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            await db.add_pm_permit(5, "bob", "Bob", approved=True)
+            await db.set_setting("pm_permit", "enabled", False)
+            await db.add_log("INFO", "hello")
+            
+            path = await db.backup(str(tmp_path / "userbot-1.db"), compress=True)
+            assert path.endswith("userbot-1.json.gz")
+            with gzip.open(path, "rt", encoding="utf-8") as handle:
+                snapshot = json.load(handle)
+            
+            account = snapshot['accounts']['0']
+            assert [row['user_id'] for row in account['pm_permits']] == [5]
+            assert account['plugin_settings'][0]['setting_value'] == "false"
+            assert [log['message'] for log in snapshot['bot_logs']] == ["hello"]
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_backup_encodes_off_the_loop_from_a_consistent_copy(tmp_path, monkeypatch):
+    """Writes made while the snapshot is written do not leak into it"""
+    threads = []
+    write_snapshot = memory_database._write_snapshot
+    
+    def recording_write_snapshot(*args):
+        threads.append(threading.current_thread())
+        write_snapshot(*args)
+    
+    monkeypatch.setattr(memory_database, "_write_snapshot", recording_write_snapshot)
+    
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            await db.add_pm_permit(5, "bob", "Bob")
+            backup = asyncio.create_task(db.backup(str(tmp_path / "userbot-1.db")))
+            await asyncio.sleep(0)  # Let the backup take its snapshot
+            await db.add_pm_warning(5)
+            
+            with open(await backup, encoding="utf-8") as handle:
+                snapshot = json.load(handle)
+            assert snapshot['accounts']['0']['pm_permits'][0]['warnings'] == 0
+            assert (await db.get_pm_permit(5))['warnings'] == 1
+        finally:
+            await db.close()
+    
+    run(scenario())
+    assert threads and threading.main_thread() not in threads
+
+def test_raw_sql_is_refused_without_raising():
+    """SQL helpers report the missing capability instead of crashing"""
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            assert db.supports_sql is False
+            assert await db.fetch_query("SELECT 1") == []
+            assert [row async for row in db.iter_query("SELECT 1")] == []
+        finally:
+            await db.close()
+    
+    run(scenario())
+
+def test_import_of_a_partial_row_keeps_other_columns():
+    """Columns missing from an imported row keep their stored values"""
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            await db.add_pm_permit(1, "a", "Alice")
+            await db.approve_pm(1, 99)
+            await db.add_pm_warning(1)
+            await db.import_rows("pm_permits", [{'user_id': 1, 'username': "b"}])
+            
+            permit = await db.get_pm_permit(1)
+            assert (permit['username'], permit['first_name'], permit['approved'], permit['warnings']) == \
+                ("b", "Alice", 1, 1)
+            assert (await db.get_pm_permit_summary())['total_warnings'] == 1
+        finally:
+            await db.close()
+    
+    run(scenario())
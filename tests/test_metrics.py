@@ -0,0 +1,37 @@
+"""
+Tests for the latency histograms
+"""
+
+from utils.metrics import BUCKET_BOUNDS, LatencyHistogram, LatencyRegistry
+
+def test_percentiles_land_within_one_bucket():
+    """Percentiles come from the bucket holding the ranked sample"""
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    
+    for q in (50, 95, 99):
+        estimate = histogram.percentile(q)
+        assert q / 1000 <= estimate <= q / 1000 * 2 ** 0.25
+    assert histogram.percentile(100) == histogram.max == 0.1
+    assert LatencyHistogram().percentile(50) == 0.0
+
+def test_samples_past_the_last_bucket_report_the_maximum():
+    """Overflow samples are clamped to the observed maximum"""
+    histogram = LatencyHistogram()
+    histogram.record(BUCKET_BOUNDS[-1] * 10, error=True)
+    
+    snapshot = histogram.snapshot()
+    assert snapshot['p50_ms'] == snapshot['max_ms'] == BUCKET_BOUNDS[-1] * 10000
+    assert snapshot['errors'] == 1
+
+def test_registry_ranks_keys():
+    """Keys are ranked by the requested summary field"""
+    registry = LatencyRegistry()
+    registry.record("fast", 0.001)
+    registry.record("fast", 0.001)
+    registry.record("slow", 0.5)
+    
+    assert [row['key'] for row in registry.top()] == ["slow", "fast"]
+    assert [row['key'] for row in registry.top(sort_by="count")] == ["fast", "slow"]
+    assert len(registry.top(limit=1)) == 1
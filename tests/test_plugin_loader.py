@@ -0,0 +1,305 @@
+"""
+Tests for the plugin loader
+"""
+
+import asyncio
+import types
+from types import SimpleNamespace
+
+import pytest
+
+import plugin_loader
+import plugins
+from config import Config
+from memory_database import MemoryDatabase
+from plugin_loader import CommandRouter, Middleware, PluginLoader, audit, find_cycles, scan_plugin
+
+# A plugin taking ctx whose command reloads the plugin itself, like .reload utils
+RELOADING_PLUGIN = """
+from plugin_loader import command
+
+async def init_plugin(ctx):
+    ctx.shared['loaded'] = True
+
+@command("again")
+async def again_cmd(client, message, ctx):
+    ctx.audit("Reloading")
+    await ctx.loader.reload_plugin(ctx.name)
+"""
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    """Config refuses to build without Telegram credentials"""
+    monkeypatch.setenv("API_ID", "1")
+    monkeypatch.setenv("API_HASH", "hash")
+    monkeypatch.setenv("SESSION_STRING", "session")
+
+def run(coro, timeout: float = 10.0):
+    """Run a coroutine on a fresh event loop, failing instead of hanging"""
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+class FakeClient:
+    """Client stand-in recording the handlers registered on it"""
+    
+    def __init__(self):
+        self.handlers = []
+    
+    def add_handler(self, handler, group=0):
+        self.handlers.append((handler, group))
+    
+    def remove_handler(self, handler, group=0):
+        self.handlers.remove((handler, group))
+
+class FakeMessage:
+    """Command message stand-in recording its edits"""
+    
+    def __init__(self, user_id: int = 1):
+        self.from_user = SimpleNamespace(id=user_id, username="alice", first_name="Alice")
+        self.chat = SimpleNamespace(id=-100)
+        self.edits = []
+    
+    async def edit(self, text: str):
+        self.edits.append(text)
+
+async def make_loader() -> PluginLoader:
+    """Loader over a fake client and an in-memory database"""
+    db = MemoryDatabase()
+    await db.initialize()
+    return PluginLoader(FakeClient(), db, Config())
+
+def make_module(name: str, requires=(), init=None) -> types.ModuleType:
+    """Plugin module stand-in with an optional init_plugin"""
+    module = types.ModuleType(f"plugins.{name}")
+    module.__plugin_info__ = {'requires': list(requires)}
+    if init:
+        module.init_plugin = init
+    return module
+
+async def ping(client, message):
+    """Stand-in command handler"""
+
+async def other(client, message):
+    """Stand-in command handler"""
+
+def make_router(prefix: str = ".") -> CommandRouter:
+    """Router with ping (alias p) registered by the utils plugin"""
+    router = CommandRouter(prefix)
+    router.register("utils", ["ping", "p"], ping)
+    return router
+
+def test_resolve_splits_arguments_like_filters_command():
+    """Names are case-insensitive; quotes group words as in filters.command"""
+    router = make_router()
+    assert router.resolve(".ping") == (ping, ["ping"])
+    assert router.resolve(".PING a  b") == (ping, ["ping", "a", "b"])
+    assert router.resolve('.p "two words" \'x\' y') == (ping, ["p", "two words", "x", "y"])
+    assert router.resolve('.ping "say \\"hi\\""') == (ping, ["ping", 'say "hi"'])
+
+def test_resolve_ignores_non_commands():
+    """Text without the prefix, a bare prefix or an unknown name resolves to None"""
+    router = make_router()
+    for text in (None, "", "ping", ".", ". ping", ".unknown", "!ping"):
+        assert router.resolve(text) is None
+
+def test_resolve_with_multi_character_prefix():
+    """The whole prefix must match"""
+    router = make_router(",,")
+    assert router.resolve(",,ping x") == (ping, ["ping", "x"])
+    assert router.resolve(",ping") is None
+
+def test_register_reports_conflicts_and_keeps_first_owner():
+    """A taken name is reported and left with its first owner"""
+    router = make_router()
+    conflicts = router.register("stats", ["ping", "stats"], other)
+    assert len(conflicts) == 1 and "already registered by utils.ping" in conflicts[0]
+    assert router.resolve(".ping")[0] is ping
+    assert router.resolve(".stats")[0] is other
+
+def test_unregister_removes_only_that_plugin():
+    """Unregistering a plugin leaves other plugins' commands"""
+    router = make_router()
+    router.register("stats", ["stats"], other)
+    router.unregister("utils")
+    assert router.get_commands("utils") == []
+    assert router.resolve(".ping") is None
+    assert router.get_commands("stats") == ["stats"]
+
+def test_find_cycles_reports_only_nodes_on_a_cycle():
+    """Nodes leading into a cycle, and unknown dependencies, are not on it"""
+    graph = {'a': ['b'], 'b': ['c'], 'c': ['b'], 'd': ['d'], 'e': ['missing'], 'f': []}
+    assert find_cycles(graph) == {'b', 'c', 'd'}
+    assert find_cycles({'a': ['b'], 'b': []}) == set()
+
+def test_init_plugins_orders_dependencies_and_overlaps_the_rest():
+    """A plugin inits after what it requires; independent plugins run concurrently"""
+    async def scenario():
+        loader = await make_loader()
+        events = []
+        base_started = asyncio.Event()
+        
+        async def init_base(client, db, config):
+            events.append("base start")
+            base_started.set()
+            await asyncio.sleep(0.02)
+            events.append("base done")
+        
+        async def init_addon(client, db, config):
+            events.append("addon")
+        
+        async def init_other(client, db, config):
+            # Runs while base is still initializing
+            await asyncio.wait_for(base_started.wait(), 1)
+            events.append("other")
+        
+        async def init_broken(client, db, config):
+            raise RuntimeError("boom")
+        
+        modules = {
+            'addon': make_module('addon', ['base'], init_addon),
+            'base': make_module('base', [], init_base),
+            'other': make_module('other', [], init_other),
+            'broken': make_module('broken', [], init_broken),
+            'needs_broken': make_module('needs_broken', ['broken']),
+            'needs_missing': make_module('needs_missing', ['missing']),
+            'loop_a': make_module('loop_a', ['loop_b']),
+            'loop_b': make_module('loop_b', ['loop_a']),
+        }
+        try:
+            results = await loader._init_plugins(modules)
+        finally:
+            await loader.db.close()
+        
+        assert results == {
+            'addon': True, 'base': True, 'other': True, 'broken': False,
+            'needs_broken': False, 'needs_missing': False
+        }
+        assert events.index("other") < events.index("base done") < events.index("addon")
+        assert set(loader.plugin_contexts) == {'addon', 'base', 'other'}
+    
+    run(scenario())
+
+def test_middleware_runs_in_order_and_reports_errors():
+    """before() runs in order, after() in reverse; failed commands are edited with the error"""
+    async def scenario():
+        loader = await make_loader()
+        calls = []
+        
+        class Recorder(Middleware):
+            def __init__(self, name):
+                self.name = name
+            
+            async def before(self, ctx):
+                calls.append(f"{self.name}.before")
+            
+            async def after(self, ctx):
+                calls.append(f"{self.name}.after")
+        
+        loader.add_middleware(Recorder("outer"))
+        loader.add_middleware(Recorder("inner"))
+        
+        async def works(client, message):
+            calls.append("handler")
+            return "done"
+        
+        async def fails(client, message):
+            raise ValueError("bad input")
+        
+        message = FakeMessage()
+        try:
+            assert await loader._wrap("demo", works, "command")(loader.client, message) == "done"
+            assert calls == ["outer.before", "inner.before", "handler", "inner.after", "outer.after"]
+            
+            assert await loader._wrap("demo", fails, "command")(loader.client, message) is None
+            assert message.edits == ["❌ **Error:** bad input"]
+            assert loader.handler_stats.histograms["demo.fails"].errors == 1
+        finally:
+            await loader.tasks.drain(1)
+            await loader.db.close()
+    
+    run(scenario())
+
+def test_audit_and_command_stats_are_written_after_the_reply():
+    """Audit entries and the command count land once background writes drain"""
+    async def scenario():
+        loader = await make_loader()
+        
+        async def approve(client, message):
+            audit("Approved user 2", user_id=2)
+        
+        try:
+            await loader._wrap("demo", approve, "command")(loader.client, FakeMessage(user_id=1))
+            await loader.tasks.drain(1)
+            
+            logs = loader.db.logs
+            assert [(log['message'], log['user_id'], log['chat_id']) for log in logs] == [("Approved user 2", 2, -100)]
+            assert (await loader.db.get_user_stats(1))['commands_used'] == 1
+        finally:
+            await loader.db.close()
+    
+    run(scenario())
+
+def test_reload_from_own_command_reports_no_leak(tmp_path, monkeypatch):
+    """Background tasks spawned by a handler do not keep its PluginContext alive"""
+    (tmp_path / "reloader.py").write_text(RELOADING_PLUGIN)
+    monkeypatch.setattr(plugins, "__path__", [*plugins.__path__, str(tmp_path)])
+    monkeypatch.setattr(plugin_loader, "LEAK_CHECK_DELAY", 0.01)
+    
+    async def scenario():
+        loader = await make_loader()
+        try:
+            assert await loader.load_plugin("reloader")
+            message = FakeMessage()
+            func, message.command = loader.router.resolve(".again")
+            await func(loader.client, message)
+            del func
+            await loader.tasks.drain(1)
+            
+            assert loader.leak_reports == {'reloader': []}
+            assert loader.is_plugin_loaded("reloader")
+        finally:
+            await loader.unload_all_plugins()
+            await loader.db.close()
+    
+    run(scenario())
+
+@pytest.mark.parametrize("broken_source", [
+    "import does_not_exist\n",
+    "async def init_plugin(ctx):\n    raise RuntimeError('boom')\n",
+])
+def test_failed_reload_keeps_the_running_version(tmp_path, monkeypatch, broken_source):
+    """A new version that fails to import or init leaves the old one serving"""
+    plugin_file = tmp_path / "reloader.py"
+    plugin_file.write_text(RELOADING_PLUGIN)
+    monkeypatch.setattr(plugins, "__path__", [*plugins.__path__, str(tmp_path)])
+    
+    async def scenario():
+        loader = await make_loader()
+        try:
+            assert await loader.load_plugin("reloader")
+            plugin_file.write_text(broken_source)
+            
+            assert await loader.reload_plugin("reloader") is False
+            assert loader.get_loaded_plugins() == ["reloader"]
+            assert loader.plugin_contexts["reloader"].shared == {'loaded': True}
+            assert loader.router.resolve(".again")[0].__name__ == "again_cmd"
+        finally:
+            await loader.unload_all_plugins()
+            await loader.tasks.drain(1)
+            await loader.db.close()
+    
+    run(scenario())
+
+def test_scan_collects_command_decorator_names(tmp_path):
+    """Names and aliases of @command join the declared commands; computed names load eagerly"""
+    path = tmp_path / "extra.py"
+    path.write_text(
+        "__plugin_info__ = {'commands': ['Ping']}\n"
+        "@command('ping', aliases=['p'])\n"
+        "async def ping(client, message): pass\n"
+        "@command(['Pong', 'po'])\n"
+        "async def pong(client, message): pass\n"
+    )
+    assert scan_plugin(path) == {'commands': ['ping', 'p', 'pong', 'po'], 'eager': False}
+    
+    path.write_text("NAME = 'x'\n@command(NAME)\nasync def x(client, message): pass\n")
+    assert scan_plugin(path)['eager'] is True
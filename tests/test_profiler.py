@@ -0,0 +1,23 @@
+"""
+Tests for the startup profiler
+"""
+
+from profiler import parse_importtime
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2500 |       3100 |     pyrogram.raw
+import time:       600 |       3700 |   pyrogram
+import time:      1500 |       5200 | plugin_loader
+some unrelated stderr line
+"""
+
+def test_parse_importtime_ranks_by_self_time():
+    """Modules are ranked by self time with their nesting depth"""
+    imports = parse_importtime(IMPORTTIME_OUTPUT)
+    
+    assert [entry['module'] for entry in imports] == ["pyrogram.raw", "plugin_loader", "pyrogram", "_io"]
+    assert imports[0] == {'module': "pyrogram.raw", 'depth': 2, 'self_ms': 2.5, 'cumulative_ms': 3.1}
+    assert imports[1]['depth'] == 0
+    assert len(parse_importtime(IMPORTTIME_OUTPUT, limit=2)) == 2
@@ -0,0 +1,65 @@
+"""
+Tests for bulk export and import
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+import transfer
+from memory_database import MemoryDatabase
+from transfer import export_table, import_table
+
+def run(coro, timeout: float = 10.0):
+    """Run a coroutine on a fresh event loop, failing instead of hanging"""
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_export_and_import_round_trip(tmp_path, fmt):
+    """Rows exported from one store import into another unchanged"""
+    path = str(tmp_path / f"permits.{fmt}")
+    
+    async def scenario():
+        source, target = MemoryDatabase(), MemoryDatabase()
+        await source.initialize()
+        await target.initialize()
+        try:
+            for user_id in range(1, 2501):
+                await source.add_pm_permit(user_id, f"user{user_id}", approved=user_id % 2 == 0)
+            
+            assert await export_table(source, "permits", path, chunk_size=1000) == 2500
+            assert await import_table(target, "permits", path, batch_size=1000) == 2500
+            assert await target.get_pm_permit(42) == await source.get_pm_permit(42)
+            assert (await target.get_pm_permit_summary())['approved'] == 1250
+        finally:
+            await source.close()
+            await target.close()
+    
+    run(scenario())
+
+def test_import_parses_off_the_event_loop(tmp_path, monkeypatch):
+    """The file is read and parsed in a worker thread"""
+    path = tmp_path / "stats.jsonl"
+    path.write_text('{"user_id": 1, "total_messages": 3}\n{"user_id": 2}\n')
+    threads = []
+    read_jsonl = transfer._read_jsonl
+    
+    def recording_read_jsonl(handle):
+        for row in read_jsonl(handle):
+            threads.append(threading.current_thread())
+            yield row
+    
+    monkeypatch.setattr(transfer, "_read_jsonl", recording_read_jsonl)
+    
+    async def scenario():
+        db = MemoryDatabase()
+        await db.initialize()
+        try:
+            assert await import_table(db, "stats", str(path)) == 2
+            assert (await db.get_user_stats(1))['total_messages'] == 3
+        finally:
+            await db.close()
+    
+    run(scenario())
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,178 @@
+"""
+Bulk transfer for UserBot
+Streams pm_permits and user_stats to and from JSONL or CSV files
+
+Usage:
+    python transfer.py export pm_permits permits.jsonl
+    python transfer.py import user_stats stats.csv --database-url sqlite:///userbot.db
+    python transfer.py export permits second.jsonl --account 1
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Dict, Any, List, Optional
+
+from storage import StorageBackend, TRANSFER_TABLES, create_database, use_account
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv")
+
+# Short names accepted by the CLI and the .export/.import commands
+TABLE_ALIASES = {
+    'permits': 'pm_permits',
+    'pm': 'pm_permits',
+    'stats': 'user_stats',
+}
+
+# CSV carries text only; these columns are converted back to integers
+INTEGER_COLUMNS = {
+    'user_id', 'approved', 'approved_by', 'warnings',
+    'total_messages', 'commands_used'
+}
+
+def resolve_table(name: str) -> str:
+    """Map a table name or alias to a transfer table"""
+    table = TABLE_ALIASES.get(name.lower(), name.lower())
+    if table not in TRANSFER_TABLES:
+        raise ValueError(
+            f"Unknown table: {name} (expected one of {', '.join(TRANSFER_TABLES)})"
+        )
+    return table
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """Pick the file format from an explicit value or the file extension"""
+    fmt = (fmt or Path(path).suffix.lstrip(".") or "jsonl").lower()
+    if fmt == "json":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+    return fmt
+
+def _read_jsonl(handle) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per non-empty line"""
+    for line in handle:
+        if line.strip():
+            yield json.loads(line)
+
+def _read_csv(handle) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per row, restoring NULLs and integers"""
+    for row in csv.DictReader(handle):
+        for column, value in row.items():
+            if value == "":
+                row[column] = None
+            elif column in INTEGER_COLUMNS:
+                row[column] = int(value)
+        yield row
+
+async def _read_off_loop(reader: Iterator[Dict[str, Any]], chunk_size: int) -> AsyncIterator[Dict[str, Any]]:
+    """Yield rows from a blocking reader, reading and parsing chunk_size at a time in a thread"""
+    loop = asyncio.get_running_loop()
+    while rows := await loop.run_in_executor(None, list, islice(reader, chunk_size)):
+        for row in rows:
+            yield row
+
+async def export_table(db: StorageBackend, table: str, path: str,
+                       fmt: Optional[str] = None, chunk_size: int = 1000) -> int:
+    """Stream a table to a JSONL or CSV file, returning rows written
+    
+    Encoding and file writes run in the default executor, so a large
+    export from a bot command does not stall other handlers.
+    """
+    table = resolve_table(table)
+    fmt = detect_format(path, fmt)
+    columns = TRANSFER_TABLES[table]
+    
+    written = 0
+    tmp_path = f"{path}.tmp"
+    loop = asyncio.get_running_loop()
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as handle:
+            writer = None
+            if fmt == "csv":
+                writer = csv.DictWriter(handle, fieldnames=columns)
+                writer.writeheader()
+            
+            def write_chunk(rows: List[Dict[str, Any]]):
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    handle.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+            
+            # Rows are fetched on the loop; encoding and writing run in a thread
+            async for rows in db.export_rows(table, chunk_size):
+                await loop.run_in_executor(None, write_chunk, rows)
+                written += len(rows)
+        os.replace(tmp_path, path)
+    except Exception:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    
+    logger.info(f"Exported {written} rows from {table} to {path}")
+    return written
+
+async def import_table(db: StorageBackend, table: str, path: str,
+                       fmt: Optional[str] = None, batch_size: int = 5000) -> int:
+    """Stream a JSONL or CSV file into a table, returning rows written
+    
+    The file is read and parsed in the default executor, a batch at a
+    time, so a large import from a bot command does not stall other
+    handlers.
+    """
+    table = resolve_table(table)
+    fmt = detect_format(path, fmt)
+    
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        reader = _read_csv(handle) if fmt == "csv" else _read_jsonl(handle)
+        return await db.import_rows(table, _read_off_loop(reader, batch_size), batch_size)
+
+async def run_cli(args) -> int:
+    """Run one export or import against DATABASE_URL"""
+    db = create_database(args.database_url, stats_flush_interval=0, read_pool_size=1)
+    await db.initialize()
+    try:
+        start = time.perf_counter()
+        with use_account(args.account):
+            if args.action == "export":
+                count = await export_table(db, args.table, args.path, args.format, args.chunk_size)
+            else:
+                count = await import_table(db, args.table, args.path, args.format, args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{args.action.title()}ed {count:,} rows in {elapsed:.2f}s")
+        return 0
+    finally:
+        await db.close()
+
+def main() -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Bulk export/import of UserBot data")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("table", help=f"One of {', '.join(TRANSFER_TABLES)} (or permits/stats)")
+    parser.add_argument("path", help="JSONL or CSV file")
+    parser.add_argument("--format", choices=FORMATS, help="File format (default: from extension)")
+    parser.add_argument(
+        "--database-url", default=os.getenv("DATABASE_URL", "sqlite:///userbot.db"),
+        help="Database URL (default: $DATABASE_URL or sqlite:///userbot.db)"
+    )
+    parser.add_argument("--account", type=int, default=0, help="Account id (0 = SESSION_STRING, 1.. = SESSION_STRINGS)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows read per export chunk")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows written per import transaction")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    try:
+        return asyncio.run(run_cli(args))
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,6 @@ Common utilities and formatting functions
 """
 
 import platform
-import psutil
 import sys
 from datetime import datetime, timedelta
 from typing import Dict, Any
@@ -46,8 +45,10 @@ def get_system_info() -> Dict[str, Any]:
             'processor': platform.processor() or platform.machine(),
         }
         
-        # Resource usage with psutil
+        # Resource usage with psutil (imported on first use to keep startup light)
         try:
+            import psutil
+            
             # CPU usage
             system_info['cpu_percent'] = psutil.cpu_percent(interval=1)
             system_info['cpu_count'] = psutil.cpu_count()
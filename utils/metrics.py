@@ -0,0 +1,90 @@
+"""
+Metrics helpers for UserBot
+Lightweight latency histograms keyed by name
+"""
+
+import bisect
+from typing import Dict, List, Any
+
+# Bucket upper bounds in seconds: 10us growing by 2**0.25 up to ~60s
+BUCKET_BOUNDS = [0.00001 * 2 ** (i / 4) for i in range(91)]
+
+class LatencyHistogram:
+    """Fixed log-scale histogram of latencies in seconds
+    
+    Recording is O(log buckets) and memory is constant; percentiles are
+    estimated to within one bucket (about 19%).
+    """
+    
+    __slots__ = ("counts", "count", "total", "max", "errors")
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+    
+    def record(self, seconds: float, error: bool = False):
+        """Record one sample"""
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if error:
+            self.errors += 1
+    
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100) in seconds"""
+        if not self.count:
+            return 0.0
+        
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index >= len(BUCKET_BOUNDS):
+                    return self.max
+                return min(BUCKET_BOUNDS[index], self.max)
+        return self.max
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Summarise the histogram (latencies in milliseconds)"""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': self.total * 1000,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+class LatencyRegistry:
+    """Latency histograms keyed by name"""
+    
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+    
+    def record(self, key: str, seconds: float, error: bool = False):
+        """Record one sample for a key"""
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(seconds, error)
+    
+    def top(self, limit: int = 10, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """Get the heaviest keys, with their summaries"""
+        rows = [
+            {'key': key, **histogram.snapshot()}
+            for key, histogram in self.histograms.items()
+        ]
+        rows.sort(key=lambda row: row[sort_by], reverse=True)
+        return rows[:limit]
+    
+    def clear(self):
+        """Forget all samples"""
+        self.histograms.clear()